@@ -0,0 +1,168 @@
+"""
+Loan amortization (equated monthly instalments).
+
+All amounts are computed in integer paise with NumPy, for one loan or many at
+once. Schedules step month by month across all loans together, so a portfolio
+costs one vectorized step per month of the longest term. Each instalment's interest
+is the previous row's rounded balance times the monthly rate, rounded to the paisa,
+so every row reconciles exactly with the one before it. The last instalment takes
+whatever principal is left, so every schedule repays the loan amount exactly.
+"""
+import calendar
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+# Loans per vectorized chunk; bounds memory at roughly CHUNK_LOANS * longest term * 48 bytes
+CHUNK_LOANS = 10000
+
+
+def _round_half_up(values):
+    return np.floor(values + 0.5).astype('int64')
+
+
+def monthly_rate(annual_rate_percent):
+    return np.asarray(annual_rate_percent, dtype='float64') / 1200.0
+
+
+def emi_paise(principal_paise, annual_rate_percent, months):
+    """Vectorized instalment in paise for principal (paise), annual rate (%) and term (months)."""
+    principal = np.asarray(principal_paise, dtype='float64')
+    r = monthly_rate(annual_rate_percent)
+    n = np.asarray(months, dtype='float64')
+    growth = np.power(1.0 + r, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(r > 0, principal * r * growth / (growth - 1.0), principal / n)
+    return _round_half_up(annuity)
+
+
+def schedules(principal_paise, annual_rate_percent, months):
+    """
+    Full schedules for many loans as flat int64 paise columns.
+
+    Returns ``(loan_index, instalment, payment, principal, interest, balance)``. Rows
+    are grouped by loan and numbered from 1 within each loan.
+    """
+    principal = np.asarray(principal_paise, dtype='int64')
+    r = monthly_rate(annual_rate_percent)
+    n = np.asarray(months, dtype='int64')
+    emi = emi_paise(principal, annual_rate_percent, n)
+
+    width = int(n.max()) if len(n) else 0
+    interest = np.zeros((len(n), width), dtype='int64')
+    principal_part = np.zeros_like(interest)
+    balance = np.zeros_like(interest)
+    outstanding = principal.copy()
+    for k in range(width):
+        active = k < n
+        due = np.where(active, _round_half_up(np.maximum(outstanding, 0) * r), 0)
+        # Last instalment settles exactly what is left of the principal
+        part = np.where(k == n - 1, outstanding, np.where(active, emi - due, 0))
+        outstanding = outstanding - part
+        interest[:, k], principal_part[:, k], balance[:, k] = due, part, outstanding
+
+    # Flatten the rows that exist, loan by loan
+    rows = np.arange(width) < n[:, None]
+    loan_index, column = np.nonzero(rows)
+    instalment = column + 1
+    interest, principal_part, balance = interest[rows], principal_part[rows], balance[rows]
+    payment = principal_part + interest
+    return loan_index, instalment, payment, principal_part, interest, balance
+
+
+def instalment_payments(principal_paise, annual_rate_percent, months, instalment):
+    """Payment in paise of one given instalment per loan, matching its row of ``schedules``."""
+    instalment = np.asarray(instalment, dtype='int64')
+    if not len(instalment):
+        return np.zeros(0, dtype='int64')
+    n = np.asarray(months, dtype='int64')
+    _, _, payment, _, _, _ = schedules(principal_paise, annual_rate_percent, n)
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    return payment[starts + instalment - 1]
+
+
+def add_months(start, months):
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def _rupees(paise):
+    return str(Decimal(int(paise)).scaleb(-2))
+
+
+def loan_schedule(loan):
+    """Schedule and summary for one loan; the first instalment falls a month after approval."""
+    if loan.term_months <= 0:
+        return {'loan_id': loan.id, 'emi': '0.00', 'total_interest': '0.00', 'total_payment': '0.00', 'instalments': []}
+    principal = int(loan.amount * 100)
+    _, instalment, payment, principal_part, interest, balance = schedules(
+        [principal], [float(loan.interest_rate)], [loan.term_months],
+    )
+    start = (loan.approved_at or loan.created_at).date()
+    return {
+        'loan_id': loan.id,
+        'emi': _rupees(payment[0]) if len(payment) else '0.00',
+        'total_interest': _rupees(interest.sum()),
+        'total_payment': _rupees(payment.sum()),
+        'instalments': [
+            {
+                'number': int(k),
+                'due_date': add_months(start, int(k)).isoformat(),
+                'payment': _rupees(pay),
+                'principal': _rupees(prin),
+                'interest': _rupees(intr),
+                'balance': _rupees(bal),
+            }
+            for k, pay, prin, intr, bal in zip(instalment, payment, principal_part, interest, balance)
+        ],
+    }
+
+
+def portfolio(rows, as_of, horizon=12):
+    """
+    Summarize ``(amount, interest_rate, term_months, approved_at)`` rows of approved loans.
+
+    Outstanding principal assumes every instalment due by ``as_of`` was paid.
+    ``expected_collections`` lists the instalments due in each of the next ``horizon`` months.
+    """
+    totals = {'loans': 0, 'principal': 0, 'outstanding': 0, 'total_interest': 0}
+    collections = np.zeros(horizon, dtype='int64')
+    rows = iter(rows)
+    while True:
+        chunk = [row for _, row in zip(range(CHUNK_LOANS), rows)]
+        if not chunk:
+            break
+        amount, rate, term, approved = zip(*chunk)
+        principal = _round_half_up(np.array(amount, dtype='float64') * 100)
+        rate = np.array(rate, dtype='float64')
+        term = np.array(term, dtype='int64')
+        elapsed = np.array(
+            [(as_of.year - a.year) * 12 + as_of.month - a.month - (as_of.day < a.day) for a in approved],
+            dtype='int64',
+        ).clip(0)
+        paid = np.minimum(elapsed, term)
+
+        loan_index, instalment, payment, _, interest, balance = schedules(principal, rate, term)
+        totals['loans'] += len(chunk)
+        totals['principal'] += int(principal.sum())
+        totals['total_interest'] += int(interest.sum())
+        # Balance after the last instalment already due; untouched loans owe everything
+        settled = instalment == paid[loan_index]
+        totals['outstanding'] += int(balance[settled].sum()) + int(principal[paid == 0].sum())
+        # Instalment k falls due ``k - paid - 1`` months from now
+        ahead = instalment - paid[loan_index] - 1
+        upcoming = (ahead >= 0) & (ahead < horizon)
+        np.add.at(collections, ahead[upcoming], payment[upcoming])
+
+    return {
+        'loans': totals['loans'],
+        'principal': _rupees(totals['principal']),
+        'outstanding': _rupees(totals['outstanding']),
+        'total_interest': _rupees(totals['total_interest']),
+        'expected_collections': [
+            {'month': add_months(date(as_of.year, as_of.month, 1), i + 1).strftime('%Y-%m'), 'amount': _rupees(v)}
+            for i, v in enumerate(collections)
+        ],
+    }
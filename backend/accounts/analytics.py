@@ -0,0 +1,178 @@
+"""
+Cash-flow analytics over a user's transactions.
+
+Both sides of the history are fetched with ``values_list`` and transposed into
+NumPy columns. Bucketing (day / ISO week / month), the type and counterparty splits
+and the rolling average are all vectorized. Money stays in int64 paise, as in
+``amortization``, so every sum is exact; it becomes Decimal only in the payload. Results are cached per user under a
+version key that the ledger bumps whenever one of the user's accounts posts.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from django.core.cache import cache
+
+from .models import Transaction, User
+from .pagination import apply_date_range
+
+GRANULARITIES = ('day', 'week', 'month')
+DEFAULT_WINDOW = 7
+MAX_WINDOW = 90
+TOP_COUNTERPARTIES = 10
+RESULT_TTL = 3600
+
+_TYPES = [choice for choice, _ in Transaction.TYPE_CHOICES]
+_TYPE_CODES = {t: i for i, t in enumerate(_TYPES)}
+
+
+def _version_key(user_id):
+    return f'analytics:{user_id}:version'
+
+
+def invalidate(user_ids):
+    """Start a new cache generation for these users; old results simply expire."""
+    version = time.time_ns()
+    cache.set_many({_version_key(user_id): version for user_id in user_ids}, None)
+
+
+def _columns(rows, sign):
+    """Transpose ``(created_at, amount, type, counterparty_id)`` rows into arrays; amounts in paise."""
+    if not rows:
+        return np.empty(0, 'int64'), np.empty(0, 'int64'), np.empty(0, 'int64'), np.empty(0, 'int64')
+    created, amount, tx_type, counterparty = zip(*rows)
+    seconds = np.fromiter((d.timestamp() for d in created), dtype='float64', count=len(rows)).astype('int64')
+    amounts = np.fromiter((int(a * 100) for a in amount), dtype='int64', count=len(rows)) * sign
+    types = np.fromiter((_TYPE_CODES.get(t, -1) for t in tx_type), dtype='int64', count=len(rows))
+    counterparties = np.array([-1 if c is None else c for c in counterparty], dtype='int64')
+    return seconds, amounts, types, counterparties
+
+
+def load_columns(user, params):
+    """Signed columns for the user's history: inflows positive, outflows negative."""
+    base = apply_date_range(Transaction.objects.order_by(), params)
+    outgoing = list(base.filter(from_user=user).values_list('created_at', 'amount', 'type', 'to_user_id'))
+    incoming = list(base.filter(to_user=user).values_list('created_at', 'amount', 'type', 'from_user_id'))
+    parts = [_columns(outgoing, -1), _columns(incoming, 1)]
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def _buckets(seconds, granularity):
+    days = (seconds // 86400).astype('datetime64[D]')
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]'), 'M'
+    if granularity == 'week':
+        # 1970-01-01 was a Thursday; shift every day back to its Monday
+        return days - ((days.astype('int64') + 3) % 7).astype('timedelta64[D]'), 'W'
+    return days, 'D'
+
+
+def _sum_by(index, values, size):
+    # np.bincount would sum the weights in float64
+    totals = np.zeros(size, dtype='int64')
+    np.add.at(totals, index, values)
+    return totals
+
+
+def _rupees(paise):
+    return str(Decimal(int(paise)).scaleb(-2))
+
+
+def _money(values):
+    return [_rupees(v) for v in values]
+
+
+def _mean_money(totals, counts):
+    # Mean in paise, rounded half up like the amounts on the statements
+    return [
+        _rupees((Decimal(int(t)) / int(c)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        for t, c in zip(totals, counts)
+    ]
+
+
+def summarize(seconds, amounts, types, counterparties, granularity='day', window=DEFAULT_WINDOW):
+    """Aggregate signed paise columns into the analytics payload (counterparty usernames excluded)."""
+    amounts = np.asarray(amounts, dtype='int64')
+    inflow = np.where(amounts > 0, amounts, 0)
+    outflow = np.where(amounts < 0, -amounts, 0)
+
+    series = []
+    if len(seconds):
+        buckets, unit = _buckets(seconds, granularity)
+        if unit == 'M':
+            first, last = buckets.min().astype('datetime64[M]'), buckets.max().astype('datetime64[M]')
+            periods = np.arange(first, last + 1).astype('datetime64[D]')
+        else:
+            step = 7 if unit == 'W' else 1
+            periods = np.arange(buckets.min(), buckets.max() + 1, step)
+        index = np.searchsorted(periods, buckets)
+        bucket_in = _sum_by(index, inflow, len(periods))
+        bucket_out = _sum_by(index, outflow, len(periods))
+        net = bucket_in - bucket_out
+        # Trailing mean over up to ``window`` buckets
+        csum = np.concatenate(([0], np.cumsum(net)))
+        span = np.minimum(np.arange(1, len(net) + 1), window)
+        rolling = csum[1:] - csum[np.arange(1, len(net) + 1) - span]
+        series = [
+            {'period': str(p), 'inflow': i, 'outflow': o, 'net': n, 'rolling_net': r}
+            for p, i, o, n, r in zip(
+                periods.astype(str), _money(bucket_in), _money(bucket_out), _money(net), _mean_money(rolling, span),
+            )
+        ]
+
+    valid_types = types >= 0
+    type_in = _sum_by(types[valid_types], inflow[valid_types], len(_TYPES))
+    type_out = _sum_by(types[valid_types], outflow[valid_types], len(_TYPES))
+    by_type = {
+        t: {'inflow': i, 'outflow': o}
+        for t, i, o in zip(_TYPES, _money(type_in), _money(type_out))
+    }
+
+    top = []
+    has_cp = counterparties >= 0
+    if has_cp.any():
+        ids, inverse, counts = np.unique(counterparties[has_cp], return_inverse=True, return_counts=True)
+        cp_in = _sum_by(inverse, inflow[has_cp], len(ids))
+        cp_out = _sum_by(inverse, outflow[has_cp], len(ids))
+        order = np.argsort(-(cp_in + cp_out), kind='stable')[:TOP_COUNTERPARTIES]
+        top = [
+            {'user_id': int(ids[k]), 'inflow': _rupees(cp_in[k]), 'outflow': _rupees(cp_out[k]), 'count': int(counts[k])}
+            for k in order
+        ]
+
+    return {
+        'granularity': granularity,
+        'window': window,
+        'total_inflow': _rupees(inflow.sum()),
+        'total_outflow': _rupees(outflow.sum()),
+        'series': series,
+        'by_type': by_type,
+        'top_counterparties': top,
+    }
+
+
+def get_analytics(user, params):
+    """Cached analytics for ``user``; raises ValueError on bad parameters."""
+    granularity = params.get('granularity') or 'day'
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    try:
+        window = int(params.get('window') or DEFAULT_WINDOW)
+    except ValueError:
+        raise ValueError('window must be an integer.')
+    window = max(1, min(window, MAX_WINDOW))
+
+    version = cache.get(_version_key(user.id), 0)
+    key = f"analytics:{user.id}:{version}:{granularity}:{window}:{params.get('date_from') or ''}:{params.get('date_to') or ''}"
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    result = summarize(*load_columns(user, params), granularity=granularity, window=window)
+    names = dict(User.objects.filter(id__in=[c['user_id'] for c in result['top_counterparties']]).values_list('id', 'username'))
+    for entry in result['top_counterparties']:
+        entry['username'] = names.get(entry['user_id'])
+    result['generated_at'] = datetime.now(dt_timezone.utc).isoformat()
+    cache.set(key, result, RESULT_TTL)
+    return result
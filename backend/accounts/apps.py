@@ -7,3 +7,11 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         import accounts.consumers
+        from django.db.models.signals import post_delete, post_save
+        from accounts.models import User
+        from accounts import authentication, payees, realtime
+
+        post_delete.connect(realtime.user_deleted, sender=User, dispatch_uid='accounts.user_deleted')
+        post_delete.connect(payees.user_deleted, sender=User, dispatch_uid='accounts.payee_deleted')
+        post_save.connect(authentication.user_saved, sender=User, dispatch_uid='accounts.auth_user_saved')
+        post_delete.connect(authentication.user_saved, sender=User, dispatch_uid='accounts.auth_user_deleted')
@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CACHE_TIMEOUT = 60
+
+# What authentication and the hot views read from request.user. The balance pair is
+# exact even when stale (see ledger.get_balance). Anything else, including the
+# password hash, is never cached and loads from the database on first access.
+CACHED_FIELDS = (
+    'id', 'email', 'username', 'account_number', 'is_active', 'is_staff', 'is_superuser',
+    'balance', 'last_snapshot_id', 'balance_shards',
+)
+
+
+def cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    """Drop the cached user after a password, profile or balance change."""
+    cache.delete(cache_key(user_id))
+
+
+def user_saved(sender, instance, **kwargs):
+    # Connected to post_save/post_delete on User, so admin and any other ORM save
+    # revoke the cached copy as soon as the change is visible. Read the pk now:
+    # delete() clears it before the commit runs
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+def cache_entry(user):
+    entry = {name: getattr(user, name) for name in CACHED_FIELDS}
+    if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+        from rest_framework_simplejwt.utils import get_md5_hash_password
+
+        entry['revoke'] = get_md5_hash_password(user.password)
+    return entry
+
+
+def user_from_entry(entry):
+    """Rebuild a User from a cache entry; fields not in the entry are deferred."""
+    User = get_user_model()
+    # from_db pairs partial values with fields in model order, not in the order given
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in CACHED_FIELDS]
+    return User.from_db(User.objects.db, names, [entry[name] for name in names])
+
+
+def load_user(user_id):
+    """Read a user by token id into the cache; returns ``(user, entry)``, or ``None`` when it no longer exists."""
+    User = get_user_model()
+    try:
+        user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except User.DoesNotExist:
+        return None
+    entry = cache_entry(user)
+    cache.set(cache_key(user_id), entry, USER_CACHE_TIMEOUT)
+    return user, entry
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    SimpleJWT authentication that resolves the token's user from the shared cache,
+    so hot authenticated GETs skip the per-request primary-key lookup.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            user = super().get_user(validated_token)
+            cache.set(key, cache_entry(user), USER_CACHE_TIMEOUT)
+            return user
+
+        self.check_cached_user(entry, validated_token)
+        return user_from_entry(entry)
+
+    def check_cached_user(self, entry, validated_token):
+        # Same checks the uncached path performs against the database row
+        if not entry['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry.get('revoke'):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
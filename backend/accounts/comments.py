@@ -0,0 +1,64 @@
+"""
+Per-blog comment trees.
+
+The whole tree for a blog is loaded with a single query, assembled in memory and
+cached until a new comment is posted on that blog. The cache holds author ids only:
+usernames and profile image URLs are attached per request, for the page being
+served, so profile changes show up immediately and URLs are built for the host
+that asked.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from .models import Comment, User
+from .serializers import CommentNodeSerializer, build_profile_image_url
+
+CACHE_TIMEOUT = 300
+
+
+def _cache_key(blog_id):
+    return f'blog:{blog_id}:comments'
+
+
+def build_comment_tree(blog_id):
+    comments = Comment.objects.filter(blog_id=blog_id).order_by('created_at', 'id')
+    threads, replies_by_parent = [], defaultdict(list)
+    for comment in CommentNodeSerializer(comments, many=True).data:
+        if comment['parent'] is None:
+            threads.append(comment)
+        else:
+            replies_by_parent[comment['parent']].append(comment)
+    # Only one-level nesting to keep payload small
+    return [{**thread, 'replies': replies_by_parent.get(thread['id'], [])} for thread in threads]
+
+
+def get_comment_tree(blog_id):
+    """Top-level threads (each with its direct replies), oldest first, without author details."""
+    tree = cache.get(_cache_key(blog_id))
+    if tree is None:
+        tree = build_comment_tree(blog_id)
+        cache.set(_cache_key(blog_id), tree, CACHE_TIMEOUT)
+    return tree
+
+
+def attach_authors(threads, request=None):
+    """Copies of ``threads`` with each comment's author username and profile image URL; one query."""
+    author_ids = {c['author'] for thread in threads for c in [thread, *thread['replies']]}
+    authors = User.objects.filter(id__in=author_ids).only('id', 'username', 'profile_image', 'profile_image_version')
+    details = {
+        author.id: {'author_username': author.username, 'author_profile_image_url': build_profile_image_url(author, request)}
+        for author in authors
+    }
+    missing = {'author_username': None, 'author_profile_image_url': None}
+
+    def with_author(comment):
+        node = {'id': comment['id'], 'author': comment['author'], **details.get(comment['author'], missing)}
+        node.update(comment)
+        return node
+
+    return [{**with_author(thread), 'replies': [with_author(reply) for reply in thread['replies']]} for thread in threads]
+
+
+def invalidate_comment_tree(blog_id):
+    cache.delete(_cache_key(blog_id))
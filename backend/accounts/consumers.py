@@ -1,29 +1,77 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth import get_user_model
-from channels.db import database_sync_to_async
 import json
+from . import directory
+from .directory import USER_DIRECTORY_GROUP
+from .realtime import BLOG_FEED_GROUP, user_group
 
 User = get_user_model()
 
 class UserListConsumer(AsyncWebsocketConsumer):
+    PAGE_SIZE = 500
+
     async def connect(self):
         user = self.scope["user"]
+        self.acquired = False
         if user.is_anonymous:
             await self.close()
         else:
+            # Subscribe before loading so no diff can fall between the load and the subscription
+            await self.channel_layer.group_add(USER_DIRECTORY_GROUP, self.channel_name)
             await self.accept()
-            users = await self.get_other_users(user)
-            await self.send(text_data=json.dumps({
-                "users": users
-            }))
-
-    @database_sync_to_async
-    def get_other_users(self, current_user):
-        return [
-            {
-                "username": u.username,
-                "email": u.email,
-                "account_number": u.account_number,
-            }
-            for u in User.objects.exclude(id=current_user.id)
-        ] 
\ No newline at end of file
+            users = await directory.snapshot.acquire()
+            self.acquired = True
+            others = [entry for user_id, entry in users.items() if user_id != user.id]
+            for start in range(0, len(others), self.PAGE_SIZE) or [0]:
+                await self.send(text_data=json.dumps({
+                    "event": "users_page",
+                    "data": {
+                        "users": others[start:start + self.PAGE_SIZE],
+                        "done": start + self.PAGE_SIZE >= len(others),
+                    },
+                }))
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(USER_DIRECTORY_GROUP, self.channel_name)
+        if self.acquired:
+            directory.snapshot.release()
+
+    async def directory_event(self, event):
+        directory.snapshot.apply(event["op"], event["id"], event["user"])
+        if event["id"] != self.scope["user"].id:
+            await self.send(text_data=event["text"])
+
+
+class PushConsumer(AsyncWebsocketConsumer):
+    """Authenticated consumer that relays pre-encoded ``push.event`` messages from one group."""
+    group_name = None
+
+    def get_group_name(self, user):
+        return self.group_name
+
+    async def connect(self):
+        user = self.scope["user"]
+        if user.is_anonymous:
+            await self.close()
+            return
+        self.group = self.get_group_name(user)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, 'group', None):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def push_event(self, event):
+        await self.send(text_data=event["text"])
+
+
+class BlogFeedConsumer(PushConsumer):
+    group_name = BLOG_FEED_GROUP
+
+
+class AccountConsumer(PushConsumer):
+    """Balance and transaction updates for the connected user only."""
+
+    def get_group_name(self, user):
+        return user_group(user.id)
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Process-wide snapshot of the users directory for ``UserListConsumer``.
+
+The first subscriber in a worker loads the directory with one query; later
+subscribers page out of the same in-memory snapshot. Add/update/remove diffs
+arrive over the ``user_directory`` channel group and are applied to the snapshot
+(idempotently) before being forwarded to clients. The snapshot is dropped when
+the last subscriber leaves, because nothing keeps it current after that.
+"""
+import asyncio
+
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+
+USER_DIRECTORY_GROUP = 'user_directory'
+
+User = get_user_model()
+
+
+def directory_entry(user):
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "account_number": user.account_number,
+    }
+
+
+@database_sync_to_async
+def _load():
+    return {
+        row["id"]: row
+        for row in User.objects.order_by('id').values('id', 'username', 'email', 'account_number').iterator()
+    }
+
+
+class DirectorySnapshot:
+    def __init__(self):
+        self.users = None
+        self.subscribers = 0
+        self._lock = asyncio.Lock()
+        self._building = False
+        self._pending = []
+
+    async def acquire(self):
+        self.subscribers += 1
+        try:
+            async with self._lock:
+                if self.users is None:
+                    # Diffs that arrive while loading are replayed on top of the fresh load
+                    self._building, self._pending = True, []
+                    try:
+                        users = await _load()
+                    finally:
+                        self._building = False
+                    for op, user_id, entry in self._pending:
+                        self._apply_to(users, op, user_id, entry)
+                    self._pending = []
+                    self.users = users
+                return self.users
+        except BaseException:
+            # A failed (or cancelled) load must not leave a subscriber behind that
+            # would keep an unmaintained snapshot alive after the real ones leave
+            self.release()
+            raise
+
+    def release(self):
+        self.subscribers -= 1
+        if self.subscribers <= 0:
+            self.subscribers = 0
+            self.users = None
+
+    def apply(self, op, user_id, entry):
+        if self.users is not None:
+            self._apply_to(self.users, op, user_id, entry)
+        elif self._building:
+            self._pending.append((op, user_id, entry))
+
+    @staticmethod
+    def _apply_to(users, op, user_id, entry):
+        if op == 'remove':
+            users.pop(user_id, None)
+        else:
+            users[user_id] = entry
+
+
+snapshot = DirectorySnapshot()
@@ -0,0 +1,99 @@
+"""
+Blog feed pagination, caching and incremental sync.
+
+The ids on the first page of the feed are cached and shared by every client until a
+blog is created or deleted; the blogs and their authors are loaded per request, so
+author details are current and URLs are built for the host that asked. Clients keep
+the ``sync`` token from their last response and poll with ``?since=<token>`` to
+receive only blogs created and ids deleted since then; when nothing changed the
+answer comes from the cache without touching the database.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Blog, BlogTombstone
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, keyset_before, merge_newest_first
+from .serializers import BlogSerializer
+
+FIRST_PAGE_KEY = 'blog_feed:first_page'
+LAST_CHANGE_KEY = 'blog_feed:last_change'
+CACHE_TIMEOUT = 300
+TOMBSTONE_RETENTION = timedelta(days=7)
+# created_at is stamped at insert, so a blog can commit after a sync later than its timestamp
+COMMIT_GRACE = timedelta(minutes=1)
+
+
+def _feed():
+    return Blog.objects.select_related('author').order_by('-created_at', '-id')
+
+
+def _sync_token(now):
+    return encode_cursor(now, 0)
+
+
+def _page(request, rows, next_cursor, sync):
+    return {
+        'results': BlogSerializer(rows, many=True, context={'request': request}).data,
+        'next_cursor': next_cursor,
+        'sync': sync,
+    }
+
+
+def get_page(request, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of the feed, newest first; the default first page's ids are served from the cache."""
+    shared = cursor is None and limit == DEFAULT_PAGE_SIZE
+    if shared:
+        cached = cache.get(FIRST_PAGE_KEY)
+        if cached is not None:
+            blogs = _feed().in_bulk(cached['ids'])
+            rows = [blogs[blog_id] for blog_id in cached['ids'] if blog_id in blogs]
+            return _page(request, rows, cached['next_cursor'], cached['sync'])
+    now = timezone.now()
+    qs = _feed()
+    if cursor:
+        qs = qs.filter(keyset_before(cursor))
+    rows, next_cursor = merge_newest_first([qs], limit)
+    sync = _sync_token(now)
+    if shared:
+        cached = {'ids': [blog.id for blog in rows], 'next_cursor': next_cursor, 'sync': sync}
+        cache.set(FIRST_PAGE_KEY, cached, CACHE_TIMEOUT)
+    return _page(request, rows, next_cursor, sync)
+
+
+def get_changes(request, since):
+    """
+    Blogs created and ids deleted since a ``sync`` token; ``reset`` asks the client to reload.
+
+    Blogs stamped up to ``COMMIT_GRACE`` before the token are sent again, so clients merge
+    the results by id.
+    """
+    synced_at, _ = decode_cursor(since)
+    now = timezone.now()
+    last_change = cache.get(LAST_CHANGE_KEY)
+    if last_change is not None and last_change < synced_at:
+        return {'results': [], 'deleted': [], 'sync': since, 'reset': False}
+    if synced_at < now - TOMBSTONE_RETENTION:
+        return {'results': [], 'deleted': [], 'sync': None, 'reset': True}
+    created = list(_feed().filter(created_at__gt=synced_at - COMMIT_GRACE)[:MAX_PAGE_SIZE + 1])
+    if len(created) > MAX_PAGE_SIZE:
+        return {'results': [], 'deleted': [], 'sync': None, 'reset': True}
+    deleted = list(BlogTombstone.objects.filter(deleted_at__gte=synced_at).values_list('blog_id', flat=True))
+    return {
+        'results': BlogSerializer(created, many=True, context={'request': request}).data,
+        'deleted': deleted,
+        'sync': _sync_token(now),
+        'reset': False,
+    }
+
+
+def mark_changed():
+    cache.set(LAST_CHANGE_KEY, timezone.now(), None)
+    cache.delete(FIRST_PAGE_KEY)
+
+
+def record_deletion(blog_id):
+    BlogTombstone.objects.create(blog_id=blog_id)
+    BlogTombstone.objects.filter(deleted_at__lt=timezone.now() - TOMBSTONE_RETENTION).delete()
+    mark_changed()
@@ -0,0 +1,89 @@
+"""
+``Idempotency-Key`` support for money-moving endpoints.
+
+The first request with a key claims a row for ``(user, key)`` before running the view,
+in the same ``transaction.atomic`` block as the business change, and stores the
+response there. The key therefore exists exactly when the change committed.
+
+A retry with the same key returns the stored response after a plain read and takes
+no row locks. A duplicate that arrives while the original is still running waits on
+the unique index, then replays once the original commits. Reusing a key with a
+different body or on a different endpoint is rejected with 422. Keys expire after
+``KEY_TTL``. ``purge_idempotency_keys`` deletes expired rows.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+KEY_TTL = timedelta(hours=24)
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _replay(user, key, request_fingerprint, cutoff):
+    stored = IdempotencyKey.objects.filter(user=user, key=key, created_at__gte=cutoff).first()
+    if stored is None or stored.response_status is None:
+        return None
+    if stored.fingerprint != request_fingerprint:
+        return Response({'error': f'{HEADER} was already used for a different request.'}, status=422)
+    return Response(stored.response_body, status=stored.response_status, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(handler):
+    """Make an APIView handler replay-safe when the client sends an ``Idempotency-Key`` header."""
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return handler(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'}, status=400)
+
+        request_fingerprint = fingerprint(request)
+        cutoff = timezone.now() - KEY_TTL
+        replay = _replay(request.user, key, request_fingerprint, cutoff)
+        if replay is not None:
+            return replay
+
+        try:
+            with transaction.atomic():
+                # An expired row with the same key must not block a fresh claim
+                IdempotencyKey.objects.filter(user=request.user, key=key, created_at__lt=cutoff).delete()
+                claim = IdempotencyKey.objects.create(user=request.user, key=key, fingerprint=request_fingerprint)
+                response = handler(view, request, *args, **kwargs)
+                claim.response_status = response.status_code
+                claim.response_body = response.data
+                claim.save(update_fields=['response_status', 'response_body'])
+        except IntegrityError:
+            # A concurrent request with the same key committed first
+            replay = _replay(request.user, key, request_fingerprint, cutoff)
+            if replay is None:
+                raise
+            return replay
+        return response
+
+    return wrapper
+
+
+def purge_expired(batch_size=5000):
+    """Delete expired keys in batches; returns the number removed."""
+    cutoff = timezone.now() - KEY_TTL
+    removed = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
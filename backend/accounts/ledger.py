@@ -0,0 +1,369 @@
+"""
+Append-only double-entry ledger behind ``User.balance``.
+
+Every money movement is a ``Transaction`` plus one ``LedgerEntry`` per affected
+account. ``User.balance`` holds the balance as of the account's latest snapshot,
+``User.last_snapshot_id``. Folding stamps each entry with the snapshot that took it,
+so the live balance is that value plus the entries not yet folded into it. Entry
+ids and clocks play no part, so an entry that commits late is folded by the next
+snapshot instead of being skipped. Credits are plain inserts and never touch the
+receiver's row; only debits lock the payer's row to check funds.
+
+Hot payer accounts can opt into ``balance_shards > 1``. Their balance is then split
+across ``BalanceShard`` rows. Credits land on a random shard, and a debit locks only
+enough randomly chosen shards to cover the amount, so concurrent debits rarely wait
+on each other. No shard ever goes negative, so covering a debit from a subset of
+shards is enough to keep the account total non-negative. Shards are always locked in
+ascending order; a debit that needs more shards than it holds never waits for them
+but raises ``ShardsBusy`` so its transaction is rolled back and retried. The total
+balance is still ``get_balance``.
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import DatabaseError, OperationalError, transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from . import analytics, statements
+from .authentication import invalidate_user
+from .models import BalanceShard, BalanceSnapshot, LedgerEntry, Transaction, User
+
+ZERO = Decimal('0.00')
+
+# Entries younger than this are left for the next pass, so snapshots rarely wait on
+# postings still in flight and a month's statement is only closed once it has settled.
+SNAPSHOT_GRACE = timedelta(minutes=1)
+
+_signed_amount = Case(
+    When(entry_type=LedgerEntry.DEBIT, then=-F('amount')),
+    default=F('amount'),
+)
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+class ShardsBusy(OperationalError):
+    """A debit needs shards held by concurrent debits; retry its whole transaction."""
+
+
+def _not_in(last_snapshot_id):
+    # Entries not included in the balance as of ``last_snapshot_id``. Entries folded by
+    # a later snapshot count too, so a stale (balance, last_snapshot_id) pair stays exact.
+    return Q(snapshot__isnull=True) | Q(snapshot_id__gt=last_snapshot_id)
+
+
+def get_balance(user):
+    """Live balance: snapshot balance plus every entry not folded into that snapshot."""
+    delta = LedgerEntry.objects.filter(
+        _not_in(user.last_snapshot_id), account_id=user.id,
+    ).aggregate(total=Sum(_signed_amount))['total']
+    return user.balance + (delta or ZERO)
+
+
+def get_balances(users):
+    """Live balances for several accounts in one aggregate query, keyed by user id."""
+    users = list(users)
+    if not users:
+        return {}
+    window = Q()
+    for user in users:
+        window |= Q(account_id=user.id) & _not_in(user.last_snapshot_id)
+    deltas = dict(
+        LedgerEntry.objects.filter(window)
+        .values('account_id')
+        .annotate(total=Sum(_signed_amount))
+        .values_list('account_id', 'total')
+    )
+    return {user.id: user.balance + (deltas.get(user.id) or ZERO) for user in users}
+
+
+def lock_accounts(user_ids):
+    """
+    Lock payer rows in ascending id order; must run inside ``transaction.atomic``.
+
+    Sharded accounts also have every shard locked, which makes the whole balance
+    exclusive to the caller just like an unsharded row lock.
+    """
+    users = {u.id: u for u in User.objects.select_for_update().filter(id__in=set(user_ids)).order_by('id')}
+    sharded = [user_id for user_id, user in users.items() if user.balance_shards > 1]
+    if sharded:
+        list(BalanceShard.objects.select_for_update().filter(account_id__in=sharded).order_by('account_id', 'shard'))
+    return users
+
+
+def lock_payer(user):
+    """
+    Prepare ``user`` for a single ``post`` debit.
+
+    Unsharded accounts get their row locked. Sharded accounts are returned as is,
+    because ``post`` locks just the shards it debits.
+    """
+    if user.balance_shards > 1:
+        return user
+    return lock_accounts([user.id])[user.id]
+
+
+def _shard_balances(account_id, shards=None, lock=False, count=None, nowait=False):
+    rows = BalanceShard.objects.filter(account_id=account_id)
+    if shards is not None:
+        rows = rows.filter(shard__in=shards)
+    if lock:
+        rows = rows.select_for_update(nowait=nowait).order_by('shard')
+    rows = list(rows)
+    if not rows:
+        return {}
+    # All shards of an account are folded together, so they share last_snapshot_id
+    deltas = dict(
+        _shard_deltas(account_id, count or len(rows))
+        .filter(_not_in(rows[0].last_snapshot_id), effective_shard__in=[r.shard for r in rows])
+        .values_list('effective_shard', 'total')
+    )
+    return {r.shard: r.balance + (deltas.get(r.shard) or ZERO) for r in rows}
+
+
+def _shard_deltas(account_id, count):
+    # Entries posted before a re-shard may carry shard numbers >= count; modulo maps them onto a live shard
+    return (
+        LedgerEntry.objects.filter(account_id=account_id)
+        .annotate(effective_shard=Mod('shard', count))
+        .values('effective_shard')
+        .annotate(total=Sum(_signed_amount))
+    )
+
+
+def _allocate(balances, amount):
+    """Split a debit over shards, largest first; returns ``[(shard, part)]`` and updates ``balances``."""
+    parts, remaining = [], amount
+    for shard in sorted(balances, key=balances.get, reverse=True):
+        if remaining <= 0:
+            break
+        part = min(balances[shard], remaining)
+        if part > 0:
+            parts.append((shard, part))
+            balances[shard] -= part
+            remaining -= part
+    if remaining > 0:
+        raise InsufficientFunds()
+    return parts
+
+
+def _claim_shards(account_id, amount):
+    """Lock enough of a sharded account's shards to cover ``amount``; None if it has none."""
+    estimate = _shard_balances(account_id)
+    if not estimate:
+        return None
+    # Random order spreads concurrent debits over different shards
+    order = [shard for shard, balance in estimate.items() if balance > 0]
+    random.shuffle(order)
+    chosen, covered = [], ZERO
+    for shard in order:
+        chosen.append(shard)
+        covered += estimate[shard]
+        if covered >= amount:
+            break
+    balances = _shard_balances(account_id, chosen, lock=True, count=len(estimate)) if chosen else {}
+    if sum(balances.values(), ZERO) < amount:
+        # Concurrent debits drained the chosen shards; settle it against the whole account.
+        # Waiting for the other shards while holding these could lock out of shard order,
+        # so take them only if they are free and otherwise give up every lock and retry.
+        try:
+            balances = _shard_balances(account_id, lock=True, nowait=True)
+        except DatabaseError as exc:
+            raise ShardsBusy(f'Shards of account {account_id} are held by concurrent debits.') from exc
+    return _allocate(balances, amount)
+
+
+def _entries(tx, from_user, to_user, amount, debit_parts=None):
+    entries = []
+    if from_user is not None:
+        for shard, part in debit_parts or [(0, amount)]:
+            entries.append(LedgerEntry(
+                account=from_user, transaction=tx, entry_type=LedgerEntry.DEBIT, amount=part, shard=shard,
+            ))
+    if to_user is not None:
+        shard = random.randrange(to_user.balance_shards) if to_user.balance_shards > 1 else 0
+        entries.append(LedgerEntry(
+            account=to_user, transaction=tx, entry_type=LedgerEntry.CREDIT, amount=amount, shard=shard,
+        ))
+    return entries
+
+
+def _changed(txs):
+    account_ids = {user_id for tx in txs for user_id in (tx.from_user_id, tx.to_user_id) if user_id is not None}
+    transaction.on_commit(lambda: analytics.invalidate(account_ids))
+
+
+def post(tx_type, amount, from_user=None, to_user=None):
+    """
+    Record a Transaction and its ledger entries.
+
+    Debiting ``from_user`` requires the caller to have called ``lock_payer`` (or
+    ``lock_accounts``) inside the same atomic block; the funds check is done here.
+    """
+    debit_parts = None
+    if from_user is not None:
+        if from_user.balance_shards > 1:
+            debit_parts = _claim_shards(from_user.id, amount)
+            if debit_parts is None:
+                # Sharding was switched off after the caller loaded the account
+                from_user = lock_accounts([from_user.id])[from_user.id]
+        if debit_parts is None and get_balance(from_user) < amount:
+            raise InsufficientFunds()
+    tx = Transaction.objects.create(type=tx_type, from_user=from_user, to_user=to_user, amount=amount)
+    LedgerEntry.objects.bulk_create(_entries(tx, from_user, to_user, amount, debit_parts))
+    _changed([tx])
+    return tx
+
+
+def post_many(postings):
+    """
+    Bulk variant of ``post`` for ``(tx_type, amount, from_user, to_user)`` tuples.
+
+    Funds must already have been checked by the caller under ``lock_accounts``.
+    Costs one INSERT for the transactions, at most one SELECT to recover their ids,
+    and one INSERT for the entries, plus one SELECT per sharded payer.
+    """
+    txs = [
+        Transaction(type=tx_type, amount=amount, from_user=from_user, to_user=to_user)
+        for tx_type, amount, from_user, to_user in postings
+    ]
+    if not txs:
+        return []
+    Transaction.objects.bulk_create(txs)
+    if any(tx.pk is None for tx in txs):
+        ids = dict(
+            Transaction.objects.filter(reference__in=[tx.reference for tx in txs]).values_list('reference', 'id')
+        )
+        for tx in txs:
+            tx.pk = ids[tx.reference]
+    # Shards of sharded payers are already locked by lock_accounts
+    shard_balances = {}
+    entries = []
+    for tx in txs:
+        debit_parts = None
+        if tx.from_user is not None and tx.from_user.balance_shards > 1:
+            if tx.from_user_id not in shard_balances:
+                shard_balances[tx.from_user_id] = _shard_balances(tx.from_user_id)
+            if shard_balances[tx.from_user_id]:
+                debit_parts = _allocate(shard_balances[tx.from_user_id], tx.amount)
+        entries.extend(_entries(tx, tx.from_user, tx.to_user, tx.amount, debit_parts))
+    LedgerEntry.objects.bulk_create(entries)
+    _changed(txs)
+    return txs
+
+
+# MySQL deadlock / lock wait timeout, PostgreSQL serialization failure / deadlock
+RETRYABLE_ERROR_CODES = {1213, 1205, '40001', '40P01'}
+
+
+def is_retryable(exc):
+    if isinstance(exc, ShardsBusy):
+        return True
+    cause = exc.__cause__ or exc
+    code = getattr(cause, 'pgcode', None) or (cause.args[0] if cause.args else None)
+    return code in RETRYABLE_ERROR_CODES or 'deadlock' in str(exc).lower()
+
+
+def run_atomic_with_retry(fn, attempts=3, backoff=0.05):
+    """Run ``fn`` in its own atomic block, retrying it on a deadlock or ``ShardsBusy``."""
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                return fn()
+        except OperationalError as exc:
+            if attempt == attempts or not is_retryable(exc):
+                raise
+            time.sleep(backoff * attempt)
+
+
+def take_snapshot(account_id, cutoff=None):
+    """
+    Fold the account's unfolded entries (created by ``cutoff``, if given) into
+    ``User.balance`` and its statements. Returns the new ``BalanceSnapshot`` or None.
+    """
+    with transaction.atomic():
+        user = User.objects.select_for_update().get(id=account_id)
+        unfolded = LedgerEntry.objects.filter(account_id=account_id, snapshot__isnull=True)
+        if cutoff is not None:
+            unfolded = unfolded.filter(created_at__lte=cutoff)
+        if not unfolded.exists():
+            return None
+        snapshot = BalanceSnapshot.objects.create(account_id=account_id, balance=user.balance)
+        # Stamping first makes the folded set exactly the rows this UPDATE took
+        unfolded.update(snapshot=snapshot)
+        folded = LedgerEntry.objects.filter(account_id=account_id, snapshot=snapshot)
+        snapshot.balance = user.balance + (folded.aggregate(total=Sum(_signed_amount))['total'] or ZERO)
+        snapshot.save(update_fields=['balance'])
+        statements.fold_entries(account_id, snapshot.id, user.balance)
+        User.objects.filter(id=account_id).update(balance=snapshot.balance, last_snapshot_id=snapshot.id)
+        if user.balance_shards > 1:
+            _fold_shards(account_id, snapshot.id)
+        transaction.on_commit(lambda: invalidate_user(account_id))
+        return snapshot
+
+
+def snapshot_all(grace=SNAPSHOT_GRACE):
+    """Snapshot every account with unfolded entries older than ``grace``; returns the number snapshotted."""
+    cutoff = timezone.now() - grace
+    account_ids = (
+        LedgerEntry.objects.filter(snapshot__isnull=True, created_at__lte=cutoff)
+        .values_list('account_id', flat=True)
+        .distinct()
+    )
+    count = 0
+    for account_id in account_ids.iterator():
+        if take_snapshot(account_id, cutoff) is not None:
+            count += 1
+    # Every entry of earlier months is folded now, so their statements are final
+    statements.close_statements(statements.month_start(timezone.now() - grace))
+    return count
+
+
+def _fold_shards(account_id, snapshot_id):
+    shards = list(BalanceShard.objects.select_for_update().filter(account_id=account_id).order_by('shard'))
+    if not shards:
+        return
+    deltas = dict(
+        _shard_deltas(account_id, len(shards))
+        .filter(snapshot_id=snapshot_id)
+        .values_list('effective_shard', 'total')
+    )
+    for row in shards:
+        row.balance += deltas.get(row.shard) or ZERO
+        row.last_snapshot_id = snapshot_id
+    BalanceShard.objects.bulk_update(shards, ['balance', 'last_snapshot_id'])
+
+
+def set_shards(user, count):
+    """
+    Split ``user``'s balance over ``count`` shards, or merge it back with ``count=1``.
+
+    The whole live balance starts on shard 0. Later credits spread out at random,
+    and debits drain shards largest first.
+    """
+    with transaction.atomic():
+        user = lock_accounts([user.id])[user.id]
+        BalanceShard.objects.filter(account_id=user.id).delete()
+        if count > 1:
+            # Entries after the snapshot keep counting towards their (modulo) shard, so
+            # offset each shard's base by its delta to move the live balance onto shard 0
+            deltas = dict(
+                _shard_deltas(user.id, count).filter(_not_in(user.last_snapshot_id))
+                .values_list('effective_shard', 'total')
+            )
+            moved = sum((deltas.get(shard) or ZERO for shard in range(1, count)), ZERO)
+            BalanceShard.objects.bulk_create([
+                BalanceShard(
+                    account_id=user.id, shard=shard, last_snapshot_id=user.last_snapshot_id,
+                    balance=user.balance + moved if shard == 0 else -(deltas.get(shard) or ZERO),
+                )
+                for shard in range(count)
+            ])
+        User.objects.filter(id=user.id).update(balance_shards=max(count, 1))
+        transaction.on_commit(lambda: invalidate_user(user.id))
@@ -0,0 +1,42 @@
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from accounts import amortization
+
+
+class Command(BaseCommand):
+    help = 'Benchmark amortization schedules and the portfolio summary on synthetic loans (no database access).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=100_000)
+        parser.add_argument('--max-term', type=int, default=120)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, loans, max_term, seed, **options):
+        rng = np.random.default_rng(seed)
+        principal = rng.integers(10_000_00, 5_000_000_00, loans)
+        rate = rng.uniform(6, 18, loans).round(2)
+        term = rng.integers(6, max_term + 1, loans)
+
+        started = time.perf_counter()
+        rows = 0
+        for start in range(0, loans, amortization.CHUNK_LOANS):
+            end = start + amortization.CHUNK_LOANS
+            loan_index, _, _, principal_part, _, balance = amortization.schedules(principal[start:end], rate[start:end], term[start:end])
+            rows += len(loan_index)
+            # Every schedule must repay its principal to the paisa
+            assert np.array_equal(np.bincount(loan_index, weights=principal_part).astype('int64'), principal[start:end])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'schedules: {loans:,} loans, {rows:,} instalments in {elapsed:.2f}s ({loans / elapsed:,.0f} loans/s)')
+
+        today = date.today()
+        approved = [datetime.combine(today - timedelta(days=int(d)), datetime.min.time()) for d in rng.integers(0, 720, loans)]
+        loan_rows = zip((Decimal(int(p)).scaleb(-2) for p in principal), rate, term, approved)
+        started = time.perf_counter()
+        summary = amortization.portfolio(loan_rows, today)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"portfolio: {summary['loans']:,} loans, outstanding {summary['outstanding']} in {elapsed:.2f}s")
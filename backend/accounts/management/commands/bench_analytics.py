@@ -0,0 +1,83 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from accounts import analytics
+from accounts.models import Transaction, User
+
+TARGET_MS = 100
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the cash-flow analytics aggregation on synthetic columns, then the cold '
+        '(database fetch + aggregation) and cached endpoint paths for a real account: '
+        '--account-number, or else the account that sent the most transfers. Read-only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--account-number')
+
+    def handle(self, *args, transactions, repeat, account_number, **options):
+        rng = np.random.default_rng(1)
+        now = int(time.time())
+        columns = (
+            now - rng.integers(0, 365 * 86400, transactions),
+            rng.integers(-50_000, 50_000, transactions),
+            rng.integers(0, len(analytics._TYPES), transactions),
+            rng.integers(-1, 1000, transactions),
+        )
+        for granularity in analytics.GRANULARITIES:
+            timings = self._time(lambda: analytics.summarize(*columns, granularity=granularity), repeat)
+            self._report(f'aggregate {granularity}', timings)
+
+        user = self._account(account_number)
+        if user is None:
+            self.stdout.write('No transactions in the database; skipping the cold endpoint benchmark.')
+            return
+        count = Transaction.objects.filter(from_user=user).count() + Transaction.objects.filter(to_user=user).count()
+        self.stdout.write(f'account {user.account_number}: {count:,} transactions')
+        load = self._time(lambda: analytics.load_columns(user, {}), max(1, repeat // 5))
+        self._report('load columns', load)
+
+        def cold_request():
+            # A new cache generation forces the database fetch, as after a posting
+            analytics.invalidate([user.id])
+            analytics.get_analytics(user, {})
+
+        cold = self._time(cold_request, max(1, repeat // 5))
+        warm = self._time(lambda: analytics.get_analytics(user, {}), repeat)
+        self._report('endpoint cold', cold)
+        self._report('endpoint cached', warm)
+        cache.delete(analytics._version_key(user.id))
+        verdict = 'within' if statistics.median(cold) <= TARGET_MS else 'OVER'
+        self.stdout.write(f'cold median is {verdict} the {TARGET_MS}ms target')
+
+    def _account(self, account_number):
+        if account_number:
+            try:
+                return User.objects.get(account_number=account_number)
+            except User.DoesNotExist:
+                raise CommandError(f'No account {account_number}.')
+        busiest = (
+            Transaction.objects.filter(from_user__isnull=False).values('from_user')
+            .annotate(n=Count('id')).order_by('-n').first()
+        )
+        return busiest and User.objects.get(id=busiest['from_user'])
+
+    def _time(self, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _report(self, label, timings):
+        self.stdout.write(f'{label:<20} median {statistics.median(timings):7.1f}ms   max {max(timings):7.1f}ms')
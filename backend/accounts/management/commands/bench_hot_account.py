@@ -0,0 +1,78 @@
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts import ledger
+from accounts.models import LedgerEntry, Transaction, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure transfers/sec out of and into one hot account, unsharded and then sharded. '
+        'Creates throwaway users and removes them afterwards; run against a MySQL bench database '
+        'with BENCH_WRITES_ALLOWED set, never production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--transfers', type=int, default=200, help='Transfers per thread per phase.')
+        parser.add_argument('--shards', type=int, default=16)
+
+    def handle(self, *args, threads, transfers, shards, **options):
+        if not settings.BENCH_WRITES_ALLOWED:
+            raise CommandError('This benchmark writes to the default database; set BENCH_WRITES_ALLOWED=true to run it.')
+        tag = uuid.uuid4().hex[:8]
+        hot = User.objects.create_user(email=f'hot-{tag}@bench.local', username=f'hot-{tag}', password=None)
+        others = [
+            User.objects.create_user(email=f'peer{i}-{tag}@bench.local', username=f'peer{i}-{tag}', password=None)
+            for i in range(threads)
+        ]
+        try:
+            funding = Decimal(threads * transfers * 4)
+            for user in [hot] + others:
+                ledger.post('DEPOSIT', funding, to_user=user)
+            for label, count in (('unsharded', 1), (f'{shards} shards', shards)):
+                ledger.set_shards(hot, count)
+                hot.refresh_from_db()
+                out_rate = self._run(threads, transfers, lambda i: (hot, others[i]))
+                in_rate = self._run(threads, transfers, lambda i: (others[i], hot))
+                self.stdout.write(f'{label:<12} debits out {out_rate:>9,.0f}/s   credits in {in_rate:>9,.0f}/s')
+        finally:
+            ids = [hot.id] + [u.id for u in others]
+            LedgerEntry.objects.filter(account_id__in=ids).delete()
+            Transaction.objects.filter(from_user_id__in=ids).delete()
+            Transaction.objects.filter(to_user_id__in=ids).delete()
+            User.objects.filter(id__in=ids).delete()
+
+    def _run(self, threads, transfers, pair):
+        errors = []
+
+        def worker(i):
+            payer, payee = pair(i)
+            try:
+                for _ in range(transfers):
+                    amount = Decimal(random.randint(1, 3))
+                    ledger.run_atomic_with_retry(
+                        lambda: ledger.post('TRANSFER', amount, from_user=ledger.lock_payer(payer), to_user=payee)
+                    )
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            self.stderr.write(f'{len(errors)} worker(s) failed, first: {errors[0]!r}')
+        return threads * transfers / elapsed
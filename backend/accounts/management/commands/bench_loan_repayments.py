@@ -0,0 +1,77 @@
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import amortization, ledger, repayments
+from accounts.models import LedgerEntry, Loan, LoanRepayment, Transaction, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure nightly EMI collection over many throwaway loans: one run where half the '
+        'borrowers fall short, then next month\'s run that recovers those arrears. Only the '
+        'throwaway loans are collected. Creates users and loans and removes them afterwards; '
+        'run against a MySQL bench database with BENCH_WRITES_ALLOWED set, never production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=200_000)
+        parser.add_argument('--borrowers', type=int, default=2_000)
+        parser.add_argument('--chunk-size', type=int, default=repayments.CHUNK_SIZE)
+
+    def handle(self, *args, loans, borrowers, chunk_size, **options):
+        if not settings.BENCH_WRITES_ALLOWED:
+            raise CommandError('This benchmark writes to the default database; set BENCH_WRITES_ALLOWED=true to run it.')
+        if borrowers < 2 or loans < borrowers:
+            raise CommandError('Need at least 2 borrowers and one loan per borrower.')
+
+        tag = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(email=f'emi{i}-{tag}@bench.local', username=f'emi{i}-{tag}', password=None)
+            for i in range(borrowers)
+        ]
+        approved = timezone.make_aware(datetime.combine(timezone.localdate().replace(day=15), datetime.min.time()))
+        first_due = amortization.add_months(approved.date(), 1)
+        bench_loans = Loan.objects.filter(applicant__in=[u.id for u in users])
+        try:
+            for start in range(0, loans, 10_000):
+                Loan.objects.bulk_create([
+                    Loan(
+                        applicant=users[i % borrowers], amount=Decimal(50_000 + i % 100 * 1_000), term_months=12 + i % 49,
+                        interest_rate=Decimal('10.50'), status='APPROVED', approved_at=approved,
+                    )
+                    for i in range(start, min(start + 10_000, loans))
+                ])
+            # Fund every other borrower generously; the rest cannot pay this month
+            per_borrower = Decimal(loans // borrowers + 1) * 20_000
+            ledger.post_many([('DEPOSIT', per_borrower, None, user) for user in users[::2]])
+            self._run('first run', first_due, chunk_size, bench_loans)
+
+            ledger.post_many([('DEPOSIT', per_borrower * 2, None, user) for user in users[1::2]])
+            self._run('next month', amortization.add_months(approved.date(), 2), chunk_size, bench_loans)
+        finally:
+            ids = [u.id for u in users]
+            LoanRepayment.objects.filter(loan__applicant_id__in=ids).delete()
+            bench_loans.delete()
+            LedgerEntry.objects.filter(account_id__in=ids).delete()
+            Transaction.objects.filter(from_user_id__in=ids).delete()
+            Transaction.objects.filter(to_user_id__in=ids).delete()
+            User.objects.filter(id__in=ids).delete()
+
+    def _run(self, label, due_date, chunk_size, loans):
+        totals = repayments._stats()
+        started = time.perf_counter()
+        for stats in repayments.collect_due(due_date, chunk_size=chunk_size, loans=loans):
+            for key, value in stats.items():
+                totals[key] += value
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label:<11} {due_date}: {totals['recovered']:,}/{totals['arrears']:,} arrears recovered, "
+            f"{totals['scanned']:,} loans scanned, {totals['paid']:,} paid, {totals['shortfall']:,} short "
+            f"in {elapsed:.1f}s ({(totals['scanned'] + totals['arrears']) / elapsed:,.0f} loans/s)"
+        )
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import notifications
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark notification rendering throughput (messages rendered per second).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000)
+
+    def handle(self, *args, count, **options):
+        contexts = {
+            'welcome': [{'name': f'user{i}'} for i in range(count)],
+            'otp': [{'name': f'user{i}', 'otp': f'{i % 1000000:06d}', 'year': 2025} for i in range(count)],
+            'money_sent': [
+                {'amount': f'{i}.00', 'counterparty': f'user{i}', 'counterparty_email': f'user{i}@example.com',
+                 'when': '2025-01-01 00:00:00', 'transaction_id': i}
+                for i in range(count)
+            ],
+        }
+        for name, batch in contexts.items():
+            started = time.perf_counter()
+            notifications.render_many(name, batch)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{name:<12} {count / elapsed:>12,.0f} msg/s ({elapsed:.3f}s for {count:,})')
@@ -0,0 +1,80 @@
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts import ledger, payees, transfers
+from accounts.models import LedgerEntry, OutboxEmail, Transaction, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare transfers/sec with one transaction per transfer against the group-commit engine. '
+        'Creates throwaway users and removes them afterwards; run against a MySQL bench database '
+        'with BENCH_WRITES_ALLOWED set, never production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=64)
+        parser.add_argument('--per-thread', type=int, default=100, help='Transfers per thread per mode.')
+        parser.add_argument('--max-batch', type=int, default=200)
+        parser.add_argument('--max-wait-ms', type=float, default=5)
+
+    def handle(self, *args, threads, per_thread, max_batch, max_wait_ms, **options):
+        if not settings.BENCH_WRITES_ALLOWED:
+            raise CommandError('This benchmark writes to the default database; set BENCH_WRITES_ALLOWED=true to run it.')
+        if threads < 2:
+            raise CommandError('--threads must be at least 2.')
+        tag = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(email=f'bench{i}-{tag}@bench.local', username=f'bench{i}-{tag}', password=None)
+            for i in range(threads)
+        ]
+        refs = [payees.payee_as_user(payees.Payee(u.id, u.username, u.email, u.account_number, 1)) for u in users]
+        try:
+            for user in users:
+                ledger.post('DEPOSIT', Decimal(per_thread * 10), to_user=user)
+
+            def direct(payer_id, receiver, amount):
+                pending = [(0, payer_id, receiver, amount)]
+                ledger.run_atomic_with_retry(lambda: transfers.apply_transfers(pending))
+
+            engine = transfers.TransferEngine(max_batch=max_batch, max_wait=max_wait_ms / 1000)
+            for label, send in (('per-transfer', direct), ('group commit', engine.transfer)):
+                rate = self._run(threads, per_thread, users, refs, send)
+                self.stdout.write(f'{label:<13} {rate:>9,.0f} transfers/s')
+        finally:
+            ids = [u.id for u in users]
+            tx_ids = list(Transaction.objects.filter(to_user_id__in=ids).values_list('id', flat=True))
+            LedgerEntry.objects.filter(transaction_id__in=tx_ids).delete()
+            Transaction.objects.filter(id__in=tx_ids).delete()
+            OutboxEmail.objects.filter(to_email__endswith=f'-{tag}@bench.local').delete()
+            User.objects.filter(id__in=ids).delete()
+
+    def _run(self, threads, count, users, refs, send):
+        errors = []
+
+        def worker(i):
+            # Every thread pays from its own account, so only commit throughput is measured
+            try:
+                for _ in range(count):
+                    send(users[i].id, refs[(i + 1) % threads], Decimal('1.00'))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            self.stderr.write(f'{len(errors)} worker(s) failed, first: {errors[0]!r}')
+        return threads * count / elapsed
@@ -0,0 +1,43 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.search import UserSearchIndex
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the users search index on synthetic users (no database access).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, users, queries, seed, **options):
+        rnd = random.Random(seed)
+
+        def word():
+            return ''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(5, 12)))
+
+        rows = [(i, word(), f'{word()}@example.com', str(rnd.randrange(10 ** 11, 10 ** 12))) for i in range(1, users + 1)]
+        index = UserSearchIndex()
+        started = time.perf_counter()
+        index.build_from(rows)
+        self.stdout.write(f'build: {time.perf_counter() - started:.2f}s for {users:,} users')
+
+        sample = [rows[rnd.randrange(users)] for _ in range(queries)]
+        cases = {
+            'username prefix (3)': [r[1][:3] for r in sample],
+            'account prefix (6)': [r[3][:6] for r in sample],
+            'exact username': [r[1] for r in sample],
+            'substring (4, rare)': [word()[:4] for _ in sample],
+            'email substring': [r[2][2:7] for r in sample],
+        }
+        for name, qs in cases.items():
+            started = time.perf_counter()
+            for q in qs:
+                index.search(q, limit=20)
+            per_query = (time.perf_counter() - started) / len(qs)
+            self.stdout.write(f'{name:<22} {per_query * 1000:8.2f} ms/query {1 / per_query:10,.0f} q/s')
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import cache_key
+from accounts.middleware import JWTAuthMiddleware
+from accounts.models import User
+
+
+async def _accept(scope, receive, send):
+    # Stand-in for the URL router: the benchmark measures authentication only
+    return scope['user']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent WebSocket handshake authentication through JWTAuthMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--handshakes', type=int, default=5000)
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--users', type=int, default=200, help='Distinct existing users to mint tokens for.')
+        parser.add_argument('--cold', action='store_true', help='Clear cached users first so lookups hit the database.')
+
+    def handle(self, *args, handshakes, concurrency, users, cold, **options):
+        ids = list(User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)[:users])
+        if not ids:
+            self.stderr.write('No active users to authenticate as.')
+            return
+        tokens = [str(AccessToken.for_user(User(id=user_id))) for user_id in ids]
+        if cold:
+            cache.delete_many([cache_key(user_id) for user_id in ids])
+        elapsed, lag, failures = asyncio.run(self._run(tokens, handshakes, concurrency))
+        self.stdout.write(
+            f'{handshakes:,} handshakes in {elapsed:.2f}s ({handshakes / elapsed:,.0f}/s), '
+            f'{failures} unauthenticated, worst event-loop stall {lag * 1000:.1f}ms'
+        )
+
+    async def _run(self, tokens, handshakes, concurrency):
+        middleware = JWTAuthMiddleware(_accept)
+        semaphore = asyncio.Semaphore(concurrency)
+        failures = 0
+        worst_lag = 0.0
+        running = True
+
+        async def probe():
+            # A blocking call anywhere in the handshake shows up as a late wake-up here
+            nonlocal worst_lag
+            while running:
+                before = time.perf_counter()
+                await asyncio.sleep(0.001)
+                worst_lag = max(worst_lag, time.perf_counter() - before - 0.001)
+
+        async def handshake(i):
+            nonlocal failures
+            token = tokens[i % len(tokens)]
+            scope = {'type': 'websocket', 'query_string': f'token={token}'.encode()}
+            async with semaphore:
+                user = await middleware(scope, None, None)
+            if not user.is_authenticated:
+                failures += 1
+
+        probe_task = asyncio.ensure_future(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(handshake(i) for i in range(handshakes)))
+        elapsed = time.perf_counter() - started
+        running = False
+        await probe_task
+        return elapsed, worst_lag, failures
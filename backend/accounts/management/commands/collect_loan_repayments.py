@@ -0,0 +1,46 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import repayments
+
+
+class Command(BaseCommand):
+    help = (
+        'Retry outstanding shortfalls due by a date, then debit every loan instalment due on it; '
+        'safe to re-run for the same date.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', dest='due_date', help='Due date (YYYY-MM-DD); defaults to today.')
+        parser.add_argument('--chunk-size', type=int, default=repayments.CHUNK_SIZE)
+
+    def handle(self, *args, due_date, chunk_size, **options):
+        try:
+            due_date = date.fromisoformat(due_date) if due_date else timezone.localdate()
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD.')
+
+        totals = repayments._stats()
+        started = time.perf_counter()
+        for stats in repayments.collect_due(due_date, chunk_size=chunk_size):
+            for key, value in stats.items():
+                totals[key] += value
+            elapsed = time.perf_counter() - started
+            if stats['arrears']:
+                self.stdout.write(f"{totals['arrears']:,} arrears retried, {totals['recovered']:,} recovered")
+                continue
+            self.stdout.write(
+                f"{totals['scanned']:,} loans scanned, {totals['due']:,} due, {totals['paid']:,} paid, "
+                f"{totals['shortfall']:,} short, {totals['skipped']:,} already recorded "
+                f"({totals['scanned'] / elapsed:,.0f} loans/s, {totals['due'] / elapsed:,.0f} instalments/s)"
+            )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Collected ₹{totals['collected']} for {due_date}: {totals['recovered']:,} of {totals['arrears']:,} "
+            f"arrears recovered, {totals['paid']:,} paid, {totals['shortfall']:,} new shortfall(s), "
+            f"{totals['skipped']:,} already recorded, in {elapsed:.1f}s."
+        ))
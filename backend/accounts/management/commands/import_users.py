@@ -0,0 +1,68 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from accounts import onboarding
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import customers from a CSV or NDJSON file (email, username, password|password_hash, phone_number, balance).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='fmt', choices=('csv', 'ndjson'), help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Password hashing processes.')
+        parser.add_argument(
+            '--iterations', type=int, default=0,
+            help='Hash with PBKDF2 at this iteration count instead of the configured hasher. '
+                 'Django upgrades the hash to the configured cost on the user\'s first login.',
+        )
+        parser.add_argument('--resume', action='store_true', help='Skip rows recorded in the checkpoint file.')
+        parser.add_argument('--checkpoint', help='Defaults to <path>.progress')
+
+    def handle(self, *args, path, fmt, chunk_size, workers, iterations, resume, checkpoint, **options):
+        fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        checkpoint = checkpoint or f'{path}.progress'
+        done = 0
+        if resume and os.path.exists(checkpoint):
+            with open(checkpoint) as fh:
+                done = int(fh.read().strip() or 0)
+            self.stdout.write(f'Resuming after row {done:,}.')
+
+        rows = itertools.islice(onboarding.read_rows(path, fmt), done, None)
+        created = skipped = invalid = 0
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=onboarding.init_worker) as pool:
+            while True:
+                raw_chunk = list(itertools.islice(rows, chunk_size))
+                if not raw_chunk:
+                    break
+                cleaned = []
+                for offset, raw in enumerate(raw_chunk, start=done + 1):
+                    try:
+                        cleaned.append(onboarding.clean_row(raw))
+                    except onboarding.RowError as exc:
+                        invalid += 1
+                        self.stderr.write(f'row {offset}: {exc}')
+                to_hash = [(r['password'], iterations) for r in cleaned if not r['password_hash']]
+                hashed = iter(pool.map(onboarding.hash_password, to_hash, chunksize=max(1, len(to_hash) // (workers * 4))))
+                hashes = [r['password_hash'] or next(hashed) for r in cleaned]
+
+                chunk_created, chunk_skipped = onboarding.insert_chunk(cleaned, hashes)
+                created += chunk_created
+                skipped += chunk_skipped
+                done += len(raw_chunk)
+                with open(checkpoint, 'w') as fh:
+                    fh.write(str(done))
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{done:,} rows read, {created:,} created, {skipped:,} skipped, {invalid:,} invalid '
+                    f'({created / elapsed:,.0f} users/s)'
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {created:,} users ({skipped:,} already present, {invalid:,} invalid).'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts import idempotency
+
+
+class Command(BaseCommand):
+    help = 'Delete Idempotency-Key records older than the replay window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, batch_size, **options):
+        removed = idempotency.purge_expired(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Purged {removed} expired key(s).'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox emails in batches over a reused SMTP connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep between polls with --loop.')
+
+    def handle(self, *args, batch_size, loop, interval, **options):
+        while True:
+            sent, failed = outbox.drain(batch_size=batch_size)
+            if sent or failed or not loop:
+                self.stdout.write(f'Sent {sent}, failed {failed}.')
+            if not loop:
+                break
+            time.sleep(interval)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import ledger
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Split a hot account\'s balance over N lockable shards (1 turns sharding off).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_number')
+        parser.add_argument('--shards', type=int, required=True)
+
+    def handle(self, *args, account_number, shards, **options):
+        if not 1 <= shards <= 256:
+            raise CommandError('--shards must be between 1 and 256.')
+        try:
+            user = User.objects.get(account_number=account_number)
+        except User.DoesNotExist:
+            raise CommandError(f'No account {account_number}.')
+        ledger.set_shards(user, shards)
+        self.stdout.write(self.style.SUCCESS(f'Account {account_number} now uses {shards} balance shard(s).'))
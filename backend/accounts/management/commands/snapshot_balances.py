@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from accounts import ledger
+
+
+class Command(BaseCommand):
+    help = 'Fold settled ledger entries into per-account balance snapshots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-seconds', type=int, default=int(ledger.SNAPSHOT_GRACE.total_seconds()),
+            help='Skip entries younger than this many seconds (in-flight postings).',
+        )
+
+    def handle(self, *args, grace_seconds, **options):
+        count = ledger.snapshot_all(grace=timedelta(seconds=grace_seconds))
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {count} account(s).'))
@@ -1,22 +1,59 @@
+import asyncio
 from urllib.parse import parse_qs
-from channels.middleware.base import BaseMiddleware
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from django.db import close_old_connections
+
+from .authentication import CachedJWTAuthentication, cache_key, load_user, user_from_entry
+
 
 class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket handshakes from a ``?token=`` query parameter.
+
+    Token validation is a signature check and runs inline. The user is read from the
+    shared auth cache and only falls back to the database in a worker thread, so a
+    handshake never blocks the event loop. Concurrent handshakes for the same user
+    share one lookup.
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.authenticator = CachedJWTAuthentication()
+        self._inflight = {}
+
     async def __call__(self, scope, receive, send):
         query_string = scope.get("query_string", b"").decode()
         token_list = parse_qs(query_string).get("token")
         user = AnonymousUser()
         if token_list:
-            token = token_list[0]
             try:
-                validated_token = UntypedToken(token)
-                user = JWTAuthentication().get_user(validated_token)
+                user = await self.get_user(UntypedToken(token_list[0]))
             except Exception:
                 user = AnonymousUser()
         scope["user"] = user
-        close_old_connections()
         return await super().__call__(scope, receive, send)
+
+    async def get_user(self, validated_token):
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        entry = await cache.aget(cache_key(user_id))
+        if entry is not None:
+            self.authenticator.check_cached_user(entry, validated_token)
+            return user_from_entry(entry)
+
+        task = self._inflight.get(user_id)
+        if task is None:
+            # database_sync_to_async also closes stale connections around the query
+            task = asyncio.ensure_future(database_sync_to_async(load_user)(user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        loaded = await asyncio.shield(task)
+        if loaded is None:
+            return AnonymousUser()
+        user, entry = loaded
+        self.authenticator.check_cached_user(entry, validated_token)
+        return user
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['from_user', 'created_at', 'id'], name='tx_from_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['to_user', 'created_at', 'id'], name='tx_to_created_idx'),
+        ),
+    ]
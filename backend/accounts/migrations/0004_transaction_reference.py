@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_ledger_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='reference',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+    ]
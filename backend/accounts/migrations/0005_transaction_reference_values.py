@@ -0,0 +1,28 @@
+import uuid
+
+from django.db import migrations
+
+
+def fill_references(apps, schema_editor):
+    # Existing transactions need distinct values before the unique index can be built
+    Transaction = apps.get_model('accounts', 'Transaction')
+    batch = []
+    for tx in Transaction.objects.filter(reference__isnull=True).only('id').iterator(chunk_size=2000):
+        tx.reference = uuid.uuid4()
+        batch.append(tx)
+        if len(batch) == 2000:
+            Transaction.objects.bulk_update(batch, ['reference'])
+            batch = []
+    if batch:
+        Transaction.objects.bulk_update(batch, ['reference'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_transaction_reference'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_transaction_reference_values'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='reference',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_outbox_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_image_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
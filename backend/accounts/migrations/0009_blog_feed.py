@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_profile_image_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blog_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['created_at', 'id'], name='blog_created_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='balance_shards',
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.CreateModel(
+            name='BalanceShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_snapshot_id', models.BigIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_shard_rows', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'shard'), name='balance_shard_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_balance_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Statement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('opening_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_credits', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_debits', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('totals_by_type', models.JSONField(default=dict)),
+                ('closed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'period'), name='statement_account_period_uniq')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', 'created_at', 'id'], name='ledger_account_created_idx'),
+        ),
+    ]
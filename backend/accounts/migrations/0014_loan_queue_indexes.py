@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_statements'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='loan_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['applicant', 'created_at', 'id'], name='loan_applicant_created_idx'),
+        ),
+    ]
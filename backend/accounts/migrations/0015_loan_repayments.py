@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_loan_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='type',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('TRANSFER', 'Transfer'), ('LOAN', 'Loan'), ('REPAYMENT', 'Loan repayment')], max_length=10),
+        ),
+        migrations.CreateModel(
+            name='LoanRepayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instalment', models.PositiveIntegerField()),
+                ('due_date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('PAID', 'Paid'), ('SHORTFALL', 'Shortfall')], max_length=10)),
+                ('attempted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='repayments', to='accounts.loan')),
+                ('transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='repayment', to='accounts.transaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'due_date'], name='repayment_status_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('loan', 'instalment'), name='repayment_loan_instalment_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+import time
+
+from django.db import migrations
+
+
+def version_existing_images(apps, schema_editor):
+    # Images uploaded before versioning would otherwise be served without a cache-buster
+    User = apps.get_model('accounts', 'User')
+    (
+        User.objects.filter(profile_image_version=0).exclude(profile_image='').exclude(profile_image__isnull=True)
+        .update(profile_image_version=time.time_ns() // 1_000_000)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_loan_repayments'),
+    ]
+
+    operations = [
+        migrations.RunPython(version_existing_images, migrations.RunPython.noop),
+    ]
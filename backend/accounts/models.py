@@ -1,14 +1,34 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+import secrets
 import uuid
 
+ACCOUNT_NUMBER_ATTEMPTS = 5
+
+
+def generate_account_number():
+    # Uniformly random 12-digit number that never starts with 0
+    return str(10 ** 11 + secrets.randbelow(9 * 10 ** 11))
+
+
 class User(AbstractUser):
     email = models.EmailField(_('email address'), unique=True)
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     account_number = models.CharField(max_length=12, unique=True, editable=False)
+    # Balance as of BalanceSnapshot ``last_snapshot_id``; the live balance adds the ledger
+    # entries not folded into that snapshot (see accounts.ledger.get_balance).
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_snapshot_id = models.BigIntegerField(default=0, editable=False)
+    # Above 1, debits lock BalanceShard rows instead of this row (see accounts.ledger.set_shards)
+    balance_shards = models.PositiveSmallIntegerField(default=1, editable=False)
+    # Lets the in-process users search index pick up changes made by other workers
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     profile_image = models.ImageField(upload_to='profile_images/', blank=True, null=True)
+    # Cache-buster for profile_image URLs, bumped on upload so rendering never stats storage
+    profile_image_version = models.PositiveBigIntegerField(default=0, editable=False)
     groups = models.ManyToManyField(
         'auth.Group',
         verbose_name=_('groups'),
@@ -35,9 +55,19 @@ class User(AbstractUser):
         return self.email
 
     def save(self, *args, **kwargs):
-        if not self.account_number:
-            self.account_number = str(uuid.uuid4().int)[:12]  # 12-digit unique number
-        super().save(*args, **kwargs)
+        if self.account_number:
+            return super().save(*args, **kwargs)
+        # Retry with a fresh number if the random one is already taken
+        for attempt in range(ACCOUNT_NUMBER_ATTEMPTS):
+            self.account_number = generate_account_number()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = User.objects.filter(account_number=self.account_number).exists()
+                if not taken or attempt == ACCOUNT_NUMBER_ATTEMPTS - 1:
+                    self.account_number = ''
+                    raise
 
 class OTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -56,21 +86,46 @@ class Blog(models.Model):
     image = models.ImageField(upload_to='blog_images/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='blog_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} by {self.author.email}"
 
 
+class BlogTombstone(models.Model):
+    # Remembers deleted blog ids so feed clients polling with ``since`` can drop them
+    blog_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Blog {self.blog_id} deleted at {self.deleted_at}"
+
+
 class Transaction(models.Model):
     TYPE_CHOICES = (
         ('DEPOSIT', 'Deposit'),
         ('TRANSFER', 'Transfer'),
         ('LOAN', 'Loan'),
+        ('REPAYMENT', 'Loan repayment'),
     )
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     from_user = models.ForeignKey(User, null=True, blank=True, related_name='transactions_sent', on_delete=models.SET_NULL)
     to_user = models.ForeignKey(User, null=True, blank=True, related_name='transactions_received', on_delete=models.SET_NULL)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Client-side key so bulk inserts can be matched back to their ids on backends
+    # that cannot return primary keys from bulk_create (MySQL)
+    reference = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Back the per-user history keyset scans: each side of the from/to OR is its own range scan
+            models.Index(fields=['from_user', 'created_at', 'id'], name='tx_from_created_idx'),
+            models.Index(fields=['to_user', 'created_at', 'id'], name='tx_to_created_idx'),
+        ]
 
     def __str__(self):
         if self.type == 'DEPOSIT':
@@ -106,5 +161,165 @@ class Loan(models.Model):
     approved_at = models.DateTimeField(blank=True, null=True)
     approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_loans')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'id'], name='loan_status_created_idx'),
+            models.Index(fields=['applicant', 'created_at', 'id'], name='loan_applicant_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Loan {self.id} - {self.applicant.email} - {self.status}"
+
+
+class LoanRepayment(models.Model):
+    """One row per collected loan instalment; a SHORTFALL is retried by every later run until it is PAID."""
+    STATUS_CHOICES = (
+        ('PAID', 'Paid'),
+        ('SHORTFALL', 'Shortfall'),
+    )
+
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='repayments')
+    instalment = models.PositiveIntegerField()
+    due_date = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    transaction = models.OneToOneField(Transaction, null=True, blank=True, on_delete=models.SET_NULL, related_name='repayment')
+    attempted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['loan', 'instalment'], name='repayment_loan_instalment_uniq'),
+        ]
+        indexes = [
+            # Arrears pass: outstanding shortfalls, oldest first
+            models.Index(fields=['status', 'due_date'], name='repayment_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Repayment {self.instalment} of loan {self.loan_id}: {self.status}"
+
+
+class LedgerEntry(models.Model):
+    CREDIT = 'CREDIT'
+    DEBIT = 'DEBIT'
+    ENTRY_CHOICES = (
+        (CREDIT, 'Credit'),
+        (DEBIT, 'Debit'),
+    )
+
+    account = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_entries')
+    transaction = models.ForeignKey(Transaction, on_delete=models.PROTECT, related_name='entries')
+    entry_type = models.CharField(max_length=6, choices=ENTRY_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    shard = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set once by ledger.take_snapshot when the entry is folded into a snapshot balance
+    snapshot = models.ForeignKey('BalanceSnapshot', null=True, blank=True, on_delete=models.PROTECT, related_name='entries')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'id'], name='ledger_account_id_idx'),
+            models.Index(fields=['account', 'snapshot'], name='ledger_account_snapshot_idx'),
+            models.Index(fields=['account', 'created_at', 'id'], name='ledger_account_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Entries are append-only; corrections are posted as new entries
+        if self.pk is not None:
+            raise ValueError('Ledger entries are immutable.')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} on {self.account_id} (tx {self.transaction_id})"
+
+
+class BalanceSnapshot(models.Model):
+    account = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_snapshots')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Snapshot {self.id}: {self.balance} for {self.account_id}"
+
+
+class BalanceShard(models.Model):
+    # Lock unit for accounts with balance_shards > 1. Like User.balance, ``balance`` is
+    # as of snapshot ``last_snapshot_id``; the shard's live balance adds its unfolded entries.
+    account = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_shard_rows')
+    shard = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_snapshot_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'shard'], name='balance_shard_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.shard} of {self.account_id}: {self.balance}"
+
+
+class Statement(models.Model):
+    # Monthly summary folded from the ledger by the snapshot job (see accounts.statements)
+    account = models.ForeignKey(User, on_delete=models.CASCADE, related_name='statements')
+    period = models.DateField()  # first day of the month
+    opening_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_credits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_debits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    closing_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # {"<Transaction.type>": {"credits": "<amount>", "debits": "<amount>"}}
+    totals_by_type = models.JSONField(default=dict)
+    closed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'period'], name='statement_account_period_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Statement {self.period:%Y-%m} for {self.account_id}"
+
+
+class OutboxEmail(models.Model):
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('DEAD', 'Dead'),
+    )
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    text_body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} email to {self.to_email}: {self.subject}"
+
+
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+
     def __str__(self):
-        return f"Loan {self.id} - {self.applicant.email} - {self.status}"
\ No newline at end of file
+        return f"Idempotency key {self.key} for {self.user_id}"
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Notification email rendering.
+
+Every template shares one HTML layout. At import time each template bakes its static
+parts (brand, title, footer, body markup) into a single format string, so rendering
+a message is one ``str.format_map`` per part with HTML-escaped values.
+"""
+from html import escape
+
+_LAYOUT = """
+<html>
+  <body style="font-family: Arial, sans-serif; background-color: #0b1020; padding: 30px; color: #eaf2ff;">
+    <div style="max-width: 560px; margin: auto; background: #0f1a38; border-radius: 10px; box-shadow: 0 0 24px rgba(45,127,249,0.25); padding: 28px; border: 1px solid rgba(45,127,249,0.25);">
+      <span style="display:none;visibility:hidden;opacity:0;height:0;width:0">{preheader}</span>
+      <h2 style="color: #eaf2ff; text-align: center; margin-top: 0;">{brand}</h2>
+      <div style="text-align:center;margin:14px 0 20px 0;">
+        <span style="display:inline-block;background:#2d7ff9;color:#fff;font-size:16px;letter-spacing:1px;padding:8px 16px;border-radius:6px;font-weight:800;box-shadow:0 0 12px rgba(45,127,249,0.45);">{title}</span>
+      </div>
+      {body}
+      {highlight}
+      <hr style="border:none;border-top:1px solid rgba(255,255,255,0.12);margin: 20px 0;" />
+      <p style="font-size:12px;color:#9fb4ff;text-align:center;margin:0;">{footer}</p>
+    </div>
+  </body>
+</html>
+"""
+
+_LINE = '<p style="margin:6px 0;color:#bcd3ff;">{}</p>'
+
+_HIGHLIGHT = """<div style="text-align: center; margin: 24px 0;">
+        <span style="display: inline-block; background: #2d7ff9; color: #fff; font-size: 28px; letter-spacing: 8px; padding: 12px 24px; border-radius: 8px; font-weight: 800;">{}</span>
+      </div>"""
+
+
+def _literal(text):
+    # Static text baked into a format string must have its braces doubled
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+class EmailTemplate:
+    def __init__(self, subject, preheader, title, lines, footer, brand='K9TX Bank', highlight=None):
+        # ``subject``, ``preheader``, ``lines``, ``footer`` and ``highlight`` are
+        # str.format templates over the render context; ``title`` and ``brand`` are static.
+        self.subject = subject
+        self.text = '\n'.join([_literal(title), ''] + list(lines) + ([highlight] if highlight else []))
+        self.html = _LAYOUT.format(
+            preheader=preheader,
+            brand=_literal(brand),
+            title=_literal(title),
+            body=''.join(_LINE.format(line) for line in lines),
+            highlight=_HIGHLIGHT.format(highlight) if highlight else '',
+            footer=footer,
+        )
+
+    def render(self, context):
+        """Return ``(subject, text_body, html_body)`` for one recipient."""
+        escaped = {key: escape(str(value)) for key, value in context.items()}
+        return (
+            self.subject.format_map(context),
+            self.text.format_map(context),
+            self.html.format_map(escaped),
+        )
+
+    def render_many(self, contexts):
+        render = self.render
+        return [render(context) for context in contexts]
+
+
+TEMPLATES = {
+    'welcome': EmailTemplate(
+        subject='Welcome to K9TX Bank',
+        preheader='Thank you for creating your account with K9TX Bank.',
+        title='Welcome Aboard',
+        lines=[
+            'Hi {name},',
+            'Your new digital banking experience starts now.',
+            'We focus on security, speed and a delightful interface to make money simple.',
+        ],
+        footer="We're glad you're here. If you did not sign up, please ignore this email.",
+    ),
+    'otp': EmailTemplate(
+        subject='K9TX Capital Management - Password Reset OTP',
+        preheader='Your password reset code',
+        title='Password Reset',
+        brand='K9TX Capital Management',
+        lines=[
+            'Dear {name},',
+            'You requested to reset your password. Please use the OTP below to proceed:',
+            'This OTP is valid for 10 minutes.',
+            'If you did not request this, please ignore this email.',
+        ],
+        highlight='{otp}',
+        footer='&copy; {year} K9TX Capital Management. All rights reserved.',
+    ),
+    'money_sent': EmailTemplate(
+        subject='Transfer Money confirmation',
+        preheader='You sent ₹{amount} to {counterparty}',
+        title='Money Sent',
+        lines=[
+            'Amount: ₹{amount}',
+            'To: {counterparty} ({counterparty_email})',
+            'When: {when}',
+            'Transaction ID: {transaction_id}',
+        ],
+        footer='This is an automated message – please do not reply.',
+    ),
+    'money_received': EmailTemplate(
+        subject='You received a Money',
+        preheader='You received ₹{amount} from {counterparty}',
+        title='Money Received',
+        lines=[
+            'Amount: ₹{amount}',
+            'From: {counterparty} ({counterparty_email})',
+            'When: {when}',
+            'Transaction ID: {transaction_id}',
+        ],
+        footer='This is an automated message – please do not reply.',
+    ),
+    'loan_decision': EmailTemplate(
+        subject='Your loan application was {decision}',
+        preheader='Loan #{loan_id} {decision}',
+        title='Loan Update',
+        lines=[
+            'Hi {name},',
+            'Your loan application #{loan_id} for ₹{amount} over {term_months} months was {decision}.',
+            'When: {when}',
+        ],
+        footer='This is an automated message – please do not reply.',
+    ),
+}
+
+
+def render(name, context):
+    return TEMPLATES[name].render(context)
+
+
+def render_many(name, contexts):
+    return TEMPLATES[name].render_many(contexts)
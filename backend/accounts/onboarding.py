@@ -0,0 +1,138 @@
+"""
+Bulk customer onboarding used by the ``import_users`` management command.
+
+Rows are streamed from CSV or NDJSON. Password hashes are computed in a process
+pool, account numbers are allocated in collision-checked blocks, and users are
+inserted with ``bulk_create`` one chunk at a time. Imported balances are posted as
+opening ``DEPOSIT`` transactions in the same transaction, so the ledger explains
+every rupee.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+import django
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.db import IntegrityError, transaction
+
+from . import ledger
+from .models import User, generate_account_number
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, fmt):
+    """Yield raw dict rows from a CSV (with header) or NDJSON file."""
+    with open(path, newline='', encoding='utf-8') as fh:
+        if fmt == 'csv':
+            yield from csv.DictReader(fh)
+        else:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def clean_row(row):
+    email = (row.get('email') or '').strip().lower()
+    username = (row.get('username') or '').strip()
+    if not email or not username:
+        raise RowError('email and username are required')
+    if not row.get('password') and not row.get('password_hash'):
+        raise RowError('password or password_hash is required')
+    try:
+        balance = Decimal(str(row.get('balance') or '0')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError('invalid balance')
+    if balance < 0:
+        raise RowError('balance cannot be negative')
+    return {
+        'email': email,
+        'username': username,
+        'phone_number': (row.get('phone_number') or '').strip() or None,
+        'balance': balance,
+        'password': row.get('password') or '',
+        'password_hash': row.get('password_hash') or '',
+    }
+
+
+def init_worker():
+    # Needed under the "spawn" start method; a no-op for forked workers
+    django.setup()
+
+
+def hash_password(args):
+    password, iterations = args
+    if iterations:
+        hasher = PBKDF2PasswordHasher()
+        return hasher.encode(password, hasher.salt(), iterations=iterations)
+    return make_password(password)
+
+
+def allocate_account_numbers(count, exclude=()):
+    """Return ``count`` distinct account numbers not yet present in the database."""
+    allocated = set()
+    while len(allocated) < count:
+        block = set()
+        while len(block) < count - len(allocated):
+            number = generate_account_number()
+            if number not in allocated and number not in exclude:
+                block.add(number)
+        taken = set(User.objects.filter(account_number__in=block).values_list('account_number', flat=True))
+        allocated |= block - taken
+    return list(allocated)
+
+
+def post_opening_balances(users, balances):
+    """Credit each freshly inserted user's imported balance as a ``DEPOSIT``."""
+    if any(user.pk is None for user in users):
+        # MySQL cannot return ids from bulk_create; account numbers are unique
+        ids = dict(
+            User.objects.filter(account_number__in=[u.account_number for u in users]).values_list('account_number', 'id')
+        )
+        for user in users:
+            user.pk = ids[user.account_number]
+    ledger.post_many([
+        ('DEPOSIT', balance, None, user) for user, balance in zip(users, balances) if balance > 0
+    ])
+
+
+def insert_chunk(rows, hashes, retries=3):
+    """
+    Insert one chunk of cleaned rows; returns (created, skipped).
+
+    Users whose email or username already exist are skipped, which makes re-running
+    a partially imported file safe.
+    """
+    seen_emails, seen_usernames, fresh = set(), set(), []
+    existing_emails = set(User.objects.filter(email__in=[r['email'] for r in rows]).values_list('email', flat=True))
+    existing_usernames = set(User.objects.filter(username__in=[r['username'] for r in rows]).values_list('username', flat=True))
+    for row, password in zip(rows, hashes):
+        if (row['email'] in existing_emails or row['email'] in seen_emails
+                or row['username'] in existing_usernames or row['username'] in seen_usernames):
+            continue
+        seen_emails.add(row['email'])
+        seen_usernames.add(row['username'])
+        fresh.append((row, password))
+
+    for attempt in range(retries):
+        numbers = allocate_account_numbers(len(fresh))
+        users = [
+            User(
+                email=row['email'], username=row['username'], phone_number=row['phone_number'],
+                password=password, account_number=number,
+            )
+            for (row, password), number in zip(fresh, numbers)
+        ]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                post_opening_balances(users, [row['balance'] for row, _ in fresh])
+            return len(users), len(rows) - len(users)
+        except IntegrityError:
+            # A concurrent registration took one of the allocated numbers; allocate again
+            if attempt == retries - 1:
+                raise
+    return 0, len(rows)
@@ -0,0 +1,177 @@
+"""
+Transactional email outbox.
+
+Views call ``enqueue`` inside the same ``transaction.atomic`` block as the business
+change, so an email exists if and only if the change committed. The
+``send_outbox_emails`` management command drains due rows in batches over a single
+SMTP connection, retrying failures with exponential backoff until they are marked DEAD.
+A server that is down or drops the connection is not the messages' fault: affected
+rows are pushed back by ``CONNECT_BACKOFF`` without spending an attempt.
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(seconds=30)
+# How long a claimed batch stays invisible to other workers while it is being sent
+CLAIM_LEASE = timedelta(minutes=5)
+# How long to leave due emails alone after the SMTP server could not be reached
+CONNECT_BACKOFF = timedelta(seconds=30)
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPUnavailable(Exception):
+    def __init__(self, message, sent=0, failed=0):
+        super().__init__(message)
+        # Progress of the batch that was interrupted
+        self.sent = sent
+        self.failed = failed
+
+
+def enqueue(to_email, subject, text_body, html_body=''):
+    return OutboxEmail.objects.create(to_email=to_email, subject=subject, text_body=text_body, html_body=html_body)
+
+
+def enqueue_many(messages):
+    """Bulk variant of ``enqueue`` for ``(to_email, subject, text_body, html_body)`` tuples."""
+    return OutboxEmail.objects.bulk_create([
+        OutboxEmail(to_email=to_email, subject=subject, text_body=text_body, html_body=html_body)
+        for to_email, subject, text_body, html_body in messages
+    ])
+
+
+def claim_batch(batch_size):
+    """Lease up to ``batch_size`` due emails; concurrent workers skip rows another worker holds."""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            OutboxEmail.objects.filter(id__in=[m.id for m in batch]).update(next_attempt_at=now + CLAIM_LEASE)
+    return batch
+
+
+def _build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject,
+        email.text_body,
+        settings.DEFAULT_FROM_EMAIL,
+        [email.to_email],
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def _open(connection):
+    try:
+        connection.open()
+    except (smtplib.SMTPException, OSError) as exc:
+        raise SMTPUnavailable(str(exc)) from exc
+
+
+def _send(email, connection):
+    message = _build_message(email, connection)
+    try:
+        connection.send_messages([message])
+    except smtplib.SMTPServerDisconnected:
+        # The server dropped an idle or reused connection; reconnect once and resend
+        connection.close()
+        _open(connection)
+        connection.send_messages([message])
+
+
+def defer(emails, delay=CONNECT_BACKOFF):
+    """Release claimed emails for a later attempt without counting one."""
+    OutboxEmail.objects.filter(id__in=[e.id for e in emails]).update(next_attempt_at=timezone.now() + delay)
+
+
+def _back_off(exc, delay=CONNECT_BACKOFF):
+    # Nothing can go out until the server is back, so push the whole due queue back
+    now = timezone.now()
+    OutboxEmail.objects.filter(status='PENDING', next_attempt_at__lte=now).update(next_attempt_at=now + delay)
+    logger.warning('SMTP server unavailable, backing off for %s: %s', delay, exc)
+
+
+def send_batch(batch, connection):
+    """
+    Send a claimed batch over an already-open connection; returns (sent, failed) counts.
+
+    Raises ``SMTPUnavailable`` if the connection is lost and cannot be reopened, after
+    recording what was sent and deferring the rest of the batch.
+    """
+    now = timezone.now()
+    sent_ids, failed = [], []
+    unavailable = None
+    for i, email in enumerate(batch):
+        try:
+            _send(email, connection)
+            sent_ids.append(email.id)
+        except SMTPUnavailable as exc:
+            defer(batch[i:])
+            unavailable = exc
+            break
+        except Exception as exc:
+            email.attempts += 1
+            email.last_error = str(exc)[:2000]
+            if email.attempts >= MAX_ATTEMPTS:
+                email.status = 'DEAD'
+            else:
+                email.next_attempt_at = now + BACKOFF_BASE * (2 ** (email.attempts - 1))
+            failed.append(email)
+    if sent_ids:
+        OutboxEmail.objects.filter(id__in=sent_ids).update(status='SENT', sent_at=now, last_error='')
+    if failed:
+        OutboxEmail.objects.bulk_update(failed, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+    if unavailable is not None:
+        raise SMTPUnavailable(str(unavailable), sent=len(sent_ids), failed=len(failed)) from unavailable
+    return len(sent_ids), len(failed)
+
+
+def drain(batch_size=100, max_batches=None):
+    """
+    Send due emails until the queue is empty (or ``max_batches`` is reached), reusing one connection.
+
+    If the SMTP server cannot be reached, due emails are deferred by ``CONNECT_BACKOFF``
+    and the counts so far are returned instead of raising.
+    """
+    total_sent = total_failed = batches = 0
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+    connection = get_connection(fail_silently=False)
+    try:
+        _open(connection)
+    except SMTPUnavailable as exc:
+        defer(batch)
+        _back_off(exc)
+        return 0, 0
+    try:
+        while batch and (max_batches is None or batches < max_batches):
+            sent, failed = send_batch(batch, connection)
+            total_sent += sent
+            total_failed += failed
+            batches += 1
+            if max_batches is None or batches < max_batches:
+                batch = claim_batch(batch_size)
+    except SMTPUnavailable as exc:
+        # send_batch already recorded its progress and deferred the rest of its batch
+        total_sent += exc.sent
+        total_failed += exc.failed
+        _back_off(exc)
+    finally:
+        connection.close()
+    return total_sent, total_failed
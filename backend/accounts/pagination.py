@@ -0,0 +1,115 @@
+import base64
+import heapq
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    # Opaque token for the (created_at, id) keyset position of the last row on a page
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor.')
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        size = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def keyset_before(cursor):
+    """Rows strictly after the cursor position in (-created_at, -id) order."""
+    created_at, pk = decode_cursor(cursor)
+    return models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=pk)
+
+
+def keyset_after(cursor):
+    """Rows strictly newer than the cursor position, for incremental "since" fetches."""
+    created_at, pk = decode_cursor(cursor)
+    return models.Q(created_at__gt=created_at) | models.Q(created_at=created_at, id__gt=pk)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def apply_date_range(qs, params, field='created_at'):
+    # date_from / date_to are inclusive calendar days (YYYY-MM-DD). Compare the bare
+    # column against aware day boundaries; wrapping it in DATE() would defeat the
+    # (user, created_at, id) indexes.
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    if date_from:
+        parsed = parse_date(date_from)
+        if parsed is None:
+            raise ValueError('date_from must be YYYY-MM-DD.')
+        qs = qs.filter(**{f'{field}__gte': _day_start(parsed)})
+    if date_to:
+        parsed = parse_date(date_to)
+        if parsed is None:
+            raise ValueError('date_to must be YYYY-MM-DD.')
+        qs = qs.filter(**{f'{field}__lt': _day_start(parsed + timedelta(days=1))})
+    return qs
+
+
+def merge_newest_first(querysets, limit):
+    """
+    Merge already (-created_at, -id) ordered querysets into one page.
+
+    Each branch is sliced to ``limit + 1`` so every branch is a single bounded,
+    index-backed query; the extra row tells us whether there is a next page.
+    """
+    branches = [list(qs[:limit + 1]) for qs in querysets]
+    seen = set()
+    rows = []
+    for row in heapq.merge(*branches, key=lambda r: (r.created_at, r.id), reverse=True):
+        if row.id in seen:
+            continue
+        seen.add(row.id)
+        rows.append(row)
+        if len(rows) > limit:
+            break
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more and rows else None
+    return rows, next_cursor
+
+
+def iter_oldest_first(qs, chunk_size):
+    """
+    Stream a ``.values()`` queryset in (created_at, id) order with bounded keyset chunks.
+
+    Unlike ``QuerySet.iterator()``, which MySQL drivers buffer in full on the client,
+    every chunk is its own index-backed query, so memory stays at one chunk.
+    """
+    qs = qs.order_by('created_at', 'id')
+    page = qs
+    while True:
+        rows = list(page[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+        page = qs.filter(
+            models.Q(created_at__gt=last['created_at']) | models.Q(created_at=last['created_at'], id__gt=last['id'])
+        )
@@ -0,0 +1,103 @@
+"""
+Account-number -> payee resolution with a bounded in-process LRU/TTL cache.
+
+Shared by ``ResolveAccountView``, ``TransferMoneyView`` and the batch endpoints so
+that resolving a payee while the user types and again at transfer time costs at
+most one query. Each entry remembers the account's version key in the shared cache
+when it was loaded. A profile change or deletion in any worker bumps that key, so
+every worker drops the entry on its next lookup; entries also expire after ``TTL``.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as shared_cache
+from django.db import transaction
+
+MAX_ENTRIES = 10000
+TTL = 60.0
+
+Payee = namedtuple('Payee', 'id username email account_number balance_shards')
+
+
+def payee_as_user(payee):
+    """A reference ``User`` carrying only the payee fields, for FKs and notifications; never save it."""
+    User = get_user_model()
+    return User(
+        id=payee.id, username=payee.username, email=payee.email,
+        account_number=payee.account_number, balance_shards=payee.balance_shards,
+    )
+
+
+class PayeeCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, account_number, version=0):
+        with self._lock:
+            hit = self._entries.get(account_number)
+            if hit is None:
+                return None
+            payee, loaded_version, expires = hit
+            if loaded_version != version or expires < time.monotonic():
+                del self._entries[account_number]
+                return None
+            self._entries.move_to_end(account_number)
+            return payee
+
+    def put(self, payee, version=0):
+        with self._lock:
+            self._entries[payee.account_number] = (payee, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(payee.account_number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, account_number):
+        with self._lock:
+            self._entries.pop(account_number, None)
+
+
+cache = PayeeCache()
+
+
+def _version_key(account_number):
+    return f'payees:{account_number}:version'
+
+
+def resolve_many(account_numbers):
+    """Map each known account number to its Payee; misses are fetched with one query."""
+    numbers = set(account_numbers)
+    stored = shared_cache.get_many([_version_key(number) for number in numbers])
+    versions = {number: stored.get(_version_key(number), 0) for number in numbers}
+    found, missing = {}, []
+    for number in numbers:
+        payee = cache.get(number, versions[number])
+        if payee is None:
+            missing.append(number)
+        else:
+            found[number] = payee
+    if missing:
+        User = get_user_model()
+        for row in User.objects.filter(account_number__in=missing).values_list(*Payee._fields):
+            payee = Payee(*row)
+            cache.put(payee, versions[payee.account_number])
+            found[payee.account_number] = payee
+    return found
+
+
+def resolve(account_number):
+    return resolve_many([account_number]).get(account_number)
+
+
+def invalidate(account_number):
+    """Drop the payee here at once and, after commit, in every other worker."""
+    cache.invalidate(account_number)
+    transaction.on_commit(lambda: shared_cache.set(_version_key(account_number), time.time_ns(), None))
+
+
+def user_deleted(sender, instance, **kwargs):
+    invalidate(instance.account_number)
@@ -0,0 +1,107 @@
+"""
+Fan-out of small delta events to WebSocket consumers over the channel layer.
+
+Events are published after the surrounding transaction commits and are encoded to
+JSON once here, so consumers forward the same text frame to every client.
+"""
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+BLOG_FEED_GROUP = 'blog_feed'
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id):
+    return f'user_{user_id}'
+
+
+def _encode(event, data):
+    return json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+
+
+def _send(group, text):
+    try:
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        async_to_sync(layer.group_send)(group, {'type': 'push.event', 'text': text})
+    except Exception:
+        # Best-effort: clients resync over REST when they reconnect
+        logger.warning('Could not publish to %s', group, exc_info=True)
+
+
+def publish(group, event, data):
+    text = _encode(event, data)
+    transaction.on_commit(lambda: _send(group, text))
+
+
+def publish_user_change(user, removed=False):
+    """After commit, send a users-directory diff to every ``UserListConsumer``."""
+    from .directory import USER_DIRECTORY_GROUP, directory_entry
+
+    entry = directory_entry(user)
+    op = 'remove' if removed else 'upsert'
+    message = {
+        'type': 'directory.event',
+        'op': op,
+        'id': entry['id'],
+        'user': entry,
+        'text': _encode('user_removed' if removed else 'user_upsert', entry),
+    }
+
+    def send():
+        try:
+            layer = get_channel_layer()
+            if layer is None:
+                return
+            async_to_sync(layer.group_send)(USER_DIRECTORY_GROUP, message)
+        except Exception:
+            logger.warning('Could not publish to %s', USER_DIRECTORY_GROUP, exc_info=True)
+
+    transaction.on_commit(send)
+
+
+def user_deleted(sender, instance, **kwargs):
+    publish_user_change(instance, removed=True)
+
+
+def publish_account_activity(txs):
+    """
+    After commit, push each new transaction to both parties and one fresh balance per
+    affected account. Balances are read after commit so they include concurrent postings.
+    """
+    from . import ledger
+    from .models import User
+    from .serializers import TransactionSerializer
+
+    txs = list(txs)
+    per_user = {}
+    for tx, data in zip(txs, TransactionSerializer(txs, many=True).data):
+        text = _encode('transaction_created', data)
+        for user in (tx.from_user, tx.to_user):
+            if user is not None:
+                per_user.setdefault(user.id, []).append(text)
+
+    def send():
+        # Runs after the postings committed, so a failure here must not fail the request
+        try:
+            # Fresh rows: the posted instances may be stale or payee-only references
+            users = User.objects.filter(id__in=list(per_user)).only('id', 'balance', 'last_snapshot_id')
+            balances = ledger.get_balances(users)
+        except Exception:
+            logger.exception('Could not read balances to publish for accounts %s', sorted(per_user))
+            balances = {}
+        for user_id, texts in per_user.items():
+            for text in texts:
+                _send(user_group(user_id), text)
+            if user_id in balances:
+                _send(user_group(user_id), _encode('balance_changed', {'balance': str(balances[user_id])}))
+
+    if per_user:
+        transaction.on_commit(send)
@@ -0,0 +1,187 @@
+"""
+Nightly EMI collection for approved loans.
+
+``collect_due`` first retries arrears: every SHORTFALL due on or before the run date,
+oldest first. It then walks the approved loans whose approval day matches the due
+date, in id-ordered keyset chunks. Instalment k of a loan falls due k months after
+approval, the same as in ``amortization.loan_schedule``. Each chunk is priced with
+one vectorized ``amortization`` call and then settled in its own transaction:
+
+* borrowers are locked in ascending id order with ``ledger.lock_accounts``;
+* every instalment the borrower can cover is debited, all through one ``ledger.post_many``;
+* every instalment gets one ``LoanRepayment`` row, written with a single ``bulk_create``.
+  Instalments the borrower cannot cover are recorded as SHORTFALL and nothing is debited.
+
+Each chunk commits separately, and instalments that already have a row are skipped,
+so a run can be stopped and started again for the same date. A SHORTFALL stays
+outstanding until a later run collects it in its arrears pass.
+"""
+import calendar
+from collections import namedtuple
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils import timezone
+
+from . import amortization, ledger
+from .models import Loan, LoanRepayment
+
+CHUNK_SIZE = 1000
+
+DueInstalment = namedtuple('DueInstalment', 'loan_id applicant_id instalment amount')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _candidates(due_date, loans=None):
+    loans = (Loan.objects.all() if loans is None else loans).filter(status='APPROVED', approved_at__lt=_day_start(due_date))
+    on_day = Q(approved_at__day=due_date.day)
+    if due_date.day == calendar.monthrange(due_date.year, due_date.month)[1]:
+        # Loans approved on the 29th-31st fall due on the last day of shorter months
+        on_day |= Q(approved_at__day__gt=due_date.day)
+    return loans.filter(on_day).order_by('id')
+
+
+def _due_instalments(rows, due_date):
+    """Keep the rows with an instalment due on ``due_date`` and price that instalment."""
+    due = []
+    for loan_id, applicant_id, amount, rate, term, approved_at in rows:
+        start = approved_at.date()
+        k = (due_date.year - start.year) * 12 + due_date.month - start.month
+        if 1 <= k <= term and amortization.add_months(start, k) == due_date:
+            due.append((loan_id, applicant_id, int(amount * 100), float(rate), term, k))
+    if not due:
+        return []
+    loan_ids, applicant_ids, principal, rate, term, instalment = zip(*due)
+    payments = amortization.instalment_payments(principal, rate, term, instalment)
+    return [
+        DueInstalment(loan_id, applicant_id, k, Decimal(int(paise)).scaleb(-2))
+        for loan_id, applicant_id, k, paise in zip(loan_ids, applicant_ids, instalment, payments)
+    ]
+
+
+def _settle(due, due_date):
+    """Collect one chunk of instalments; returns ``(paid, shortfall, skipped, collected)``."""
+    borrowers = ledger.lock_accounts(d.applicant_id for d in due)
+    # Read under the borrower locks so overlapping runs cannot both collect an instalment.
+    # Existing shortfalls are left to the arrears pass.
+    recorded = set(
+        LoanRepayment.objects.filter(loan_id__in=[d.loan_id for d in due], due_date=due_date)
+        .values_list('loan_id', flat=True)
+    )
+    pending = [d for d in due if d.loan_id not in recorded]
+    if not pending:
+        return 0, 0, len(due), ledger.ZERO
+
+    balances = ledger.get_balances(borrowers.values())
+    postings, outcomes = [], []
+    for d in pending:
+        if balances[d.applicant_id] >= d.amount:
+            balances[d.applicant_id] -= d.amount
+            postings.append(('REPAYMENT', d.amount, borrowers[d.applicant_id], None))
+            outcomes.append((d, 'PAID'))
+        else:
+            outcomes.append((d, 'SHORTFALL'))
+    txs = iter(ledger.post_many(postings))
+
+    now = timezone.now()
+    LoanRepayment.objects.bulk_create([
+        LoanRepayment(
+            loan_id=d.loan_id, instalment=d.instalment, due_date=due_date, amount=d.amount,
+            status=status, transaction=next(txs) if status == 'PAID' else None, attempted_at=now,
+        )
+        for d, status in outcomes
+    ])
+    paid = len(postings)
+    collected = sum((amount for _, amount, _, _ in postings), ledger.ZERO)
+    return paid, len(pending) - paid, len(recorded), collected
+
+
+def _settle_arrears(chunk):
+    """Retry one chunk of ``(repayment_id, applicant_id)`` shortfalls; returns ``(recovered, collected)``."""
+    borrowers = ledger.lock_accounts(applicant_id for _, applicant_id in chunk)
+    # Re-read under the borrower locks; an overlapping run may have collected some already
+    outstanding = list(
+        LoanRepayment.objects.filter(id__in=[repayment_id for repayment_id, _ in chunk], status='SHORTFALL')
+        .select_related('loan').only('loan__applicant_id', 'instalment', 'due_date', 'amount').order_by('due_date', 'id')
+    )
+    balances = ledger.get_balances(borrowers.values())
+    recovered, postings = [], []
+    for repayment in outstanding:
+        applicant_id = repayment.loan.applicant_id
+        if balances[applicant_id] >= repayment.amount:
+            balances[applicant_id] -= repayment.amount
+            postings.append(('REPAYMENT', repayment.amount, borrowers[applicant_id], None))
+            recovered.append(repayment)
+    txs = ledger.post_many(postings)
+
+    # Replacing the recovered rows costs one DELETE and one INSERT, not an UPDATE per row
+    now = timezone.now()
+    LoanRepayment.objects.filter(id__in=[r.id for r in recovered]).delete()
+    LoanRepayment.objects.bulk_create([
+        LoanRepayment(
+            loan_id=r.loan_id, instalment=r.instalment, due_date=r.due_date, amount=r.amount,
+            status='PAID', transaction=tx, attempted_at=now,
+        )
+        for r, tx in zip(recovered, txs)
+    ])
+    LoanRepayment.objects.filter(id__in=[r.id for r in outstanding], status='SHORTFALL').update(attempted_at=now)
+    return len(recovered), sum((amount for _, amount, _, _ in postings), ledger.ZERO)
+
+
+def _stats(**counts):
+    stats = dict.fromkeys(('arrears', 'recovered', 'scanned', 'due', 'paid', 'shortfall', 'skipped'), 0)
+    stats['collected'] = ledger.ZERO
+    stats.update(counts)
+    return stats
+
+
+def collect_arrears(run_date, chunk_size=CHUNK_SIZE, loans=None):
+    """Retry every SHORTFALL due on or before ``run_date``, oldest first; yields one stats dict per chunk."""
+    shortfalls = LoanRepayment.objects.filter(status='SHORTFALL', due_date__lte=run_date).order_by('due_date', 'id')
+    if loans is not None:
+        shortfalls = shortfalls.filter(loan__in=loans)
+    after = None
+    while True:
+        page = shortfalls
+        if after is not None:
+            page = page.filter(Q(due_date__gt=after[0]) | Q(due_date=after[0], id__gt=after[1]))
+        rows = list(page.values_list('id', 'loan__applicant_id', 'due_date')[:chunk_size])
+        if not rows:
+            return
+        after = (rows[-1][2], rows[-1][0])
+        chunk = [(repayment_id, applicant_id) for repayment_id, applicant_id, _ in rows]
+        recovered, collected = ledger.run_atomic_with_retry(lambda: _settle_arrears(chunk))
+        yield _stats(arrears=len(rows), recovered=recovered, collected=collected)
+
+
+def collect_due(due_date, chunk_size=CHUNK_SIZE, loans=None):
+    """
+    Collect arrears and then every instalment due on ``due_date``; yields one stats dict per chunk.
+
+    ``loans`` optionally restricts both passes to a Loan queryset. Stats hold the
+    ``arrears`` retried and how many were ``recovered``, then ``scanned`` loans,
+    ``due`` instalments, ``paid``, ``shortfall``, ``skipped`` (already recorded by an
+    earlier run) and the ``collected`` amount.
+    """
+    yield from collect_arrears(due_date, chunk_size=chunk_size, loans=loans)
+    candidates = _candidates(due_date, loans).values_list(
+        'id', 'applicant_id', 'amount', 'interest_rate', 'term_months', 'approved_at',
+    )
+    last_id = 0
+    while True:
+        rows = list(candidates.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        due = _due_instalments(rows, due_date)
+        paid = shortfall = skipped = 0
+        collected = ledger.ZERO
+        if due:
+            paid, shortfall, skipped, collected = ledger.run_atomic_with_retry(lambda: _settle(due, due_date))
+        yield _stats(
+            scanned=len(rows), due=len(due), paid=paid, shortfall=shortfall, skipped=skipped, collected=collected,
+        )
@@ -3,4 +3,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/users/$', consumers.UserListConsumer.as_asgi()),
+    re_path(r'ws/blogs/$', consumers.BlogFeedConsumer.as_asgi()),
+    re_path(r'ws/account/$', consumers.AccountConsumer.as_asgi()),
 ] 
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+In-process search index for the users directory.
+
+* Prefix matches use one sorted list of ``(term, user_id)`` pairs for usernames,
+  emails and account numbers, searched with ``bisect``.
+* Substring matches scan one flat, newline-separated text blob with ``str.find``.
+  The scan runs at C speed and stays compact for millions of users. Users changed
+  since the blob was built live in a small overlay until the next rebuild.
+
+Local changes are applied immediately through ``upsert_user``. Changes made by
+other workers are picked up by polling ``User.updated_at`` every few seconds.
+Matches are re-read from the database by id, so deleted users never leak out
+between rebuilds.
+
+Builds and syncs run on a background thread, started at process startup and again
+by ``ensure_fresh`` whenever the index is due. Searches keep using the previous
+index until the new one is swapped in; before the first build completes,
+``ready`` is False and callers fall back to the database.
+"""
+import bisect
+import logging
+import threading
+import time
+from array import array
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL = 5.0
+REBUILD_INTERVAL = 3600.0
+MAX_OVERLAY = 5000
+SUBSTRING_MIN_LENGTH = 3
+# Matches examined per search before ranking; bounds the cost of very common substrings
+SCAN_BUDGET = 2000
+
+
+def _terms(username, email, account_number):
+    return [t for t in ((username or '').lower(), (email or '').lower(), account_number or '') if t]
+
+
+def _rank(term_list, q):
+    # 0: exact, 1: prefix, 2: substring
+    best = 3
+    for term in term_list:
+        if term == q:
+            return 0
+        if term.startswith(q):
+            best = 1
+        elif best > 2 and q in term:
+            best = 2
+    return best
+
+
+class UserSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+        self._terms = {}          # user_id -> [terms]
+        self._prefix = []         # sorted (term, user_id)
+        self._blob = ''
+        self._offsets = array('q')
+        self._blob_ids = array('q')
+        self._overlay = set()     # ids whose blob line is stale or missing
+        self._built_at = None
+        self._synced_at = 0.0
+        self._watermark = None
+
+    # -- building -----------------------------------------------------------
+
+    def build_from(self, rows):
+        """Build from ``(id, username, email, account_number)`` rows."""
+        terms = {}
+        for user_id, username, email, account_number in rows:
+            terms[user_id] = _terms(username, email, account_number)
+        prefix = sorted((term, user_id) for user_id, ts in terms.items() for term in ts)
+        blob, offsets, ids = self._compile_blob(terms)
+        with self._lock:
+            self._terms, self._prefix = terms, prefix
+            self._blob, self._offsets, self._blob_ids = blob, offsets, ids
+            self._overlay = set()
+            self._built_at = time.monotonic()
+
+    @staticmethod
+    def _compile_blob(terms):
+        parts, offsets, ids, pos = [], array('q'), array('q'), 0
+        for user_id, ts in terms.items():
+            line = '\t'.join(ts) + '\n'
+            offsets.append(pos)
+            ids.append(user_id)
+            parts.append(line)
+            pos += len(line)
+        return ''.join(parts), offsets, ids
+
+    def _load(self):
+        User = get_user_model()
+        watermark = timezone.now()
+        rows = User.objects.order_by().values_list('id', 'username', 'email', 'account_number').iterator(chunk_size=10000)
+        self.build_from(rows)
+        self._watermark = watermark
+        self._synced_at = time.monotonic()
+
+    @property
+    def ready(self):
+        return self._built_at is not None
+
+    def ensure_fresh(self):
+        """Start a background rebuild or sync when one is due; never blocks the caller."""
+        now = time.monotonic()
+        if not self._stale(now) and now - self._synced_at <= SYNC_INTERVAL:
+            return
+        with self._refresh_lock:
+            # is_alive() is False in a forked worker, so a refresh cut off by fork is restarted
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._refresh, name='user-search-refresh', daemon=True)
+            self._refresher.start()
+
+    def _stale(self, now):
+        return self._built_at is None or now - self._built_at > REBUILD_INTERVAL or len(self._overlay) > MAX_OVERLAY
+
+    def _refresh(self):
+        try:
+            if self._stale(time.monotonic()):
+                self._load()
+            # Also picks up local upserts made while a rebuild was running
+            self._sync()
+        except Exception:
+            logger.exception('User search index refresh failed')
+        finally:
+            connections.close_all()
+
+    def _sync(self):
+        User = get_user_model()
+        watermark = timezone.now()
+        # Small overlap so rows committed slightly out of order are not missed
+        changed = User.objects.filter(updated_at__gte=self._watermark - timedelta(seconds=SYNC_INTERVAL))
+        for row in changed.values_list('id', 'username', 'email', 'account_number'):
+            self.upsert(*row)
+        self._watermark = watermark
+        self._synced_at = time.monotonic()
+
+    # -- incremental updates -------------------------------------------------
+
+    def upsert(self, user_id, username, email, account_number):
+        new_terms = _terms(username, email, account_number)
+        with self._lock:
+            if self._built_at is None:
+                return
+            old_terms = self._terms.get(user_id, [])
+            if old_terms == new_terms:
+                return
+            for term in old_terms:
+                i = bisect.bisect_left(self._prefix, (term, user_id))
+                if i < len(self._prefix) and self._prefix[i] == (term, user_id):
+                    del self._prefix[i]
+            for term in new_terms:
+                bisect.insort(self._prefix, (term, user_id))
+            self._terms[user_id] = new_terms
+            self._overlay.add(user_id)
+
+    def upsert_user(self, user):
+        self.upsert(user.id, user.username, user.email, user.account_number)
+
+    # -- querying ------------------------------------------------------------
+
+    def search(self, q, limit=20, exclude_id=None):
+        """Ranked user ids: exact, then prefix, then substring matches; shorter terms first."""
+        q = q.strip().lower()
+        if not q:
+            return []
+        with self._lock:
+            candidates = self._prefix_candidates(q)
+            candidates.discard(exclude_id)
+            # Substring hits always rank below prefix hits, so only scan when prefixes cannot fill the page
+            if len(q) >= SUBSTRING_MIN_LENGTH and len(candidates) < limit:
+                candidates |= self._substring_candidates(q, SCAN_BUDGET)
+                candidates.discard(exclude_id)
+            scored = []
+            for user_id in candidates:
+                term_list = self._terms.get(user_id)
+                if not term_list:
+                    continue
+                scored.append((_rank(term_list, q), len(term_list[0]), user_id))
+        scored.sort()
+        return [user_id for _, _, user_id in scored[:limit]]
+
+    def _prefix_candidates(self, q):
+        found = set()
+        i = bisect.bisect_left(self._prefix, (q,))
+        prefix = self._prefix
+        while i < len(prefix) and prefix[i][0].startswith(q) and len(found) < SCAN_BUDGET:
+            found.add(prefix[i][1])
+            i += 1
+        return found
+
+    def _substring_candidates(self, q, budget):
+        found = set()
+        blob, offsets, ids, overlay = self._blob, self._offsets, self._blob_ids, self._overlay
+        pos = blob.find(q)
+        while pos != -1 and len(found) < budget:
+            row = bisect.bisect_right(offsets, pos) - 1
+            user_id = ids[row]
+            if user_id not in overlay:
+                found.add(user_id)
+            # Skip to the next line; one hit per user is enough
+            end = blob.find('\n', pos)
+            pos = blob.find(q, end + 1) if end != -1 else -1
+        for user_id in overlay:
+            if len(found) >= budget:
+                break
+            if any(q in term for term in self._terms.get(user_id, ())):
+                found.add(user_id)
+        return found
+
+
+index = UserSearchIndex()
@@ -1,15 +1,32 @@
+import time
 from decimal import Decimal
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from . import ledger
 from .models import OTP, User, Blog, Transaction, Comment, Loan
 
 User = get_user_model()
 
+
+def build_profile_image_url(user, request=None):
+    """Absolute profile image URL with a ``?v=`` cache-buster taken from the model, never from storage."""
+    image = getattr(user, 'profile_image', None)
+    if not image:
+        return None
+    url = image.url
+    full_url = request.build_absolute_uri(url) if request is not None else url
+    if user.profile_image_version:
+        sep = '&' if '?' in full_url else '?'
+        return f"{full_url}{sep}v={user.profile_image_version}"
+    return full_url
+
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
     profile_image_url = serializers.SerializerMethodField(read_only=True)
+    balance = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
@@ -31,21 +48,11 @@ class UserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
+    def get_balance(self, obj):
+        return str(ledger.get_balance(obj))
+
     def get_profile_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.profile_image and hasattr(obj.profile_image, 'url'):
-            url = obj.profile_image.url
-            try:
-                modified = obj.profile_image.storage.get_modified_time(obj.profile_image.name)
-                version = int(modified.timestamp()) if modified else None
-            except Exception:
-                version = None
-            full_url = request.build_absolute_uri(url) if request is not None else url
-            if version:
-                sep = '&' if '?' in full_url else '?'
-                return f"{full_url}{sep}v={version}"
-            return full_url
-        return None
+        return build_profile_image_url(obj, self.context.get('request'))
 
 
 class ProfileUpdateSerializer(serializers.ModelSerializer):
@@ -53,6 +60,17 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
         model = User
         fields = ('username', 'phone_number', 'profile_image')
 
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        update_fields = list(validated_data) + ['updated_at']
+        if 'profile_image' in validated_data:
+            instance.profile_image_version = time.time_ns() // 1_000_000
+            update_fields.append('profile_image_version')
+        # Only write what changed: request.user may be a cached copy with stale balance columns
+        instance.save(update_fields=update_fields)
+        return instance
+
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
     password = serializers.CharField(required=True)
@@ -74,6 +92,12 @@ class DepositSerializer(serializers.Serializer):
     amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
 
 
+class TransferSerializer(DepositSerializer):
+    # Same amount rules as deposits and the Transaction.amount column
+    to_account_number = serializers.CharField(max_length=20)
+    from_account_number = serializers.CharField(max_length=20, required=False, allow_blank=True)
+
+
 class BalanceSerializer(serializers.Serializer):
     balance = serializers.DecimalField(max_digits=12, decimal_places=2)
 
@@ -89,21 +113,7 @@ class BlogSerializer(serializers.ModelSerializer):
         read_only_fields = ['author', 'created_at']
 
     def get_author_profile_image_url(self, obj):
-        image = getattr(obj.author, 'profile_image', None)
-        if image and hasattr(image, 'url'):
-            request = self.context.get('request')
-            url = image.url
-            try:
-                modified = image.storage.get_modified_time(image.name)
-                version = int(modified.timestamp()) if modified else None
-            except Exception:
-                version = None
-            full_url = request.build_absolute_uri(url) if request is not None else url
-            if version:
-                sep = '&' if '?' in full_url else '?'
-                return f"{full_url}{sep}v={version}"
-            return full_url
-        return None
+        return build_profile_image_url(obj.author, self.context.get('request'))
 
     def get_image_url(self, obj):
         image = getattr(obj, 'image', None)
@@ -123,21 +133,7 @@ class ChildCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['author', 'created_at']
 
     def get_author_profile_image_url(self, obj):
-        image = getattr(obj.author, 'profile_image', None)
-        if image and hasattr(image, 'url'):
-            request = self.context.get('request')
-            url = image.url
-            try:
-                modified = image.storage.get_modified_time(image.name)
-                version = int(modified.timestamp()) if modified else None
-            except Exception:
-                version = None
-            full_url = request.build_absolute_uri(url) if request is not None else url
-            if version:
-                sep = '&' if '?' in full_url else '?'
-                return f"{full_url}{sep}v={version}"
-            return full_url
-        return None
+        return build_profile_image_url(obj.author, self.context.get('request'))
 
 
 class NestedCommentSerializer(serializers.ModelSerializer):
@@ -152,25 +148,23 @@ class NestedCommentSerializer(serializers.ModelSerializer):
 
     def get_replies(self, obj):
         # Only one-level nesting to keep payload small
-        replies_qs = obj.replies.select_related('author').order_by('created_at')
+        replies_by_parent = self.context.get('replies_by_parent')
+        if replies_by_parent is not None:
+            # Whole tree was loaded up front (see accounts.comments)
+            replies_qs = replies_by_parent.get(obj.id, [])
+        else:
+            replies_qs = obj.replies.select_related('author').order_by('created_at')
         return ChildCommentSerializer(replies_qs, many=True, context=self.context).data
 
     def get_author_profile_image_url(self, obj):
-        image = getattr(obj.author, 'profile_image', None)
-        if image and hasattr(image, 'url'):
-            request = self.context.get('request')
-            url = image.url
-            try:
-                modified = image.storage.get_modified_time(image.name)
-                version = int(modified.timestamp()) if modified else None
-            except Exception:
-                version = None
-            full_url = request.build_absolute_uri(url) if request is not None else url
-            if version:
-                sep = '&' if '?' in full_url else '?'
-                return f"{full_url}{sep}v={version}"
-            return full_url
-        return None
+        return build_profile_image_url(obj.author, self.context.get('request'))
+
+
+class CommentNodeSerializer(serializers.ModelSerializer):
+    """Comment without author details, as cached by ``accounts.comments``."""
+    class Meta:
+        model = Comment
+        fields = ['id', 'author', 'content', 'created_at', 'parent']
 
 
 class CommentCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,292 @@
+"""
+Account statements: monthly summaries and streaming history exports.
+
+Monthly ``Statement`` rows are folded from the ledger by ``ledger.take_snapshot``.
+Each folding pass takes exactly the entries it moves into the snapshot balance, so
+every entry is counted once and posting never touches a summary row. Credits stay
+lock-free inserts. A month is read with one query for its summary, one for the
+entries posted since the last snapshot, and one for the page of entries.
+
+Exports (CSV and NDJSON) read plain ``values()`` dicts in bounded keyset chunks. The
+sent and received sides are read separately so each uses its (user, created_at)
+index, merged lazily and rendered a chunk at a time. Under ASGI the chunks are
+pulled through ``stream_async``. Memory stays flat no matter how long the history is.
+"""
+import calendar
+import csv
+import heapq
+import io
+import json
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db.models import DateField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import LedgerEntry, Statement, User
+from .pagination import iter_oldest_first
+
+ZERO = Decimal('0.00')
+
+CHUNK_SIZE = 2000
+
+COLUMNS = ['id', 'created_at', 'type', 'direction', 'amount', 'from_username', 'to_username']
+
+_FIELDS = ('id', 'created_at', 'type', 'amount', 'from_user_id', 'to_user_id', 'from_user__username', 'to_user__username')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def iter_history(user, base, chunk_size=CHUNK_SIZE):
+    """Yield the user's transactions from ``base`` oldest first as export dicts."""
+    base = base.values(*_FIELDS)
+    branches = [
+        iter_oldest_first(base.filter(from_user=user), chunk_size),
+        iter_oldest_first(base.filter(to_user=user), chunk_size),
+    ]
+    last_id = None
+    for row in heapq.merge(*branches, key=lambda r: (r['created_at'], r['id'])):
+        if row['id'] == last_id:
+            continue
+        last_id = row['id']
+        yield {
+            'id': row['id'],
+            'created_at': row['created_at'].isoformat(),
+            'type': row['type'],
+            'direction': 'DEBIT' if row['from_user_id'] == user.id else 'CREDIT',
+            'amount': str(row['amount']),
+            'from_username': row['from_user__username'] or '',
+            'to_username': row['to_user__username'] or '',
+        }
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_csv(rows, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for batch in _batched(rows, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def render_ndjson(rows, chunk_size=CHUNK_SIZE):
+    dumps = json.dumps
+    for batch in _batched(rows, chunk_size):
+        yield ''.join(dumps(row) + '\n' for row in batch)
+
+
+RENDERERS = {
+    'csv': render_csv,
+    'ndjson': render_ndjson,
+}
+
+
+async def stream_async(chunks):
+    """
+    Serve a rendered export to ASGI one chunk at a time.
+
+    Django's ASGI handler consumes a synchronous iterator with ``sync_to_async(list)``,
+    which would hold the whole export in memory. Here each chunk (and the keyset query
+    behind it) runs in one ``sync_to_async`` hop on the thread that owns the connection.
+    """
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+# -- monthly statements ------------------------------------------------------
+
+def month_start(value):
+    value = timezone.localtime(value) if isinstance(value, datetime) else value
+    return date(value.year, value.month, 1)
+
+
+def month_bounds(period):
+    """Aware ``[start, end)`` datetimes of the month starting at ``period``."""
+    last_day = calendar.monthrange(period.year, period.month)[1]
+    start = timezone.make_aware(datetime.combine(period, time.min))
+    end = timezone.make_aware(datetime.combine(date.fromordinal(period.toordinal() + last_day), time.min))
+    return start, end
+
+
+def _activity(entries):
+    """Sum ledger entries per month: ``{period: {'credits', 'debits', 'by_type'}}``."""
+    rows = (
+        entries.annotate(period=TruncMonth('created_at', output_field=DateField()))
+        .values('period', 'transaction__type', 'entry_type')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    activity = defaultdict(lambda: {'credits': ZERO, 'debits': ZERO, 'by_type': {}})
+    for row in rows:
+        side = 'credits' if row['entry_type'] == LedgerEntry.CREDIT else 'debits'
+        month = activity[row['period']]
+        month[side] += row['total']
+        by_type = month['by_type'].setdefault(row['transaction__type'], {'credits': ZERO, 'debits': ZERO})
+        by_type[side] += row['total']
+    return activity
+
+
+def _merge_by_type(stored, added):
+    merged = {t: dict(v) for t, v in stored.items()}
+    for tx_type, sides in added.items():
+        target = merged.setdefault(tx_type, {'credits': '0.00', 'debits': '0.00'})
+        for side, amount in sides.items():
+            target[side] = str(Decimal(target[side]) + amount)
+    return merged
+
+
+def fold_entries(account_id, snapshot_id, balance_before):
+    """
+    Add the account's entries folded into snapshot ``snapshot_id`` to its statements.
+
+    ``balance_before`` is the balance before that snapshot; it opens the account's
+    first statement. Runs under the account row lock held by ``take_snapshot``.
+    """
+    activity = _activity(LedgerEntry.objects.filter(account_id=account_id, snapshot_id=snapshot_id))
+    for period in sorted(activity):
+        month = activity[period]
+        net = month['credits'] - month['debits']
+        statement = Statement.objects.filter(account_id=account_id, period=period).first()
+        if statement is None:
+            previous = Statement.objects.filter(account_id=account_id, period__lt=period).order_by('-period').first()
+            following = Statement.objects.filter(account_id=account_id, period__gt=period).order_by('period').first()
+            if previous is not None:
+                opening = previous.closing_balance
+            elif following is not None:
+                opening = following.opening_balance
+            else:
+                opening = balance_before
+            statement = Statement(account_id=account_id, period=period, opening_balance=opening, closing_balance=opening)
+        statement.total_credits += month['credits']
+        statement.total_debits += month['debits']
+        statement.closing_balance += net
+        statement.totals_by_type = _merge_by_type(statement.totals_by_type, month['by_type'])
+        statement.save()
+        if net:
+            # An entry landing in an earlier month (clock skew at a month boundary) carries forward
+            Statement.objects.filter(account_id=account_id, period__gt=period).update(
+                opening_balance=F('opening_balance') + net, closing_balance=F('closing_balance') + net,
+            )
+
+
+def close_statements(before_period):
+    """Mark statements for months before ``before_period`` as final."""
+    return Statement.objects.filter(period__lt=before_period, closed=False).update(closed=True)
+
+
+def _serialize(statement):
+    return {
+        'period': statement.period.strftime('%Y-%m'),
+        'opening_balance': str(statement.opening_balance),
+        'total_credits': str(statement.total_credits),
+        'total_debits': str(statement.total_debits),
+        'closing_balance': str(statement.closing_balance),
+        'totals_by_type': {
+            tx_type: {side: str(Decimal(amount)) for side, amount in sides.items()}
+            for tx_type, sides in statement.totals_by_type.items()
+        },
+        'closed': statement.closed,
+    }
+
+
+def get_statement(user, period):
+    """The statement for ``period``, including entries posted since the last snapshot."""
+    # The watermark comes from the same row read, so folded and live entries never overlap
+    stored = (
+        Statement.objects.filter(account_id=user.id, period__lte=period)
+        .annotate(watermark=F('account__last_snapshot_id'))
+        .order_by('-period')
+        .first()
+    )
+    if stored is not None:
+        watermark = stored.watermark
+        if stored.period != period:
+            stored = Statement(
+                account_id=user.id, period=period, closed=period < month_start(timezone.now()),
+                opening_balance=stored.closing_balance, closing_balance=stored.closing_balance,
+            )
+    else:
+        # No activity folded up to this month: it opens with the account's earliest known balance
+        account = User.objects.only('balance', 'last_snapshot_id').get(id=user.id)
+        following = Statement.objects.filter(account_id=user.id, period__gt=period).order_by('period').first()
+        opening = following.opening_balance if following is not None else account.balance
+        watermark = account.last_snapshot_id
+        stored = Statement(account_id=user.id, period=period, opening_balance=opening, closing_balance=opening)
+
+    _, end = month_bounds(period)
+    live = _activity(LedgerEntry.objects.filter(
+        Q(snapshot__isnull=True) | Q(snapshot_id__gt=watermark), account_id=user.id, created_at__lt=end,
+    ))
+    for month_period, month in live.items():
+        net = month['credits'] - month['debits']
+        if month_period < period:
+            stored.opening_balance += net
+        else:
+            stored.total_credits += month['credits']
+            stored.total_debits += month['debits']
+            stored.totals_by_type = _merge_by_type(stored.totals_by_type, month['by_type'])
+            stored.closed = False
+        stored.closing_balance += net
+    return _serialize(stored)
+
+
+def list_statements(user):
+    return [_serialize(s) for s in Statement.objects.filter(account_id=user.id).order_by('-period')]
+
+
+def entries_page(user, period, after_cursor_q, limit):
+    """One page of the month's ledger entries, oldest first; returns ``(rows, last_row)``."""
+    start, end = month_bounds(period)
+    qs = (
+        LedgerEntry.objects.filter(account_id=user.id, created_at__gte=start, created_at__lt=end)
+        .order_by('created_at', 'id')
+        .values(
+            'id', 'created_at', 'entry_type', 'amount', 'transaction_id', 'transaction__type',
+            'transaction__from_user__username', 'transaction__to_user__username',
+        )
+    )
+    if after_cursor_q is not None:
+        qs = qs.filter(after_cursor_q)
+    rows = list(qs[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    results = [
+        {
+            'id': row['id'],
+            'created_at': row['created_at'].isoformat(),
+            'entry_type': row['entry_type'],
+            'amount': str(row['amount']),
+            'transaction_id': row['transaction_id'],
+            'type': row['transaction__type'],
+            'counterparty': (
+                row['transaction__to_user__username'] if row['entry_type'] == LedgerEntry.DEBIT
+                else row['transaction__from_user__username']
+            ),
+        }
+        for row in rows
+    ]
+    return results, (rows[-1] if has_more and rows else None)
@@ -1,3 +1,1185 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import os
+import re
+import smtplib
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from django.apps import apps as django_apps
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+
+from . import (
+    amortization, analytics, authentication, directory, feed, idempotency, ledger, notifications, onboarding, outbox,
+    payees, realtime, repayments, search, statements, transfers,
+)
+from .models import (
+    Blog, Comment, IdempotencyKey, LedgerEntry, Loan, LoanRepayment, OutboxEmail, Statement, Transaction, User,
+)
+from .middleware import JWTAuthMiddleware
+from .pagination import apply_date_range, decode_cursor
+from .routing import websocket_urlpatterns
+
+
+def make_user(name, balance='0.00'):
+    return User.objects.create_user(
+        username=name, email=f'{name}@example.com', password='pass12345', balance=Decimal(balance),
+    )
+
+
+class LedgerInvariantTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '100.00')
+        self.bob = make_user('bob')
+
+    def fresh(self, user):
+        return User.objects.get(id=user.id)
+
+    def assert_conserved(self, *users):
+        # Live balance == opening balance + every entry ever posted, snapshotted or not
+        for user, opening in users:
+            net = LedgerEntry.objects.filter(account=user).aggregate(total=Sum(ledger._signed_amount))['total']
+            self.assertEqual(ledger.get_balance(self.fresh(user)), Decimal(opening) + (net or ledger.ZERO))
+
+    def test_post_moves_money_and_rejects_overdraft(self):
+        payer = ledger.lock_payer(self.alice)
+        ledger.post('TRANSFER', Decimal('30.00'), from_user=payer, to_user=self.bob)
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.post('TRANSFER', Decimal('70.01'), from_user=ledger.lock_payer(self.alice), to_user=self.bob)
+        self.assertEqual(ledger.get_balance(self.fresh(self.alice)), Decimal('70.00'))
+        self.assertEqual(ledger.get_balance(self.fresh(self.bob)), Decimal('30.00'))
+
+    def test_snapshot_keeps_balance_and_marks_every_entry(self):
+        ledger.post_many([('TRANSFER', Decimal('10.00'), self.alice, self.bob)] * 3)
+        before = {u.id: ledger.get_balance(self.fresh(u)) for u in (self.alice, self.bob)}
+        for user in (self.alice, self.bob):
+            ledger.take_snapshot(user.id)
+        self.assertFalse(LedgerEntry.objects.filter(snapshot__isnull=True).exists())
+        self.assertEqual({u.id: ledger.get_balance(self.fresh(u)) for u in (self.alice, self.bob)}, before)
+        self.assertIsNone(ledger.take_snapshot(self.alice.id))
+
+    def test_entry_committed_after_snapshot_with_lower_id_is_not_lost(self):
+        # A posting whose entry id is allocated first but which commits after the snapshot
+        late = ledger.post('DEPOSIT', Decimal('7.00'), to_user=self.bob)
+        late_entry = late.entries.get()
+        LedgerEntry.objects.filter(id=late_entry.id).delete()
+        for _ in range(3):
+            ledger.post('DEPOSIT', Decimal('5.00'), to_user=self.bob)
+        ledger.take_snapshot(self.bob.id)
+        LedgerEntry.objects.bulk_create([late_entry])
+        self.assertEqual(ledger.get_balance(self.fresh(self.bob)), Decimal('22.00'))
+        ledger.take_snapshot(self.bob.id)
+        bob = self.fresh(self.bob)
+        self.assertEqual(bob.balance, Decimal('22.00'))
+        statement = Statement.objects.get(account=bob)
+        self.assertEqual(statement.total_credits, Decimal('22.00'))
+        self.assertEqual(statement.closing_balance, Decimal('22.00'))
+
+    def test_stale_account_row_still_reads_exact_balance(self):
+        ledger.post('DEPOSIT', Decimal('8.00'), to_user=self.bob)
+        stale = self.fresh(self.bob)
+        ledger.take_snapshot(self.bob.id)
+        ledger.post('DEPOSIT', Decimal('2.00'), to_user=self.bob)
+        self.assertEqual(ledger.get_balance(stale), Decimal('10.00'))
+        self.assertEqual(ledger.get_balances([stale])[self.bob.id], Decimal('10.00'))
+
+    def test_snapshot_all_respects_grace_and_conserves_money(self):
+        ledger.post_many([('TRANSFER', Decimal('1.25'), self.alice, self.bob)] * 8)
+        self.assertEqual(ledger.snapshot_all(), 0)
+        self.assertEqual(ledger.snapshot_all(grace=timedelta(0)), 2)
+        ledger.post('TRANSFER', Decimal('0.50'), from_user=ledger.lock_payer(self.alice), to_user=self.bob)
+        self.assert_conserved((self.alice, '100.00'), (self.bob, '0.00'))
+
+    def test_sharded_payer_never_overdraws(self):
+        ledger.set_shards(self.alice, 4)
+        ledger.post('DEPOSIT', Decimal('20.00'), to_user=self.fresh(self.alice))
+        for _ in range(12):
+            ledger.post('TRANSFER', Decimal('10.00'), from_user=ledger.lock_payer(self.fresh(self.alice)), to_user=self.bob)
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.post('TRANSFER', Decimal('0.01'), from_user=ledger.lock_payer(self.fresh(self.alice)), to_user=self.bob)
+        ledger.take_snapshot(self.alice.id)
+        shards = ledger._shard_balances(self.alice.id)
+        self.assertTrue(all(balance >= 0 for balance in shards.values()))
+        self.assertEqual(sum(shards.values()), ledger.ZERO)
+        self.assert_conserved((self.alice, '100.00'), (self.bob, '0.00'))
+
+    def test_drained_shards_retry_instead_of_waiting_out_of_order(self):
+        ledger.set_shards(self.alice, 4)
+        real, fallbacks = ledger._shard_balances, []
+
+        def contended(account_id, shards=None, lock=False, count=None, nowait=False):
+            if lock and not nowait:
+                return {shard: ledger.ZERO for shard in shards}  # drained by concurrent debits
+            if nowait:
+                fallbacks.append(shards)
+                if len(fallbacks) == 1:
+                    raise DatabaseError('lock not available')
+            return real(account_id, shards, lock, count, nowait)
+
+        with mock.patch.object(ledger, '_shard_balances', side_effect=contended):
+            ledger.run_atomic_with_retry(lambda: ledger.post(
+                'TRANSFER', Decimal('10.00'), from_user=ledger.lock_payer(self.fresh(self.alice)), to_user=self.bob,
+            ), backoff=0)
+        self.assertEqual(fallbacks, [None, None])
+        self.assertEqual(ledger.get_balance(self.fresh(self.bob)), Decimal('10.00'))
+        self.assert_conserved((self.alice, '100.00'), (self.bob, '0.00'))
+
+
+class TransactionExportMemoryTests(TestCase):
+    # Large enough that holding the export whole would break the ceiling.
+    # Raise EXPORT_TEST_ROWS (e.g. to 2000000) to reproduce a full-size export.
+    ROWS = int(os.environ.get('EXPORT_TEST_ROWS', 150000))
+    MAX_PEAK = 10 * 2 ** 20
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.owner = make_user('exporter')
+        peer = make_user('peer')
+        for offset in range(0, cls.ROWS, 10000):
+            Transaction.objects.bulk_create([
+                Transaction(
+                    type='TRANSFER', amount=Decimal(i % 1000 + 1),
+                    from_user=cls.owner if i % 2 else peer, to_user=peer if i % 2 else cls.owner,
+                )
+                for i in range(offset, min(offset + 10000, cls.ROWS))
+            ])
+        cls.auth = {'Authorization': f'Bearer {RefreshToken.for_user(cls.owner).access_token}'}
+        cls.url = reverse('transactions-export', args=['csv'])
+
+    def assert_streamed(self, size, lines, peak):
+        self.assertEqual(lines, self.ROWS + 1)
+        self.assertGreater(size, self.MAX_PEAK)
+        self.assertLess(peak, self.MAX_PEAK, f'peak {peak / 2 ** 20:.1f} MiB for a {size / 2 ** 20:.1f} MiB export')
+
+    def test_wsgi_export_streams_in_bounded_memory(self):
+        def consume():
+            response = self.client.get(self.url, headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+            size = lines = 0
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                lines += chunk.count(b'\n')
+            return size, lines
+
+        consume()  # warm up lazy imports and URL resolution outside the measurement
+        tracemalloc.start()
+        try:
+            size, lines = consume()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assert_streamed(size, lines, peak)
+
+    async def test_asgi_export_streams_in_bounded_memory(self):
+        async def consume():
+            response = await self.async_client.get(self.url, headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            size = lines = 0
+            # Iterate the response itself, as Django's ASGIHandler does
+            async for chunk in response:
+                size += len(chunk)
+                lines += chunk.count(b'\n')
+            return size, lines
+
+        await consume()
+        tracemalloc.start()
+        try:
+            size, lines = await consume()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assert_streamed(size, lines, peak)
+
+
+class ImportUsersTests(TestCase):
+    def test_imported_balance_is_an_opening_deposit(self):
+        rows = [
+            onboarding.clean_row({'email': 'a@example.com', 'username': 'a', 'password': 'x', 'balance': '125.50'}),
+            onboarding.clean_row({'email': 'b@example.com', 'username': 'b', 'password': 'x'}),
+        ]
+        self.assertEqual(onboarding.insert_chunk(rows, ['!', '!']), (2, 0))
+        a, b = User.objects.get(username='a'), User.objects.get(username='b')
+        self.assertEqual(a.balance, ledger.ZERO)
+        self.assertEqual(ledger.get_balance(a), Decimal('125.50'))
+        self.assertEqual(ledger.get_balance(b), ledger.ZERO)
+        deposit = Transaction.objects.get(to_user=a)
+        self.assertEqual((deposit.type, deposit.amount), ('DEPOSIT', Decimal('125.50')))
+        self.assertFalse(Transaction.objects.filter(to_user=b).exists())
+
+    def test_negative_balance_is_rejected(self):
+        with self.assertRaises(onboarding.RowError):
+            onboarding.clean_row({'email': 'c@example.com', 'username': 'c', 'password': 'x', 'balance': '-1'})
+
+
+class FlakySMTPConnection:
+    """Email connection double: ``drop_after`` sends succeed, then the server disconnects."""
+
+    def __init__(self, refuse_open=False, drop_after=None, reopen=True):
+        self.refuse_open, self.drop_after, self.reopen = refuse_open, drop_after, reopen
+        self.opened = 0
+        self.sent = []
+
+    def open(self):
+        if self.refuse_open or (self.opened and not self.reopen):
+            raise ConnectionRefusedError('connection refused')
+        self.opened += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        if self.drop_after is not None and len(self.sent) == self.drop_after:
+            self.drop_after = None
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        self.sent.extend(messages)
+        return len(messages)
+
+
+class OutboxDrainTests(TestCase):
+    def setUp(self):
+        outbox.enqueue_many([(f'user{i}@example.com', 'Subject', 'Body', '') for i in range(5)])
+
+    def drain_with(self, connection):
+        with mock.patch.object(outbox, 'get_connection', return_value=connection):
+            return outbox.drain(batch_size=10)
+
+    def test_unreachable_server_backs_off_without_spending_attempts(self):
+        self.assertEqual(self.drain_with(FlakySMTPConnection(refuse_open=True)), (0, 0))
+        emails = OutboxEmail.objects.all()
+        self.assertTrue(all(e.status == 'PENDING' and e.attempts == 0 for e in emails))
+        self.assertTrue(all(e.next_attempt_at > timezone.now() for e in emails))
+
+    def test_disconnect_mid_batch_reconnects_and_sends_the_rest(self):
+        connection = FlakySMTPConnection(drop_after=2)
+        self.assertEqual(self.drain_with(connection), (5, 0))
+        self.assertEqual(connection.opened, 2)
+        self.assertEqual(OutboxEmail.objects.filter(status='SENT').count(), 5)
+
+    def test_lost_server_defers_the_remaining_emails(self):
+        self.assertEqual(self.drain_with(FlakySMTPConnection(drop_after=2, reopen=False)), (2, 0))
+        self.assertEqual(OutboxEmail.objects.filter(status='SENT').count(), 2)
+        pending = OutboxEmail.objects.filter(status='PENDING')
+        self.assertEqual(pending.count(), 3)
+        self.assertTrue(all(e.attempts == 0 for e in pending))
+
+
+class DateRangeFilterTests(TestCase):
+    def test_date_range_is_inclusive_and_uses_plain_column_comparisons(self):
+        user = make_user('dated')
+        days = ['2024-03-01 00:00:00', '2024-03-01 23:59:59', '2024-03-02 12:00:00', '2024-03-03 00:00:00']
+        for stamp in days:
+            tx = Transaction.objects.create(type='DEPOSIT', to_user=user, amount=Decimal('1.00'))
+            Transaction.objects.filter(id=tx.id).update(
+                created_at=timezone.make_aware(datetime.strptime(stamp, '%Y-%m-%d %H:%M:%S')),
+            )
+        qs = apply_date_range(Transaction.objects.all(), {'date_from': '2024-03-01', 'date_to': '2024-03-02'})
+        self.assertEqual(qs.count(), 3)
+        self.assertNotIn('django_datetime_cast_date', str(qs.query).lower())
+        self.assertNotIn('date(', str(qs.query).lower())
+        with self.assertRaises(ValueError):
+            apply_date_range(Transaction.objects.all(), {'date_to': '03/02/2024'})
+
+
+class DirectorySnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_id = make_user('listed').id
+
+    async def test_failed_load_does_not_leak_a_subscriber(self):
+        snapshot = directory.DirectorySnapshot()
+        with mock.patch.object(directory, '_load', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                await snapshot.acquire()
+        self.assertEqual(snapshot.subscribers, 0)
+        users = await snapshot.acquire()
+        self.assertIn(self.user_id, users)
+        snapshot.release()
+        self.assertIsNone(snapshot.users)
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('cached')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def test_cache_holds_no_password_hash(self):
+        self.assertEqual(self.client.get(reverse('balance'), headers=self.auth).status_code, 200)
+        entry = cache.get(authentication.cache_key(self.user.id))
+        self.assertEqual(set(entry) - {'revoke'}, set(authentication.CACHED_FIELDS))
+        self.assertNotIn(self.user.password, entry.values())
+
+    def test_deactivation_through_any_save_revokes_access(self):
+        self.assertEqual(self.client.get(reverse('balance'), headers=self.auth).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(id=self.user.id)
+            user.is_active = False
+            user.save()
+        self.assertEqual(self.client.get(reverse('balance'), headers=self.auth).status_code, 401)
+
+    def test_profile_reads_uncached_fields_from_the_database(self):
+        self.client.get(reverse('balance'), headers=self.auth)
+        User.objects.filter(id=self.user.id).update(phone_number='5550100')
+        response = self.client.get(reverse('me'), headers=self.auth)
+        self.assertEqual(response.json()['phone_number'], '5550100')
+
+    def test_cached_user_matches_the_database_row(self):
+        self.client.get(reverse('balance'), headers=self.auth)
+        user = authentication.user_from_entry(cache.get(authentication.cache_key(self.user.id)))
+        self.assertEqual(
+            [getattr(user, name) for name in authentication.CACHED_FIELDS],
+            [getattr(self.user, name) for name in authentication.CACHED_FIELDS],
+        )
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_deleting_the_user_revokes_access(self):
+        self.assertEqual(self.client.get(reverse('balance'), headers=self.auth).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(id=self.user.id).delete()
+        self.assertEqual(self.client.get(reverse('balance'), headers=self.auth).status_code, 401)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class WebsocketAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('socket')
+        self.token = UntypedToken(str(RefreshToken.for_user(self.user).access_token))
+        self.key = authentication.cache_key(self.user.id)
+        self.middleware = JWTAuthMiddleware(None)
+
+    def load_user(self):
+        return mock.patch('accounts.middleware.load_user', wraps=authentication.load_user)
+
+    async def test_miss_fills_the_cache_and_hits_skip_the_database(self):
+        with self.load_user() as load:
+            first = await self.middleware.get_user(self.token)
+            self.assertIsNotNone(await cache.aget(self.key))
+            second = await self.middleware.get_user(self.token)
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual((first.id, second.id), (self.user.id, self.user.id))
+
+    async def test_concurrent_handshakes_share_one_lookup(self):
+        with self.load_user() as load:
+            users = await asyncio.gather(*(self.middleware.get_user(self.token) for _ in range(5)))
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual({user.id for user in users}, {self.user.id})
+        self.assertEqual(self.middleware._inflight, {})
+
+    async def test_cached_user_is_rebuilt_with_uncached_fields_deferred(self):
+        await sync_to_async(authentication.load_user)(self.user.id)
+        user = await self.middleware.get_user(self.token)
+        self.assertEqual((user.email, user.balance, user._state.adding), (self.user.email, self.user.balance, False))
+        self.assertTrue({'password', 'phone_number'} <= user.get_deferred_fields())
+        self.assertFalse(set(authentication.CACHED_FIELDS) & user.get_deferred_fields())
+
+    async def test_inactive_cached_user_is_refused(self):
+        entry = await sync_to_async(authentication.load_user)(self.user.id)
+        await cache.aset(self.key, {**entry[1], 'is_active': False})
+        with self.assertRaises(AuthenticationFailed):
+            await self.middleware.get_user(self.token)
+
+    def test_user_save_drops_the_cached_entry_on_commit(self):
+        authentication.load_user(self.user.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.save()
+            self.assertIsNotNone(cache.get(self.key))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(self.key))
+
+    def test_deleted_user_connects_anonymously_after_commit(self):
+        authentication.load_user(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertIsNone(cache.get(self.key))
+        self.assertIsInstance(async_to_sync(self.middleware.get_user)(self.token), AnonymousUser)
+
+
+class UserSearchIndexTests(TestCase):
+    def test_rebuild_runs_in_background_and_old_index_keeps_serving(self):
+        index = search.UserSearchIndex()
+        index.build_from([(1, 'alice', 'alice@example.com', '1000000001')])
+        index._built_at -= search.REBUILD_INTERVAL + 1
+        started, release = threading.Event(), threading.Event()
+
+        def slow_load():
+            started.set()
+            release.wait(5)
+            index.build_from([(2, 'alicia', 'alicia@example.com', '1000000002')])
+
+        with mock.patch.object(index, '_load', side_effect=slow_load), mock.patch.object(index, '_sync'):
+            index.ensure_fresh()
+            self.assertTrue(started.wait(5))
+            index.ensure_fresh()  # a second caller neither blocks nor starts another build
+            self.assertEqual(index.search('ali'), [1])
+            release.set()
+            index._refresher.join(5)
+        self.assertEqual(index.search('ali'), [2])
+
+    def test_search_falls_back_to_database_before_first_build(self):
+        cache.clear()
+        me = make_user('searcher')
+        make_user('findme')
+        with mock.patch.object(search, 'index', search.UserSearchIndex()), \
+                mock.patch.object(search.UserSearchIndex, 'ensure_fresh'):
+            token = RefreshToken.for_user(me).access_token
+            response = self.client.get(reverse('users-search'), {'q': 'find'}, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual([row['username'] for row in response.json()['results']], ['findme'])
+
+
+class BatchTransferValidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.payer = make_user('payer', '100.00')
+        self.payee = make_user('payee')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.payer).access_token}'}
+
+    def test_amounts_follow_the_column_precision(self):
+        amounts = ['0.001', '12345678901.00', '-1', 'abc', '10.50']
+        response = self.client.post(reverse('transfer-batch'), {'transfers': [
+            {'to_account_number': self.payee.account_number, 'amount': amount} for amount in amounts
+        ]}, content_type='application/json', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['error'] * 4 + ['ok'])
+        self.assertEqual(list(Transaction.objects.values_list('amount', flat=True)), [Decimal('10.50')])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class PayeeCacheTests(TransactionTestCase):
+    # Committed data, so the batch endpoint's transaction really commits and checks foreign keys
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch.object(payees, 'cache', payees.PayeeCache()))
+        self.payer = make_user('sender', '100.00')
+        self.payee = make_user('receiver')
+
+    def in_other_worker(self):
+        return mock.patch.object(payees, 'cache', payees.PayeeCache())
+
+    def test_hits_skip_the_database_until_any_worker_invalidates(self):
+        number = self.payee.account_number
+        self.assertEqual(payees.resolve(number).username, 'receiver')
+        with self.assertNumQueries(0):
+            self.assertEqual(payees.resolve(number).username, 'receiver')
+
+        User.objects.filter(id=self.payee.id).update(username='renamed')
+        with self.in_other_worker():
+            payees.invalidate(number)
+        self.assertEqual(payees.resolve(number).username, 'renamed')
+
+        with self.in_other_worker():
+            User.objects.get(id=self.payee.id).delete()
+        self.assertIsNone(payees.resolve(number))
+
+    def test_batch_fails_only_items_whose_cached_payee_was_deleted(self):
+        other = make_user('other')
+        payees.resolve_many([self.payer.account_number, self.payee.account_number, other.account_number])
+        # Deleted by another worker whose invalidation has not landed yet
+        with mock.patch.object(payees, 'invalidate'):
+            User.objects.filter(id=other.id).delete()
+
+        token = RefreshToken.for_user(self.payer).access_token
+        response = self.client.post(
+            reverse('transfer-batch'),
+            {'transfers': [
+                {'to_account_number': self.payee.account_number, 'amount': '10.00'},
+                {'to_account_number': other.account_number, 'amount': '20.00'},
+            ]},
+            content_type='application/json', headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['status'], r.get('error')) for r in response.json()['results']],
+            [('ok', None), ('error', 'Recipient not found.')],
+        )
+        self.assertEqual(ledger.get_balance(User.objects.get(id=self.payer.id)), Decimal('90.00'))
+        self.assertIsNone(payees.resolve(other.account_number))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class TransferEngineTests(TransactionTestCase):
+    # The engine applies batches on its own thread and connection, so test data must be committed
+
+    def setUp(self):
+        cache.clear()
+        self.payers = [make_user(f'payer{i}', '100.00') for i in range(3)]
+        self.payee = make_user('payee')
+
+    def submit_all(self, amounts):
+        engine = transfers.TransferEngine(max_batch=10, max_wait=0.3)
+        futures = [engine.submit(payer.id, self.payee, Decimal(amount)) for payer, amount in zip(self.payers, amounts)]
+        outcome = []
+        for future in futures:
+            try:
+                outcome.append(future.result(5))
+            except Exception as exc:
+                outcome.append(exc)
+        return outcome
+
+    def balance(self, user):
+        return ledger.get_balance(User.objects.get(id=user.id))
+
+    def test_transfers_arriving_together_share_one_batch(self):
+        with mock.patch.object(transfers, 'apply_transfers', wraps=transfers.apply_transfers) as apply:
+            txs = self.submit_all(['10.00', '20.00', '30.00'])
+        self.assertEqual(apply.call_count, 1)
+        self.assertEqual(len(apply.call_args.args[0]), 3)
+        self.assertEqual(Transaction.objects.filter(id__in=[tx.id for tx in txs], type='TRANSFER').count(), 3)
+        self.assertEqual(self.balance(self.payee), Decimal('60.00'))
+
+    def test_a_short_payer_fails_without_undoing_its_batch(self):
+        outcome = self.submit_all(['10.00', '100.01', '30.00'])
+        self.assertIsInstance(outcome[1], ledger.InsufficientFunds)
+        self.assertEqual(self.balance(self.payers[1]), Decimal('100.00'))
+        self.assertEqual(self.balance(self.payee), Decimal('40.00'))
+
+    def test_a_failed_batch_is_retried_item_by_item(self):
+        apply_transfers = transfers.apply_transfers
+        broken = self.payers[1].id
+
+        def fail_with_broken_payer(pending):
+            if any(payer_id == broken for _, payer_id, _, _ in pending):
+                raise DatabaseError('lost connection')
+            return apply_transfers(pending)
+
+        with mock.patch.object(transfers, 'apply_transfers', side_effect=fail_with_broken_payer) as apply, \
+                self.assertLogs('accounts.transfers', 'ERROR'):
+            outcome = self.submit_all(['10.00', '20.00', '30.00'])
+        self.assertEqual(apply.call_count, 4)
+        self.assertIsInstance(outcome[1], DatabaseError)
+        self.assertEqual([tx.amount for tx in (outcome[0], outcome[2])], [Decimal('10.00'), Decimal('30.00')])
+        self.assertEqual(self.balance(self.payee), Decimal('40.00'))
+        self.assertEqual(Transaction.objects.filter(type='TRANSFER').count(), 2)
+
+    def transfer(self, **headers):
+        token = RefreshToken.for_user(self.payers[0]).access_token
+        return self.client.post(
+            reverse('transfer-money'), {'to_account_number': self.payee.account_number, 'amount': '5.00'},
+            content_type='application/json', headers={'Authorization': f'Bearer {token}', **headers},
+        )
+
+    def test_busy_shards_and_engine_timeouts_are_retryable_errors(self):
+        with mock.patch.object(transfers, 'engine') as engine:
+            engine.transfer.side_effect = FutureTimeoutError()
+            self.assertEqual(self.transfer().status_code, 504)
+            engine.transfer.side_effect = ledger.ShardsBusy('busy')
+            self.assertEqual(self.transfer().status_code, 503)
+        with mock.patch.object(transfers, 'engine', None), \
+                mock.patch.object(ledger, 'lock_payer', side_effect=ledger.ShardsBusy('busy')):
+            self.assertEqual(self.transfer().status_code, 503)
+        self.assertFalse(Transaction.objects.filter(type='TRANSFER').exists())
+
+    def test_requests_already_in_a_transaction_bypass_the_engine(self):
+        with mock.patch.object(transfers, 'engine') as engine:
+            response = self.transfer(**{'Idempotency-Key': 'inside-atomic'})
+            engine.transfer.assert_not_called()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.balance(self.payee), Decimal('5.00'))
+
+            self.assertEqual(self.transfer().status_code, 200)
+            engine.transfer.assert_called_once()
+            self.assertEqual(engine.transfer.call_args.args[0], self.payers[0].id)
+
+
+class AnalyticsTests(TestCase):
+    def summarize(self, amounts, **kwargs):
+        n = len(amounts)
+        columns = (np.arange(n) * 86400, np.array(amounts), np.zeros(n, 'int64'), np.full(n, -1))
+        return analytics.summarize(*columns, **kwargs)
+
+    def test_sums_are_exact_in_paise(self):
+        # Past 2**53 paise a float64 sum can no longer hold the odd paisa
+        result = self.summarize([9 * 10 ** 15 + 1, 9 * 10 ** 15 + 1, -3])
+        self.assertEqual(result['total_inflow'], '180000000000000.02')
+        self.assertEqual(result['total_outflow'], '0.03')
+        self.assertEqual(result['series'][1]['inflow'], '90000000000000.01')
+
+    def test_rolling_mean_rounds_half_up_to_the_paisa(self):
+        result = self.summarize([1, 2, 2], window=2)
+        self.assertEqual([row['rolling_net'] for row in result['series']], ['0.01', '0.02', '0.02'])
+
+    def test_endpoint_reads_amounts_from_the_database(self):
+        user, peer = make_user('analyst'), make_user('peer')
+        Transaction.objects.create(type='TRANSFER', amount=Decimal('0.10'), from_user=peer, to_user=user)
+        Transaction.objects.create(type='TRANSFER', amount=Decimal('0.20'), from_user=user, to_user=peer)
+        result = analytics.get_analytics(user, {})
+        self.assertEqual((result['total_inflow'], result['total_outflow']), ('0.10', '0.20'))
+        self.assertEqual(result['top_counterparties'][0]['username'], 'peer')
+
+
+class AmortizationTests(TestCase):
+    def test_every_row_reconciles_with_the_previous_rounded_balance(self):
+        principal, rate, term = 10 ** 8, 12.0, 360
+        _, instalment, payment, principal_part, interest, balance = amortization.schedules([principal], [rate], [term])
+        opening = np.concatenate(([principal], balance[:-1]))
+        r = Decimal(rate) / 1200
+        expected = [int((Decimal(int(b)) * r).to_integral_value(rounding='ROUND_HALF_UP')) for b in opening]
+        self.assertEqual(interest.tolist(), expected)
+        self.assertEqual((opening - principal_part).tolist(), balance.tolist())
+        self.assertEqual((payment - interest).tolist(), principal_part.tolist())
+        self.assertEqual(balance[-1], 0)
+        self.assertEqual(instalment.tolist(), list(range(1, term + 1)))
+
+    def test_portfolio_rows_match_single_loan_schedules(self):
+        loans = [(10 ** 8, 12.0, 360), (5 * 10 ** 6, 9.5, 24), (120000, 0.0, 12), (99999, 18.0, 1)]
+        batch = amortization.schedules(*zip(*loans))
+        for i, loan in enumerate(loans):
+            single = amortization.schedules(*([value] for value in loan))
+            rows = batch[0] == i
+            for batch_column, single_column in zip(batch[1:], single[1:]):
+                self.assertEqual(batch_column[rows].tolist(), single_column.tolist())
+
+    def test_portfolio_collections_are_exact_for_large_loan_books(self):
+        # Even one chunk's first-month total runs past 2**53 paise, where float64 sums drop paise
+        paise = [10 ** 12 - 1 - 7 * i for i in range(25_000)]
+        terms = [2 if i % 20 == 0 else 1 for i in range(len(paise))]
+        as_of = date(2026, 1, 15)
+        rows = [(Decimal(p).scaleb(-2), 12.0, term, as_of) for p, term in zip(paise, terms)]
+        expected = [0, 0]
+        _, instalment, payment = amortization.schedules(paise, [12.0] * len(paise), terms)[:3]
+        for k, amount in zip(instalment.tolist(), payment.tolist()):
+            expected[k - 1] += amount
+        self.assertGreater(expected[0] * amortization.CHUNK_LOANS // len(paise), 2 ** 53)
+
+        summary = amortization.portfolio(rows, as_of, horizon=2)
+        self.assertEqual([month['amount'] for month in summary['expected_collections']],
+                         [str(Decimal(total).scaleb(-2)) for total in expected])
+        self.assertEqual(summary['principal'], str(Decimal(sum(paise)).scaleb(-2)))
+
+
+class LoanRepaymentTests(TestCase):
+    def setUp(self):
+        self.borrower = make_user('borrower')
+
+    def approve(self, approved_at, amount='12000.00', term=12):
+        return Loan.objects.create(
+            applicant=self.borrower, amount=Decimal(amount), term_months=term, interest_rate=Decimal('12.00'),
+            status='APPROVED', approved_at=timezone.make_aware(approved_at),
+        )
+
+    def collect(self, due_date, **kwargs):
+        totals = repayments._stats()
+        for stats in repayments.collect_due(due_date, **kwargs):
+            for key, value in stats.items():
+                totals[key] += value
+        return totals
+
+    def balance(self):
+        return ledger.get_balance(User.objects.get(id=self.borrower.id))
+
+    def test_collects_due_instalments_once_across_chunks(self):
+        loans = [self.approve(datetime(2026, 1, 10, 9)) for _ in range(3)]
+        ledger.post('DEPOSIT', Decimal('10000.00'), to_user=self.borrower)
+        emi = Decimal(amortization.loan_schedule(loans[0])['emi'])
+
+        totals = self.collect(date(2026, 2, 10), chunk_size=2)
+        self.assertEqual((totals['scanned'], totals['paid'], totals['shortfall']), (3, 3, 0))
+        self.assertEqual(totals['collected'], emi * 3)
+        self.assertEqual(self.balance(), Decimal('10000.00') - emi * 3)
+        self.assertEqual(LoanRepayment.objects.filter(status='PAID', instalment=1).count(), 3)
+
+        rerun = self.collect(date(2026, 2, 10), chunk_size=2)
+        self.assertEqual((rerun['paid'], rerun['skipped']), (0, 3))
+        self.assertEqual(Transaction.objects.filter(type='REPAYMENT').count(), 3)
+
+    def test_later_nightly_run_recovers_a_shortfall(self):
+        self.approve(datetime(2026, 1, 10, 9))
+        first = self.collect(date(2026, 2, 10))
+        self.assertEqual(first['shortfall'], 1)
+        self.assertEqual(self.collect(date(2026, 2, 11))['recovered'], 0)
+
+        ledger.post('DEPOSIT', Decimal('5000.00'), to_user=self.borrower)
+        later = self.collect(date(2026, 2, 11))
+        self.assertEqual((later['arrears'], later['recovered'], later['due']), (1, 1, 0))
+        repayment = LoanRepayment.objects.get()
+        self.assertEqual((repayment.status, repayment.due_date), ('PAID', date(2026, 2, 10)))
+        self.assertEqual(repayment.transaction.amount, repayment.amount)
+        self.assertEqual(self.balance(), Decimal('5000.00') - repayment.amount)
+
+    def test_arrears_are_collected_oldest_first(self):
+        self.approve(datetime(2026, 1, 10, 9))
+        self.collect(date(2026, 2, 10))
+        self.collect(date(2026, 3, 10))
+        emi = LoanRepayment.objects.first().amount
+        ledger.post('DEPOSIT', emi, to_user=self.borrower)
+        self.assertEqual(self.collect(date(2026, 3, 11))['recovered'], 1)
+        self.assertEqual(
+            list(LoanRepayment.objects.order_by('instalment').values_list('status', flat=True)), ['PAID', 'SHORTFALL'],
+        )
+
+    def test_loans_approved_late_in_the_month_fall_due_on_its_last_day(self):
+        self.approve(datetime(2026, 1, 31, 23, 30))
+        ledger.post('DEPOSIT', Decimal('5000.00'), to_user=self.borrower)
+        self.assertEqual(self.collect(date(2026, 2, 27))['due'], 0)
+        self.assertEqual(self.collect(date(2026, 2, 28))['paid'], 1)
+
+
+class LoanBulkActionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = make_user('officer')
+        User.objects.filter(id=self.admin.id).update(is_staff=True)
+        self.borrower = make_user('applicant')
+        self.first, self.second = (
+            Loan.objects.create(applicant=self.borrower, amount=Decimal(amount), term_months=12)
+            for amount in ('1000.00', '2500.00')
+        )
+        self.decided = Loan.objects.create(
+            applicant=self.borrower, amount=Decimal('700.00'), term_months=6, status='REJECTED',
+        )
+
+    def decide(self, user, action, loan_ids):
+        auth = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        return self.client.post(
+            reverse('loan-bulk-action'), {'action': action, 'loan_ids': loan_ids},
+            content_type='application/json', headers=auth,
+        )
+
+    def test_batches_decide_only_pending_loans(self):
+        approved = self.decide(self.admin, 'approve', [self.first.id, self.decided.id, 10 ** 9, self.first.id]).json()
+        self.assertEqual((approved['succeeded'], approved['failed']), (1, 2))
+        self.assertEqual(
+            [(r['loan_id'], r['status'], r.get('loan_status') or r['error']) for r in approved['results']],
+            [(self.first.id, 'ok', 'APPROVED'), (self.decided.id, 'error', 'Loan already processed'),
+             (10 ** 9, 'error', 'Loan not found')],
+        )
+        self.assertIn('transaction_id', approved['results'][0])
+
+        rejected = self.decide(self.admin, 'reject', [self.first.id, self.second.id]).json()
+        self.assertEqual(
+            [(r['loan_id'], r['status']) for r in rejected['results']],
+            [(self.first.id, 'error'), (self.second.id, 'ok')],
+        )
+        self.assertNotIn('transaction_id', rejected['results'][1])
+
+        statuses = dict(Loan.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[loan.id] for loan in (self.first, self.second, self.decided)], ['APPROVED', 'REJECTED', 'REJECTED'],
+        )
+        self.assertEqual(Loan.objects.filter(approved_by=self.admin).count(), 2)
+        self.assertEqual(ledger.get_balance(User.objects.get(id=self.borrower.id)), Decimal('1000.00'))
+        self.assertEqual(Transaction.objects.filter(type='LOAN').count(), 1)
+
+    def test_only_staff_may_decide(self):
+        response = self.decide(self.borrower, 'approve', [self.first.id])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Loan.objects.get(id=self.first.id).status, 'PENDING')
+        self.assertFalse(LedgerEntry.objects.exists())
+
+
+class ProfileImageVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('pictured')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def image_url(self):
+        return self.client.get(reverse('me'), headers=self.auth).json()['profile_image_url']
+
+    def test_url_carries_the_stored_version(self):
+        self.assertIsNone(self.image_url())
+        User.objects.filter(id=self.user.id).update(profile_image='profile_images/a.png', profile_image_version=0)
+        self.assertEqual(self.image_url(), 'http://testserver/media/profile_images/a.png')
+        User.objects.filter(id=self.user.id).update(profile_image_version=42)
+        self.assertEqual(self.image_url(), 'http://testserver/media/profile_images/a.png?v=42')
+
+    def test_upload_bumps_the_version(self):
+        User.objects.filter(id=self.user.id).update(profile_image='profile_images/a.png', profile_image_version=42)
+        png = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(png, 'PNG')
+        upload = SimpleUploadedFile('face.png', png.getvalue(), content_type='image/png')
+        response = self.client.put(
+            reverse('me'), encode_multipart(BOUNDARY, {'profile_image': upload}),
+            content_type=MULTIPART_CONTENT, headers=self.auth,
+        )
+        self.assertEqual(response.status_code, 200)
+        version = User.objects.get(id=self.user.id).profile_image_version
+        self.assertGreater(version, 42)
+        self.assertTrue(response.json()['profile_image_url'].endswith(f'?v={version}'))
+
+    def test_migration_versions_only_existing_images(self):
+        pictured = make_user('older')
+        User.objects.filter(id=pictured.id).update(profile_image='profile_images/old.png', profile_image_version=0)
+        User.objects.filter(id=self.user.id).update(profile_image='', profile_image_version=0)
+        migration = importlib.import_module('accounts.migrations.0016_profile_image_version_values')
+        migration.version_existing_images(django_apps, None)
+        versions = dict(User.objects.values_list('id', 'profile_image_version'))
+        self.assertGreater(versions[pictured.id], 0)
+        self.assertEqual(versions[self.user.id], 0)
+
+
+class NotificationTemplateTests(TestCase):
+    TRANSFER = {
+        'amount': '250.00', 'counterparty': 'bob', 'counterparty_email': 'bob@example.com',
+        'when': '2026-01-02 03:04:05', 'transaction_id': 7,
+    }
+
+    def legacy_html(self, preheader, title, lines, footer):
+        # The inline f-string markup the views built before templates were precompiled
+        html_lines = ''.join(f'<p style="margin:6px 0;color:#bcd3ff;">{line}</p>' for line in lines)
+        return f"""
+        <html>
+          <body style="font-family: Arial, sans-serif; background-color: #0b1020; padding: 30px; color: #eaf2ff;">
+            <div style="max-width: 560px; margin: auto; background: #0f1a38; border-radius: 10px; box-shadow: 0 0 24px rgba(45,127,249,0.25); padding: 28px; border: 1px solid rgba(45,127,249,0.25);">
+              <span style="display:none;visibility:hidden;opacity:0;height:0;width:0">{preheader}</span>
+              <h2 style="color: #eaf2ff; text-align: center; margin-top: 0;">K9TX Bank</h2>
+              <div style="text-align:center;margin:14px 0 20px 0;">
+                <span style="display:inline-block;background:#2d7ff9;color:#fff;font-size:16px;letter-spacing:1px;padding:8px 16px;border-radius:6px;font-weight:800;box-shadow:0 0 12px rgba(45,127,249,0.45);">{title}</span>
+              </div>
+              {html_lines}
+              <hr style="border:none;border-top:1px solid rgba(255,255,255,0.12);margin: 20px 0;" />
+              <p style="font-size:12px;color:#9fb4ff;text-align:center;margin:0;">{footer}</p>
+            </div>
+          </body>
+        </html>
+        """
+
+    def squash(self, html):
+        return re.sub(r'>\s+<', '><', html.strip())
+
+    def test_matches_the_inline_rendering_it_replaced(self):
+        lines = [
+            'Hi carol,',
+            'Your new digital banking experience starts now.',
+            'We focus on security, speed and a delightful interface to make money simple.',
+        ]
+        subject, text, html = notifications.render('welcome', {'name': 'carol'})
+        self.assertEqual(subject, 'Welcome to K9TX Bank')
+        self.assertEqual(text, 'Welcome Aboard\n\n' + '\n'.join(lines))
+        self.assertEqual(self.squash(html), self.squash(self.legacy_html(
+            'Thank you for creating your account with K9TX Bank.', 'Welcome Aboard', lines,
+            "We're glad you're here. If you did not sign up, please ignore this email.",
+        )))
+
+        lines = ['Amount: ₹250.00', 'To: bob (bob@example.com)', 'When: 2026-01-02 03:04:05', 'Transaction ID: 7']
+        subject, text, html = notifications.render('money_sent', self.TRANSFER)
+        self.assertEqual(subject, 'Transfer Money confirmation')
+        self.assertEqual([line for line in text.split('\n') if line], ['Money Sent', *lines])
+        self.assertEqual(self.squash(html), self.squash(self.legacy_html(
+            'You sent ₹250.00 to bob', 'Money Sent', lines, 'This is an automated message – please do not reply.',
+        )))
+
+    def test_values_are_escaped_in_html_only(self):
+        name = '<b>Tom & {otp}</b>'
+        _, text, html = notifications.render('welcome', {'name': name})
+        self.assertIn(f'Hi {name},', text)
+        self.assertIn('Hi &lt;b&gt;Tom &amp; {otp}&lt;/b&gt;,', html)
+        self.assertNotIn('<b>', html)
+
+    def test_static_braces_survive_and_missing_values_raise(self):
+        template = notifications.EmailTemplate(
+            subject='Rate for {name}', preheader='', title='Rates {fixed}', lines=['Hi {name}'], footer='',
+            brand='Bank {x}',
+        )
+        subject, text, html = template.render({'name': 'dan'})
+        self.assertEqual(subject, 'Rate for dan')
+        self.assertIn('Rates {fixed}', html)
+        self.assertIn('Bank {x}', html)
+        with self.assertRaises(KeyError):
+            notifications.render('money_sent', {'amount': '1.00'})
+
+    def test_render_many_matches_render(self):
+        contexts = [{**self.TRANSFER, 'transaction_id': i} for i in range(3)]
+        self.assertEqual(
+            notifications.render_many('money_received', contexts),
+            [notifications.render('money_received', context) for context in contexts],
+        )
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('retrier')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def deposit(self, amount='5.00', key='key-1'):
+        return self.client.post(
+            reverse('deposit-money'), {'amount': amount}, content_type='application/json',
+            headers={**self.auth, 'Idempotency-Key': key},
+        )
+
+    def deposits(self):
+        return Transaction.objects.filter(to_user=self.user, type='DEPOSIT').count()
+
+    def expire(self, key):
+        expired = timezone.now() - idempotency.KEY_TTL - timedelta(minutes=1)
+        IdempotencyKey.objects.filter(key=key).update(created_at=expired)
+
+    def test_retry_replays_the_stored_response_without_posting_again(self):
+        first = self.deposit()
+        second = self.deposit()
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second.headers['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+        self.assertEqual(self.deposits(), 1)
+        self.assertEqual(ledger.get_balance(User.objects.get(id=self.user.id)), Decimal('5.00'))
+
+    def test_reused_key_with_a_different_body_is_rejected(self):
+        self.deposit()
+        response = self.deposit(amount='6.00')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.deposits(), 1)
+
+    def test_concurrent_duplicate_replays_after_losing_the_claim(self):
+        original = self.deposit()
+        real_replay = idempotency._replay
+
+        def missed_then_real(*args):
+            # The duplicate's first read runs before the original commits, so it races for the claim
+            return None if replay.call_count == 1 else real_replay(*args)
+
+        with mock.patch.object(idempotency, '_replay', side_effect=missed_then_real) as replay:
+            duplicate = self.deposit()
+        self.assertEqual(replay.call_count, 2)
+        self.assertEqual(duplicate.status_code, 200)
+        self.assertEqual(duplicate.json(), original.json())
+        self.assertEqual(self.deposits(), 1)
+
+    def test_expired_keys_are_reclaimed_and_purged(self):
+        self.deposit(key='old')
+        self.deposit(key='fresh')
+        self.expire('old')
+        self.assertNotIn('Idempotent-Replayed', self.deposit(key='old').headers)
+        self.assertEqual(self.deposits(), 3)
+
+        self.expire('old')
+        out = io.StringIO()
+        call_command('purge_idempotency_keys', batch_size=1, stdout=out)
+        self.assertIn('Purged 1 expired key(s).', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['fresh'])
+
+
+class BlogFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('writer')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.author).access_token}'}
+
+    def fetch(self, host='localhost', **params):
+        return self.client.get(reverse('blogs'), params, headers=self.auth, HTTP_HOST=host).json()
+
+    def test_cached_first_page_attaches_current_authors_for_the_request_host(self):
+        Blog.objects.create(author=self.author, title='Hello', content='First post')
+        User.objects.filter(id=self.author.id).update(profile_image='profiles/w.png', profile_image_version=1)
+        first = self.fetch('localhost')['results']
+        self.assertTrue(first[0]['author_profile_image_url'].startswith('http://localhost/'))
+        self.assertEqual(set(cache.get(feed.FIRST_PAGE_KEY)), {'ids', 'next_cursor', 'sync'})
+
+        User.objects.filter(id=self.author.id).update(username='renamed', profile_image_version=2)
+        second = self.fetch('127.0.0.1')['results']
+        self.assertEqual([b['title'] for b in second], ['Hello'])
+        self.assertEqual(second[0]['author_username'], 'renamed')
+        self.assertEqual(second[0]['author_profile_image_url'], 'http://127.0.0.1/media/profiles/w.png?v=2')
+
+    def test_since_returns_a_blog_that_committed_after_a_higher_id_was_served(self):
+        served = Blog.objects.create(id=10, author=self.author, title='Served', content='x')
+        sync = self.fetch()['sync']
+        synced_at, _ = decode_cursor(sync)
+        # Stamped before the sync with a lower id, but committed after it
+        late = Blog.objects.create(id=5, author=self.author, title='Late', content='x')
+        Blog.objects.filter(id=late.id).update(created_at=synced_at - timedelta(seconds=5))
+        feed.mark_changed()
+
+        changes = self.fetch(since=sync)
+        self.assertFalse(changes['reset'])
+        self.assertIn(late.id, [b['id'] for b in changes['results']])
+
+        Blog.objects.filter(id=served.id).delete()
+        feed.record_deletion(served.id)
+        self.assertEqual(self.fetch(since=changes['sync'])['deleted'], [served.id])
+
+    def test_since_without_changes_skips_the_database(self):
+        feed.mark_changed()
+        sync = self.fetch()['sync']
+        with self.assertNumQueries(0):
+            changes = self.client.get(reverse('blogs'), {'since': sync}, headers=self.auth).json()
+        self.assertEqual((changes['results'], changes['sync']), ([], sync))
+
+
+class CommentTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('writer')
+        self.blog = Blog.objects.create(author=self.author, title='Rates', content='...')
+        thread = Comment.objects.create(blog=self.blog, author=self.author, content='First')
+        Comment.objects.create(blog=self.blog, author=self.author, content='Reply', parent=thread)
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.author).access_token}'}
+        self.url = reverse('blog-comments', args=[self.blog.id])
+
+    def fetch(self, host):
+        return self.client.get(self.url, headers=self.auth, HTTP_HOST=host).json()['results']
+
+    def test_author_details_are_fresh_and_urls_follow_the_request_host(self):
+        User.objects.filter(id=self.author.id).update(profile_image='profiles/a.png', profile_image_version=1)
+        first = self.fetch('localhost')
+        self.assertTrue(first[0]['author_profile_image_url'].startswith('http://localhost/'))
+
+        User.objects.filter(id=self.author.id).update(username='renamed', profile_image_version=2)
+        second = self.fetch('127.0.0.1')
+        self.assertEqual(second[0]['author_username'], 'renamed')
+        self.assertEqual(second[0]['replies'][0]['author_username'], 'renamed')
+        self.assertTrue(second[0]['author_profile_image_url'].startswith('http://127.0.0.1/'))
+        self.assertTrue(second[0]['author_profile_image_url'].endswith('?v=2'))
+        self.assertEqual([c['content'] for c in [second[0], *second[0]['replies']]], ['First', 'Reply'])
+
+
+class Socket(ApplicationCommunicator):
+    """Drives a websocket ASGI app the way a browser would, without a server."""
+
+    def __init__(self, app, path, query=''):
+        super().__init__(app, {
+            'type': 'websocket', 'path': path, 'query_string': query.encode(), 'headers': [], 'subprotocols': [],
+        })
+
+    async def connect(self):
+        await self.send_input({'type': 'websocket.connect'})
+        return (await self.receive_output(1))['type'] == 'websocket.accept'
+
+    async def receive_json(self):
+        return json.loads((await self.receive_output(1))['text'])
+
+    async def disconnect(self):
+        await self.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.wait(1)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class RealtimeConsumerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = make_user('reader')
+        self.writer = make_user('poster')
+        self.tokens = {user.id: str(RefreshToken.for_user(user).access_token) for user in (self.reader, self.writer)}
+        self.app = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    async def connect(self, path, user=None):
+        query = f'token={self.tokens[user.id]}' if user else ''
+        socket = Socket(self.app, f'/{path}', query)
+        return socket, await socket.connect()
+
+    def post(self, user, url_name, data, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse(url_name), data, headers={'Authorization': f'Bearer {self.tokens[user.id]}'}, **kwargs,
+            )
+
+    async def test_anonymous_sockets_are_refused(self):
+        _, connected = await self.connect('ws/blogs/')
+        self.assertFalse(connected)
+
+    async def test_blog_feed_pushes_each_new_blog_once_to_every_reader(self):
+        readers = [await self.connect('ws/blogs/', user) for user in (self.reader, self.writer)]
+        self.assertEqual([connected for _, connected in readers], [True, True])
+        response = await sync_to_async(self.post)(self.writer, 'blogs', {'title': 'Live', 'content': 'Pushed'})
+        self.assertEqual(response.status_code, 201)
+        for socket, _ in readers:
+            message = await socket.receive_json()
+            self.assertEqual(
+                (message['event'], message['data']['id'], message['data']['title']),
+                ('blog_created', response.json()['id'], 'Live'),
+            )
+            self.assertTrue(await socket.receive_nothing())
+            await socket.disconnect()
+
+    async def test_account_pushes_reach_only_the_account_owner(self):
+        mine, _ = await self.connect('ws/account/', self.writer)
+        theirs, _ = await self.connect('ws/account/', self.reader)
+        response = await sync_to_async(self.post)(
+            self.writer, 'deposit-money', {'amount': '5.00'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        events = [await mine.receive_json() for _ in range(2)]
+        self.assertEqual([event['event'] for event in events], ['transaction_created', 'balance_changed'])
+        self.assertEqual(events[1]['data'], {'balance': '5.00'})
+        self.assertTrue(await theirs.receive_nothing())
+        await mine.disconnect()
+        await theirs.disconnect()
+
+
+class AccountActivityPublishTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('depositor')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def deposit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('deposit-money'), {'amount': '5.00'}, content_type='application/json', headers=self.auth)
+
+    def test_balance_read_failure_after_commit_is_logged_not_raised(self):
+        with mock.patch.object(ledger, 'get_balances', side_effect=DatabaseError('gone')), \
+                self.assertLogs('accounts.realtime', 'ERROR'):
+            response = self.deposit()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ledger.get_balance(User.objects.get(id=self.user.id)), Decimal('5.00'))
+
+    def test_channel_layer_failure_is_logged_not_raised(self):
+        with mock.patch.object(realtime, 'get_channel_layer', side_effect=RuntimeError('no redis')), \
+                self.assertLogs('accounts.realtime', 'WARNING'):
+            response = self.deposit()
+        self.assertEqual(response.status_code, 200)
+
+
+class StatementEntriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('saver')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def test_entry_pages_cross_no_month_boundary(self):
+        ledger.post_many([('DEPOSIT', Decimal(i + 1), None, self.user) for i in range(6)])
+        start, end = statements.month_bounds(date(2026, 1, 1))
+        just = timedelta(microseconds=1)
+        stamps = [start - just, end - just, start, end, start + timedelta(days=15), end - just]
+        for entry, stamp in zip(LedgerEntry.objects.filter(account=self.user).order_by('id'), stamps):
+            LedgerEntry.objects.filter(id=entry.id).update(created_at=stamp)
+        january = list(
+            LedgerEntry.objects.filter(account=self.user, created_at__gte=start, created_at__lt=end)
+            .order_by('created_at', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(len(january), 4)
+
+        seen, params = [], {'limit': 2}
+        while True:
+            body = self.client.get(reverse('statement-detail', args=[2026, 1]), params, headers=self.auth).json()
+            seen += [entry['id'] for entry in body['entries']]
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(seen, january)
+
+        plan = LedgerEntry.objects.filter(
+            account=self.user, created_at__gte=start, created_at__lt=end,
+        ).order_by('created_at', 'id').explain()
+        self.assertIn('ledger_account_created_idx', plan)
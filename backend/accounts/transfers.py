@@ -0,0 +1,131 @@
+"""
+Transfer execution shared by ``TransferMoneyView``, ``BatchTransferView`` and the
+group-commit ``TransferEngine``.
+
+With ``TRANSFER_ENGINE`` enabled, single transfers from this worker are queued to one
+background thread. It applies everything that arrived within ``TRANSFER_ENGINE_MAX_WAIT_MS``
+(up to ``TRANSFER_ENGINE_MAX_BATCH`` items) in one database transaction, so many
+transfers share one set of lock round trips and one commit. Each caller blocks on a
+future that resolves only after its batch has committed.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import ledger, notifications, outbox, realtime
+
+logger = logging.getLogger(__name__)
+
+
+def transfer_notification_emails(transfers):
+    """Render sender and receiver notifications for ``(sender, receiver, amount, tx)`` tuples in one pass."""
+    sent_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    sent = notifications.render_many('money_sent', [
+        {'amount': amount, 'counterparty': receiver.username, 'counterparty_email': receiver.email,
+         'when': sent_at, 'transaction_id': tx.id}
+        for sender, receiver, amount, tx in transfers
+    ])
+    received = notifications.render_many('money_received', [
+        {'amount': amount, 'counterparty': sender.username, 'counterparty_email': sender.email,
+         'when': sent_at, 'transaction_id': tx.id}
+        for sender, receiver, amount, tx in transfers
+    ])
+    messages = []
+    for (sender, receiver, _, _), sent_msg, received_msg in zip(transfers, sent, received):
+        messages.append((sender.email, *sent_msg))
+        messages.append((receiver.email, *received_msg))
+    return messages
+
+
+def apply_transfers(pending):
+    """
+    Apply ``(key, payer_id, receiver, amount)`` transfers; must run inside ``transaction.atomic``.
+
+    Returns ``{key: Transaction}`` for applied items and ``{key: InsufficientFunds()}`` for
+    items the payer could not cover; one item's shortfall never affects the others.
+    """
+    # Payers locked in ascending id order with one query, so concurrent batches cannot deadlock
+    payers = ledger.lock_accounts(payer_id for _, payer_id, _, _ in pending)
+    available = ledger.get_balances(payers.values())
+    accepted, postings, outcome = [], [], {}
+    for key, payer_id, receiver, amount in pending:
+        if payer_id not in payers or available[payer_id] < amount:
+            outcome[key] = ledger.InsufficientFunds()
+            continue
+        available[payer_id] -= amount
+        accepted.append(key)
+        postings.append(('TRANSFER', amount, payers[payer_id], receiver))
+    txs = ledger.post_many(postings)
+    outcome.update(zip(accepted, txs))
+    outbox.enqueue_many(transfer_notification_emails(
+        [(tx.from_user, tx.to_user, tx.amount, tx) for tx in txs]
+    ))
+    realtime.publish_account_activity(txs)
+    return outcome
+
+
+class TransferEngine:
+    def __init__(self, max_batch=None, max_wait=None):
+        self.max_batch = max_batch or settings.TRANSFER_ENGINE_MAX_BATCH
+        self.max_wait = max_wait if max_wait is not None else settings.TRANSFER_ENGINE_MAX_WAIT_MS / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, payer_id, receiver, amount):
+        """Queue a transfer; the future resolves to its Transaction or raises InsufficientFunds."""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='transfer-engine', daemon=True)
+                    self._thread.start()
+        future = Future()
+        self._queue.put((future, payer_id, receiver, amount))
+        return future
+
+    def transfer(self, payer_id, receiver, amount, timeout=10):
+        return self.submit(payer_id, receiver, amount).result(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Long-lived thread: drop connections the server has timed out
+            close_old_connections()
+            self._apply(batch)
+
+    def _apply(self, batch):
+        pending = [(i, payer_id, receiver, amount) for i, (_, payer_id, receiver, amount) in enumerate(batch)]
+        try:
+            outcome = ledger.run_atomic_with_retry(lambda: apply_transfers(pending))
+        except Exception:
+            logger.exception('Transfer batch of %d failed; retrying items one by one', len(pending))
+            outcome = {}
+            for item in pending:
+                try:
+                    outcome.update(ledger.run_atomic_with_retry(lambda: apply_transfers([item])))
+                except Exception as exc:
+                    outcome[item[0]] = exc
+        for i, (future, _, _, _) in enumerate(batch):
+            result = outcome[i]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+engine = TransferEngine() if settings.TRANSFER_ENGINE else None
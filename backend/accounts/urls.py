@@ -2,9 +2,9 @@ from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     RegisterView, LoginView, PasswordResetRequestView,
-    VerifyOTPView, ChangePasswordView, TransferMoneyView, DepositMoneyView,
-    BalanceView, BlogListCreateView, UsersListView, TransactionsView, BlogCommentsView, MeView, ResolveAccountView,
-    LoanListCreateView, LoanApproveRejectView
+    VerifyOTPView, ChangePasswordView, TransferMoneyView, BatchTransferView, DepositMoneyView,
+    BalanceView, BlogListCreateView, UsersListView, UserSearchView, TransactionsView, TransactionExportView, StatementListView, StatementDetailView, AnalyticsView, BlogCommentsView, MeView, ResolveAccountView, BatchResolveAccountView,
+    LoanListCreateView, LoanApproveRejectView, LoanScheduleView, LoanPortfolioView, LoanBulkActionView
 )
 
 urlpatterns = [
@@ -15,14 +15,24 @@ urlpatterns = [
     path('password-reset/verify/', VerifyOTPView.as_view(), name='verify_otp'),
     path('password/change/', ChangePasswordView.as_view(), name='change_password'),
     path('transfer/', TransferMoneyView.as_view(), name='transfer-money'),
+    path('transfer/batch/', BatchTransferView.as_view(), name='transfer-batch'),
     path('deposit/', DepositMoneyView.as_view(), name='deposit-money'),
     path('balance/', BalanceView.as_view(), name='balance'),
     path('me/', MeView.as_view(), name='me'),
     path('blogs/', BlogListCreateView.as_view(), name='blogs'),
     path('blogs/<int:blog_id>/comments/', BlogCommentsView.as_view(), name='blog-comments'),
     path('users/', UsersListView.as_view(), name='users'),
+    path('users/search/', UserSearchView.as_view(), name='users-search'),
     path('transactions/', TransactionsView.as_view(), name='transactions'),
+    path('transactions/export.<str:fmt>', TransactionExportView.as_view(), name='transactions-export'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('statements/', StatementListView.as_view(), name='statements'),
+    path('statements/<int:year>/<int:month>/', StatementDetailView.as_view(), name='statement-detail'),
     path('resolve-account/', ResolveAccountView.as_view(), name='resolve-account'),
+    path('resolve-account/batch/', BatchResolveAccountView.as_view(), name='resolve-account-batch'),
     path('loans/', LoanListCreateView.as_view(), name='loans'),
+    path('loans/bulk-action/', LoanBulkActionView.as_view(), name='loan-bulk-action'),
+    path('loans/portfolio/', LoanPortfolioView.as_view(), name='loan-portfolio'),
+    path('loans/<int:loan_id>/schedule/', LoanScheduleView.as_view(), name='loan-schedule'),
     path('loans/<int:loan_id>/action/', LoanApproveRejectView.as_view(), name='loan-action'),
 ]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import random
 from rest_framework import status, generics
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -7,18 +7,26 @@ from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail, EmailMultiAlternatives
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from .serializers import (
     UserSerializer, LoginSerializer, PasswordResetRequestSerializer,
     OTPVerificationSerializer, ChangePasswordSerializer, DepositSerializer,
     BalanceSerializer, BlogSerializer, TransactionSerializer, NestedCommentSerializer, CommentCreateSerializer,
-    ProfileUpdateSerializer, LoanSerializer
+    ProfileUpdateSerializer, LoanSerializer, TransferSerializer
 )
 from .models import User, OTP, Blog, Transaction, Comment, Loan
+from . import amortization, analytics, comments, feed, ledger, notifications, outbox, payees, realtime, search, statements, transfers
+from .idempotency import idempotent
+from .pagination import (
+    apply_date_range, encode_cursor, keyset_after, keyset_before, merge_newest_first, parse_page_size,
+)
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from decimal import Decimal, InvalidOperation
-from django.db import models, transaction
-from django.db.models import F
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -26,48 +34,14 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
     def perform_create(self, serializer):
-        user = serializer.save()
-        try:
-            self._send_welcome_email(user)
-        except Exception:
-            pass
-
-    def _send_welcome_email(self, user: User):
-        subject = 'Welcome to K9TX Bank'
-        preheader = 'Thank you for creating your account with K9TX Bank.'
-        title = 'Welcome Aboard'
-        body_lines = [
-            f"Hi {user.username or user.email},",
-            'Your new digital banking experience starts now.',
-            'We focus on security, speed and a delightful interface to make money simple.',
-        ]
+        with transaction.atomic():
+            user = serializer.save()
+            self._queue_welcome_email(user)
+            realtime.publish_user_change(user)
+        search.index.upsert_user(user)
 
-        text_content = f"{title}\n\n" + "\n".join(body_lines)
-        html_lines = ''.join(f'<p style="margin:6px 0;color:#bcd3ff;">{line}</p>' for line in body_lines)
-        html_content = f"""
-        <html>
-          <body style="font-family: Arial, sans-serif; background-color: #0b1020; padding: 30px; color: #eaf2ff;">
-            <div style="max-width: 560px; margin: auto; background: #0f1a38; border-radius: 10px; box-shadow: 0 0 24px rgba(45,127,249,0.25); padding: 28px; border: 1px solid rgba(45,127,249,0.25);">
-              <span style="display:none;visibility:hidden;opacity:0;height:0;width:0">{preheader}</span>
-              <h2 style="color: #eaf2ff; text-align: center; margin-top: 0;">K9TX Bank</h2>
-              <div style="text-align:center;margin:14px 0 20px 0;">
-                <span style="display:inline-block;background:#2d7ff9;color:#fff;font-size:16px;letter-spacing:1px;padding:8px 16px;border-radius:6px;font-weight:800;box-shadow:0 0 12px rgba(45,127,249,0.45);">{title}</span>
-              </div>
-              {html_lines}
-              <hr style="border:none;border-top:1px solid rgba(255,255,255,0.12);margin: 20px 0;" />
-              <p style="font-size:12px;color:#9fb4ff;text-align:center;margin:0;">We're glad you're here. If you did not sign up, please ignore this email.</p>
-            </div>
-          </body>
-        </html>
-        """
-        email_message = EmailMultiAlternatives(
-            subject,
-            text_content,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-        )
-        email_message.attach_alternative(html_content, "text/html")
-        email_message.send(fail_silently=True)
+    def _queue_welcome_email(self, user: User):
+        outbox.enqueue(user.email, *notifications.render('welcome', {'name': user.username or user.email}))
 
 class LoginView(APIView):
     permission_classes = (AllowAny,)
@@ -101,45 +75,18 @@ class PasswordResetRequestView(APIView):
                 otp = ''.join([str(random.randint(0, 9)) for _ in range(6)])
                 expires_at = datetime.now() + timedelta(minutes=10)
                 
-                OTP.objects.create(
-                    user=user,
-                    otp=otp,
-                    expires_at=expires_at
-                )
-                
-                # Send OTP via email with HTML template
-                subject = 'K9TX Capital Management - Password Reset OTP'
-                text_content = f'Your OTP for password reset is: {otp}. Valid for 10 minutes.'
-                html_content = f"""
-                <html>
-                  <body style="font-family: Arial, sans-serif; background-color: #0b1020; padding: 30px; color: #eaf2ff;">
-                    <div style="max-width: 560px; margin: auto; background: #0f1a38; border-radius: 10px; box-shadow: 0 0 24px rgba(45,127,249,0.25); padding: 28px; border: 1px solid rgba(45,127,249,0.25);">
-                      <h2 style="color: #eaf2ff; text-align: center; margin-top: 0;">K9TX Capital Management</h2>
-                      <p>Dear {user.username or 'user'},</p>
-                      <p>You requested to reset your password. Please use the OTP below to proceed:</p>
-                      <div style="text-align: center; margin: 24px 0;">
-                        <span style="display: inline-block; background: #2d7ff9; color: #fff; font-size: 28px; letter-spacing: 8px; padding: 12px 24px; border-radius: 8px; font-weight: 800;">
-                          {otp}
-                        </span>
-                      </div>
-                      <p style="color: #9fb4ff;">This OTP is valid for 10 minutes.</p>
-                      <p>If you did not request this, please ignore this email.</p>
-                      <hr style="border: none; border-top: 1px solid rgba(255,255,255,0.12); margin: 24px 0;">
-                      <p style="font-size: 12px; color: #9fb4ff; text-align: center; margin: 0;">&copy; {datetime.now().year} K9TX Capital Management. All rights reserved.</p>
-                    </div>
-                  </body>
-                </html>
-                """
-
-                email_message = EmailMultiAlternatives(
-                    subject,
-                    text_content,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [email],
-                )
-                email_message.attach_alternative(html_content, "text/html")
-                email_message.send(fail_silently=False)
-                
+                with transaction.atomic():
+                    OTP.objects.create(
+                        user=user,
+                        otp=otp,
+                        expires_at=expires_at
+                    )
+                    outbox.enqueue(email, *notifications.render('otp', {
+                        'name': user.username or 'user',
+                        'otp': otp,
+                        'year': datetime.now().year,
+                    }))
+
                 return Response({'message': 'OTP sent successfully to your email'})
             except User.DoesNotExist:
                 return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -164,7 +111,7 @@ class VerifyOTPView(APIView):
                 ).latest('created_at')
                 
                 user.set_password(new_password)
-                user.save()
+                user.save(update_fields=['password', 'updated_at'])
                 otp.delete()
                 
                 return Response({'message': 'Password reset successful'})
@@ -181,7 +128,7 @@ class ChangePasswordView(APIView):
             user = request.user
             if user.check_password(serializer.validated_data['old_password']):
                 user.set_password(serializer.validated_data['new_password'])
-                user.save()
+                user.save(update_fields=['password', 'updated_at'])
                 return Response({'message': 'Password changed successfully'})
             return Response({'error': 'Invalid old password'}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -189,6 +136,7 @@ class ChangePasswordView(APIView):
 class TransferMoneyView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         from_user = request.user
         to_account_number = request.data.get('to_account_number')
@@ -197,153 +145,184 @@ class TransferMoneyView(APIView):
         if not to_account_number or amount is None:
             return Response({'error': 'Account number and amount required.'}, status=400)
 
-        try:
-            amount = Decimal(str(amount))
-            if amount <= 0:
-                raise InvalidOperation
-        except (InvalidOperation, ValueError):
-            return Response({'error': 'Invalid amount.'}, status=400)
+        serializer = DepositSerializer(data={'amount': amount})
+        if not serializer.is_valid():
+            return Response({'error': 'Invalid amount.', 'details': serializer.errors}, status=400)
+        amount = serializer.validated_data['amount']
 
-        try:
-            to_user = User.objects.get(account_number=to_account_number)
-        except User.DoesNotExist:
+        payee = payees.resolve(to_account_number)
+        if payee is None:
             return Response({'error': 'Recipient not found.'}, status=404)
+        to_user = payees.payee_as_user(payee)
 
         if to_user.id == from_user.id:
             return Response({'error': 'Cannot transfer to your own account.'}, status=400)
 
-        if from_user.balance < amount:
-            return Response({'error': 'Insufficient balance.'}, status=400)
-
         # Atomic transfer to avoid partial updates
-        with transaction.atomic():
-            # Lock rows for update to avoid race conditions
-            sender = User.objects.select_for_update().get(id=from_user.id)
-            receiver = User.objects.select_for_update().get(id=to_user.id)
+        try:
+            # Requests already inside a transaction (Idempotency-Key) must commit their transfer with it
+            if transfers.engine is not None and not transaction.get_connection().in_atomic_block:
+                transfers.engine.transfer(from_user.id, to_user, amount)
+            else:
+                def apply():
+                    # Only the payer is locked (or some of its shards); the credit is an append-only ledger insert
+                    sender = ledger.lock_payer(from_user)
+                    receiver = to_user
+                    tx = ledger.post('TRANSFER', amount, from_user=sender, to_user=receiver)
+                    realtime.publish_account_activity([tx])
+                    # Notification emails commit with the transfer and are sent by the outbox worker
+                    self._queue_transfer_email_notifications(sender, receiver, amount, tx)
+
+                ledger.run_atomic_with_retry(apply)
+        except ledger.ShardsBusy:
+            return Response({'error': 'Account is busy; please retry.'}, status=503)
+        except FutureTimeoutError:
+            return Response({'error': 'Transfer is still processing; check your transactions before retrying.'}, status=504)
+        except ledger.InsufficientFunds:
+            return Response({'error': 'Insufficient balance.'}, status=400)
+        except IntegrityError:
+            # Cached payee was deleted in another worker
+            payees.invalidate(to_account_number)
+            return Response({'error': 'Recipient not found.'}, status=404)
 
-            if sender.balance < amount:
-                return Response({'error': 'Insufficient balance.'}, status=400)
+        return Response({'success': f'Transferred {amount} to {to_user.username}.'})
 
-            User.objects.filter(id=sender.id).update(balance=F('balance') - amount)
-            User.objects.filter(id=receiver.id).update(balance=F('balance') + amount)
+    def _queue_transfer_email_notifications(self, sender: User, receiver: User, amount, tx: Transaction):
+        outbox.enqueue_many(transfers.transfer_notification_emails([(sender, receiver, amount, tx)]))
 
-            tx = Transaction.objects.create(type='TRANSFER', from_user=sender, to_user=receiver, amount=amount)
 
-        # Send notification emails (best-effort; do not block response on failure)
-        try:
-            self._send_transfer_email_notifications(sender, receiver, amount, tx)
-        except Exception:
-            # Silently ignore email failures in dev
-            pass
+class BatchTransferView(APIView):
+    permission_classes = [IsAuthenticated]
+    MAX_ITEMS = 500
 
-        return Response({'success': f'Transferred {amount} to {to_user.username}.'})
+    def post(self, request):
+        items = request.data.get('transfers')
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'transfers must be a non-empty list.'}, status=400)
+        if len(items) > self.MAX_ITEMS:
+            return Response({'error': f'At most {self.MAX_ITEMS} transfers per batch.'}, status=400)
+
+        results = [None] * len(items)
+        parsed = []
+        account_numbers = set()
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = {'index': index, 'status': 'error', 'error': 'Invalid transfer.'}
+                continue
+            serializer = TransferSerializer(data=item)
+            if not serializer.is_valid():
+                results[index] = {'index': index, 'status': 'error', 'error': 'Account number and a valid amount required.', 'details': serializer.errors}
+                continue
+            to_account = serializer.validated_data['to_account_number']
+            from_account = serializer.validated_data.get('from_account_number') or request.user.account_number
+            amount = serializer.validated_data['amount']
+            if from_account != request.user.account_number and not request.user.is_staff:
+                results[index] = {'index': index, 'status': 'error', 'error': 'Forbidden'}
+                continue
+            account_numbers.update((to_account, from_account))
+            parsed.append((index, from_account, to_account, amount))
+
+        # At most one lookup for every account referenced by the batch
+        accounts = payees.resolve_many(account_numbers)
+        pending = []
+        for index, from_account, to_account, amount in parsed:
+            sender, receiver = accounts.get(from_account), accounts.get(to_account)
+            if sender is None or receiver is None:
+                results[index] = {'index': index, 'status': 'error', 'error': 'Recipient not found.' if sender else 'Payer not found.'}
+            elif sender.id == receiver.id:
+                results[index] = {'index': index, 'status': 'error', 'error': 'Cannot transfer to your own account.'}
+            else:
+                pending.append((index, sender.id, payees.payee_as_user(receiver), amount))
 
-    def _send_transfer_email_notifications(self, sender: User, receiver: User, amount, tx: Transaction):
-        sent_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        def send_html_email(to_email: str, subject: str, preheader: str, title: str, body_lines: list[str]):
-            text_content = f"{title}\n" + "\n".join(body_lines)
-            html_lines = ''.join(f'<p style="margin:6px 0;color:#bcd3ff;">{line}</p>' for line in body_lines)
-            html_content = f"""
-            <html>
-              <body style="font-family: Arial, sans-serif; background-color: #0b1020; padding: 30px; color: #eaf2ff;">
-                <div style="max-width: 560px; margin: auto; background: #0f1a38; border-radius: 10px; box-shadow: 0 0 24px rgba(45,127,249,0.25); padding: 28px; border: 1px solid rgba(45,127,249,0.25);">
-                  <span style="display:none;visibility:hidden;opacity:0;height:0;width:0">{preheader}</span>
-                  <h2 style="color: #eaf2ff; text-align: center; margin-top: 0;">K9TX Bank</h2>
-                  <div style="text-align:center;margin:14px 0 20px 0;">
-                    <span style="display:inline-block;background:#2d7ff9;color:#fff;font-size:16px;letter-spacing:1px;padding:8px 16px;border-radius:6px;font-weight:800;box-shadow:0 0 12px rgba(45,127,249,0.45);">{title}</span>
-                  </div>
-                  {html_lines}
-                  <hr style="border:none;border-top:1px solid rgba(255,255,255,0.12);margin: 20px 0;" />
-                  <p style="font-size:12px;color:#9fb4ff;text-align:center;margin:0;">This is an automated message – please do not reply.</p>
-                </div>
-              </body>
-            </html>
-            """
-            email_message = EmailMultiAlternatives(
-                subject,
-                text_content,
-                settings.DEFAULT_FROM_EMAIL,
-                [to_email],
-            )
-            email_message.attach_alternative(html_content, "text/html")
-            email_message.send(fail_silently=True)
-
-        # Sender email
-        send_html_email(
-            to_email=sender.email,
-            subject="Transfer Money confirmation",
-            preheader=f"You sent ₹{amount} to {receiver.username}",
-            title="Money Sent",
-            body_lines=[
-                f"Amount: ₹{amount}",
-                f"To: {receiver.username} ({receiver.email})",
-                f"When: {sent_at}",
-                f"Transaction ID: {tx.id}",
-            ],
-        )
+        if pending:
+            try:
+                outcome = ledger.run_atomic_with_retry(lambda: transfers.apply_transfers(pending))
+            except IntegrityError:
+                # A cached payee was deleted in another worker: fail its items and post the rest
+                receiver_ids = {receiver.id for _, _, receiver, _ in pending}
+                live = set(User.objects.filter(id__in=receiver_ids).values_list('id', flat=True))
+                if live == receiver_ids:
+                    raise
+                for index, _, receiver, _ in pending:
+                    if receiver.id not in live:
+                        payees.invalidate(receiver.account_number)
+                        results[index] = {'index': index, 'status': 'error', 'error': 'Recipient not found.'}
+                pending = [item for item in pending if item[2].id in live]
+                outcome = ledger.run_atomic_with_retry(lambda: transfers.apply_transfers(pending)) if pending else {}
+            for index, result in outcome.items():
+                if isinstance(result, ledger.InsufficientFunds):
+                    results[index] = {'index': index, 'status': 'error', 'error': 'Insufficient balance.'}
+                else:
+                    results[index] = {'index': index, 'status': 'ok', 'transaction_id': result.id}
+
+        return Response({
+            'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+            'failed': sum(1 for r in results if r['status'] != 'ok'),
+            'results': results,
+        })
 
-        # Receiver email
-        send_html_email(
-            to_email=receiver.email,
-            subject="You received a Money",
-            preheader=f"You received ₹{amount} from {sender.username}",
-            title="Money Received",
-            body_lines=[
-                f"Amount: ₹{amount}",
-                f"From: {sender.username} ({sender.email})",
-                f"When: {sent_at}",
-                f"Transaction ID: {tx.id}",
-            ],
-        )
 
 class MeView(APIView):
     permission_classes = [IsAuthenticated]
 
+    # request.user may be rebuilt from the auth cache with only the auth fields loaded,
+    # so the profile is read in one query rather than one per deferred field
+
     def get(self, request):
-        serializer = UserSerializer(request.user, context={'request': request})
+        serializer = UserSerializer(User.objects.get(pk=request.user.pk), context={'request': request})
         return Response(serializer.data)
 
     def put(self, request):
-        serializer = ProfileUpdateSerializer(instance=request.user, data=request.data, partial=True)
+        user = User.objects.get(pk=request.user.pk)
+        serializer = ProfileUpdateSerializer(instance=user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            return Response(UserSerializer(request.user, context={'request': request}).data)
+            payees.invalidate(user.account_number)
+            realtime.publish_user_change(user)
+            search.index.upsert_user(user)
+            return Response(UserSerializer(user, context={'request': request}).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class DepositMoneyView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         serializer = DepositSerializer(data=request.data)
         if serializer.is_valid():
             amount = serializer.validated_data['amount']
             user = request.user
-            user.balance += amount
-            user.save()
-            Transaction.objects.create(type='DEPOSIT', to_user=user, amount=amount)
-            return Response({'success': f'Deposited {amount} successfully.', 'balance': str(user.balance)})
+            with transaction.atomic():
+                tx = ledger.post('DEPOSIT', amount, to_user=user)
+                realtime.publish_account_activity([tx])
+            return Response({'success': f'Deposited {amount} successfully.', 'balance': str(ledger.get_balance(user))})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class BalanceView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        return Response({'balance': str(request.user.balance)})
+        return Response({'balance': str(ledger.get_balance(request.user))})
 
 class BlogListCreateView(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
 
     def get(self, request):
-        blogs = Blog.objects.select_related('author').order_by('-created_at')
-        serializer = BlogSerializer(blogs, many=True, context={'request': request})
-        return Response(serializer.data)
+        params = request.query_params
+        try:
+            if params.get('since'):
+                return Response(feed.get_changes(request, params['since']))
+            return Response(feed.get_page(request, params.get('cursor'), parse_page_size(params.get('limit'))))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
 
     def post(self, request):
         serializer = BlogSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save(author=request.user)
+            feed.mark_changed()
+            realtime.publish(realtime.BLOG_FEED_GROUP, 'blog_created', serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -358,7 +337,11 @@ class BlogListCreateView(APIView):
             blog = Blog.objects.get(id=blog_id)
         except Blog.DoesNotExist:
             return Response({'error': 'Blog not found'}, status=404)
+        deleted_id = blog.id
         blog.delete()
+        comments.invalidate_comment_tree(deleted_id)
+        feed.record_deletion(deleted_id)
+        realtime.publish(realtime.BLOG_FEED_GROUP, 'blog_deleted', {'id': deleted_id})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -370,10 +353,19 @@ class BlogCommentsView(APIView):
             blog = Blog.objects.get(id=blog_id)
         except Blog.DoesNotExist:
             return Response({'error': 'Blog not found'}, status=status.HTTP_404_NOT_FOUND)
-        # top-level comments only, with nested replies
-        comments = Comment.objects.filter(blog=blog, parent__isnull=True).select_related('author').order_by('created_at')
-        data = NestedCommentSerializer(comments, many=True, context={'request': request}).data
-        return Response(data)
+        # top-level threads with nested replies, paginated over threads
+        tree = comments.get_comment_tree(blog.id)
+        limit = parse_page_size(request.query_params.get('limit'))
+        try:
+            offset = max(0, int(request.query_params.get('offset') or 0))
+        except ValueError:
+            return Response({'error': 'offset must be an integer'}, status=400)
+        end = offset + limit
+        return Response({
+            'results': comments.attach_authors(tree[offset:end], request),
+            'count': len(tree),
+            'next_offset': end if end < len(tree) else None,
+        })
 
     def post(self, request, blog_id):
         try:
@@ -387,24 +379,145 @@ class BlogCommentsView(APIView):
             if parent and parent.blog_id != blog.id:
                 return Response({'error': 'Parent comment does not belong to this blog'}, status=400)
             comment = serializer.save(author=request.user)
+            comments.invalidate_comment_tree(blog.id)
             # Return full nested representation for the created comment (top-level or reply)
-            return Response(NestedCommentSerializer(comment, context={'request': request}).data, status=status.HTTP_201_CREATED)
+            data = NestedCommentSerializer(comment, context={'request': request}).data
+            realtime.publish(realtime.BLOG_FEED_GROUP, 'comment_created', {'blog_id': blog.id, 'comment': data})
+            return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class UsersListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        others = User.objects.exclude(id=request.user.id).values('username', 'email', 'account_number')
-        return Response(list(others))
+        limit = parse_page_size(request.query_params.get('limit'), maximum=500)
+        try:
+            after = int(request.query_params.get('cursor') or 0)
+        except ValueError:
+            return Response({'error': 'Invalid cursor.'}, status=400)
+        # Keyset over the primary key: each page is one bounded index range scan
+        others = list(
+            User.objects.exclude(id=request.user.id).filter(id__gt=after).order_by('id')
+            .values('id', 'username', 'email', 'account_number')[:limit + 1]
+        )
+        next_cursor = str(others[limit - 1]['id']) if len(others) > limit else None
+        return Response({'results': others[:limit], 'next_cursor': next_cursor})
+
+class UserSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        q = (request.query_params.get('q') or '').strip()
+        if not q:
+            return Response({'results': []})
+        limit = parse_page_size(request.query_params.get('limit'), maximum=50)
+        search.index.ensure_fresh()
+        fields = ('id', 'username', 'email', 'account_number')
+        if not search.index.ready:
+            # First build still running in the background: indexed prefix lookups only
+            matches = User.objects.exclude(id=request.user.id).filter(
+                Q(username__istartswith=q) | Q(email__istartswith=q) | Q(account_number__startswith=q)
+            )
+            return Response({'results': list(matches.order_by('username').values(*fields)[:limit])})
+        ids = search.index.search(q, limit=limit, exclude_id=request.user.id)
+        # Re-read matches so deleted or just-edited users are never served stale
+        rows = {row['id']: row for row in User.objects.filter(id__in=ids).values(*fields)}
+        return Response({'results': [rows[i] for i in ids if i in rows]})
+
+def filter_transactions(qs, params):
+    """Apply the ``type`` (comma-separated) and ``date_from``/``date_to`` filters; raises ValueError."""
+    types = [t.strip().upper() for t in (params.get('type') or '').split(',') if t.strip()]
+    if types:
+        valid = {choice for choice, _ in Transaction.TYPE_CHOICES}
+        if not set(types) <= valid:
+            raise ValueError(f"type must be one of {', '.join(sorted(valid))}")
+        qs = qs.filter(type__in=types)
+    return apply_date_range(qs, params)
+
 
 class TransactionsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        qs = Transaction.objects.filter(models.Q(from_user=request.user) | models.Q(to_user=request.user)).order_by('-created_at')
-        data = TransactionSerializer(qs, many=True).data
-        return Response(data)
+        params = request.query_params
+        limit = parse_page_size(params.get('limit'))
+        try:
+            base = filter_transactions(
+                Transaction.objects.select_related('from_user', 'to_user').order_by('-created_at', '-id'), params,
+            )
+            if params.get('cursor'):
+                base = base.filter(keyset_before(params['cursor']))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
+
+        # Query each side of the from/to OR separately so both use their (user, created_at) index
+        rows, next_cursor = merge_newest_first(
+            [base.filter(from_user=request.user), base.filter(to_user=request.user)],
+            limit,
+        )
+        return Response({
+            'results': TransactionSerializer(rows, many=True).data,
+            'next_cursor': next_cursor,
+        })
+
+
+class TransactionExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # Downloads may send Accept: text/csv; error bodies still render as JSON
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, fmt):
+        if fmt not in statements.RENDERERS:
+            return Response({'error': 'Export format must be csv or ndjson.'}, status=404)
+        try:
+            base = filter_transactions(Transaction.objects.all(), request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
+        content = statements.RENDERERS[fmt](statements.iter_history(request.user, base))
+        if isinstance(request._request, ASGIRequest):
+            content = statements.stream_async(content)
+        response = StreamingHttpResponse(content, content_type=statements.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="transactions-{request.user.account_number}.{fmt}"'
+        return response
+
+
+class AnalyticsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            return Response(analytics.get_analytics(request.user, request.query_params))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
+
+
+class StatementListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({'results': statements.list_statements(request.user)})
+
+
+class StatementDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, year, month):
+        if not 1 <= month <= 12 or not 1900 <= year <= 9999:
+            return Response({'error': 'Invalid statement period.'}, status=404)
+        period = date(year, month, 1)
+        params = request.query_params
+        try:
+            after = keyset_after(params['cursor']) if params.get('cursor') else None
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
+        entries, last = statements.entries_page(request.user, period, after, parse_page_size(params.get('limit')))
+        return Response({
+            'statement': statements.get_statement(request.user, period),
+            'entries': entries,
+            'next_cursor': encode_cursor(last['created_at'], last['id']) if last else None,
+        })
 
 
 class ResolveAccountView(APIView):
@@ -414,28 +527,71 @@ class ResolveAccountView(APIView):
         account_number = request.query_params.get('account_number')
         if not account_number:
             return Response({'error': 'account_number is required'}, status=400)
-        try:
-            user = User.objects.get(account_number=account_number)
-            return Response({
-                'account_number': user.account_number,
-                'username': user.username,
-                'email': user.email,
-            })
-        except User.DoesNotExist:
+        payee = payees.resolve(account_number)
+        if payee is None:
             return Response({'error': 'Account not found'}, status=404)
+        return Response({
+            'account_number': payee.account_number,
+            'username': payee.username,
+            'email': payee.email,
+        })
+
+
+class BatchResolveAccountView(APIView):
+    permission_classes = [IsAuthenticated]
+    MAX_ITEMS = 500
+
+    def post(self, request):
+        account_numbers = request.data.get('account_numbers')
+        if not isinstance(account_numbers, list) or not account_numbers:
+            return Response({'error': 'account_numbers must be a non-empty list'}, status=400)
+        if len(account_numbers) > self.MAX_ITEMS:
+            return Response({'error': f'At most {self.MAX_ITEMS} account numbers per request'}, status=400)
+        found = payees.resolve_many(str(n) for n in account_numbers)
+        return Response({
+            'results': {
+                number: {'account_number': p.account_number, 'username': p.username, 'email': p.email}
+                for number, p in found.items()
+            },
+            'not_found': sorted({str(n) for n in account_numbers} - set(found)),
+        })
 
 
 class LoanListCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Admin sees all, user sees own
-        if request.user.is_staff:
-            loans = Loan.objects.select_related('applicant', 'approved_by').order_by('-created_at')
-        else:
-            loans = Loan.objects.filter(applicant=request.user).select_related('applicant', 'approved_by').order_by('-created_at')
-        return Response(LoanSerializer(loans, many=True).data)
-
+        # Admin sees all, user sees own; newest first, keyset-paginated
+        params = request.query_params
+        loans = Loan.objects.select_related('applicant', 'approved_by').order_by('-created_at', '-id')
+        if not request.user.is_staff:
+            loans = loans.filter(applicant=request.user)
+
+        statuses = [s.strip().upper() for s in (params.get('status') or '').split(',') if s.strip()]
+        if statuses:
+            valid = {choice for choice, _ in Loan.STATUS_CHOICES}
+            if not set(statuses) <= valid:
+                return Response({'error': f"status must be one of {', '.join(sorted(valid))}"}, status=400)
+            loans = loans.filter(status__in=statuses)
+        try:
+            for param, lookup in (('min_amount', 'amount__gte'), ('max_amount', 'amount__lte')):
+                if params.get(param):
+                    try:
+                        loans = loans.filter(**{lookup: Decimal(params[param])})
+                    except InvalidOperation:
+                        raise ValueError(f'{param} must be a number.')
+            loans = apply_date_range(loans, params)
+            if params.get('cursor'):
+                loans = loans.filter(keyset_before(params['cursor']))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
+
+        limit = parse_page_size(params.get('limit'))
+        rows = list(loans[:limit + 1])
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+        return Response({'results': LoanSerializer(rows[:limit], many=True).data, 'next_cursor': next_cursor})
+
+    @idempotent
     def post(self, request):
         # Create loan application for current user
         serializer = LoanSerializer(data=request.data)
@@ -445,6 +601,110 @@ class LoanListCreateView(APIView):
         return Response(serializer.errors, status=400)
 
 
+def loan_decision_emails(loans):
+    return [
+        (loan.applicant.email, *message)
+        for loan, message in zip(loans, notifications.render_many('loan_decision', [
+            {
+                'name': loan.applicant.username or loan.applicant.email,
+                'loan_id': loan.id,
+                'amount': loan.amount,
+                'term_months': loan.term_months,
+                'decision': loan.status.lower(),
+                'when': loan.approved_at.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for loan in loans
+        ]))
+    ]
+
+
+class LoanBulkActionView(APIView):
+    permission_classes = [IsAuthenticated]
+    MAX_ITEMS = 500
+
+    def post(self, request):
+        if not request.user.is_staff:
+            return Response({'error': 'Forbidden'}, status=403)
+        action = request.data.get('action')
+        if action not in ('approve', 'reject'):
+            return Response({'error': 'action must be approve or reject'}, status=400)
+        loan_ids = request.data.get('loan_ids')
+        if not isinstance(loan_ids, list) or not loan_ids:
+            return Response({'error': 'loan_ids must be a non-empty list.'}, status=400)
+        if len(loan_ids) > self.MAX_ITEMS:
+            return Response({'error': f'At most {self.MAX_ITEMS} loans per request.'}, status=400)
+        try:
+            loan_ids = list(dict.fromkeys(int(i) for i in loan_ids))
+        except (TypeError, ValueError):
+            return Response({'error': 'loan_ids must be integers.'}, status=400)
+
+        def apply():
+            # Loans locked in id order with one query; credits are ledger inserts and need no applicant locks
+            loans = list(
+                Loan.objects.select_for_update(of=('self',)).select_related('applicant')
+                .filter(id__in=loan_ids).order_by('id')
+            )
+            decided_at = timezone.now()
+            outcome = {}
+            decided = []
+            for loan in loans:
+                if loan.status != 'PENDING':
+                    outcome[loan.id] = {'loan_id': loan.id, 'status': 'error', 'error': 'Loan already processed'}
+                    continue
+                loan.status = 'APPROVED' if action == 'approve' else 'REJECTED'
+                loan.approved_at = decided_at
+                loan.approved_by = request.user
+                decided.append(loan)
+            Loan.objects.bulk_update(decided, ['status', 'approved_at', 'approved_by'])
+            txs = []
+            if action == 'approve':
+                txs = ledger.post_many([('LOAN', loan.amount, None, loan.applicant) for loan in decided])
+                realtime.publish_account_activity(txs)
+            for loan, tx in zip(decided, txs or [None] * len(decided)):
+                outcome[loan.id] = {'loan_id': loan.id, 'status': 'ok', 'loan_status': loan.status}
+                if tx is not None:
+                    outcome[loan.id]['transaction_id'] = tx.id
+            outbox.enqueue_many(loan_decision_emails(decided))
+            return outcome
+
+        outcome = ledger.run_atomic_with_retry(apply)
+        results = [
+            outcome.get(loan_id) or {'loan_id': loan_id, 'status': 'error', 'error': 'Loan not found'}
+            for loan_id in loan_ids
+        ]
+        return Response({
+            'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+            'failed': sum(1 for r in results if r['status'] != 'ok'),
+            'results': results,
+        })
+
+
+class LoanScheduleView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, loan_id):
+        loans = Loan.objects.all() if request.user.is_staff else Loan.objects.filter(applicant=request.user)
+        try:
+            loan = loans.get(id=loan_id)
+        except Loan.DoesNotExist:
+            return Response({'error': 'Loan not found'}, status=404)
+        return Response(amortization.loan_schedule(loan))
+
+
+class LoanPortfolioView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response({'error': 'Forbidden'}, status=403)
+        rows = (
+            Loan.objects.filter(status='APPROVED', approved_at__isnull=False, term_months__gt=0)
+            .values_list('amount', 'interest_rate', 'term_months', 'approved_at')
+            .iterator(chunk_size=amortization.CHUNK_LOANS)
+        )
+        return Response(amortization.portfolio(rows, timezone.localdate()))
+
+
 class LoanApproveRejectView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -470,13 +730,14 @@ class LoanApproveRejectView(APIView):
                 loan.approved_by = request.user
                 loan.save()
                 # Credit amount to applicant balance and record transaction
-                applicant = User.objects.select_for_update().get(id=loan.applicant_id)
-                User.objects.filter(id=applicant.id).update(balance=F('balance') + loan.amount)
-                Transaction.objects.create(type='LOAN', to_user=applicant, amount=loan.amount)
+                tx = ledger.post('LOAN', loan.amount, to_user=loan.applicant)
+                realtime.publish_account_activity([tx])
             else:
                 loan.status = 'REJECTED'
                 loan.approved_at = datetime.now()
                 loan.approved_by = request.user
                 loan.save()
 
+            outbox.enqueue_many(loan_decision_emails([loan]))
+
         return Response(LoanSerializer(loan).data)
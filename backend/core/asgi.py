@@ -22,3 +22,8 @@ application = ProtocolTypeRouter({
         URLRouter(accounts.routing.websocket_urlpatterns)
     ),
 })
+
+# Build the users search index in the background before the first search needs it
+from accounts import search
+
+search.index.ensure_fresh()
@@ -121,7 +121,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -180,12 +180,31 @@ SITE_ID = 1
 
 ASGI_APPLICATION = 'core.asgi.application'
 
+# Group-commit transfers: batch single transfers from each worker into shared DB transactions
+TRANSFER_ENGINE = config('TRANSFER_ENGINE', cast=bool, default=False)
+TRANSFER_ENGINE_MAX_BATCH = int(config('TRANSFER_ENGINE_MAX_BATCH', default=200))
+TRANSFER_ENGINE_MAX_WAIT_MS = float(config('TRANSFER_ENGINE_MAX_WAIT_MS', default=5))
+
+# Benchmarks that create and delete throwaway users refuse to run unless this is set
+BENCH_WRITES_ALLOWED = config('BENCH_WRITES_ALLOWED', cast=bool, default=False)
+
+REDIS_HOST = config('REDIS_HOST', default='127.0.0.1')
+REDIS_PORT = int(config('REDIS_PORT', default=6379))
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [(config('REDIS_HOST', default='127.0.0.1'), int(config('REDIS_PORT', default=6379)))],
+            'hosts': [(REDIS_HOST, REDIS_PORT)],
         },
     },
 }
 
+# Shared cache so feed/comment invalidations are seen by every worker process
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('CACHE_LOCATION', default=f'redis://{REDIS_HOST}:{REDIS_PORT}/1'),
+    },
+}
+
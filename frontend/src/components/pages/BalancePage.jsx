@@ -32,8 +32,29 @@ export default function BalancePage() {
       setAccountNumber(user.account_number || '');
     }
     load();
-    const id = setInterval(load, 10000);
-    return () => clearInterval(id);
+    // Live updates replace polling; reload once after every (re)connect to catch up
+    let socket;
+    let retryId;
+    let closed = false;
+    const connect = () => {
+      socket = authService.openSocket('account', ({ event, data }) => {
+        if (event !== 'balance_changed') return;
+        setBalance(data.balance);
+        setUpdatedAt(new Date());
+        const current = authService.getCurrentUser();
+        if (current) localStorage.setItem('user', JSON.stringify({ ...current, balance: data.balance }));
+      });
+      socket.onopen = () => load();
+      socket.onclose = () => {
+        if (!closed) retryId = setTimeout(connect, 5000);
+      };
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryId);
+      if (socket) socket.close();
+    };
   }, []);
 
   return (
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Paper, Typography, Box, TextField, Button, Divider, Avatar, IconButton, Tooltip } from '@mui/material';
 import DeleteIcon from '@mui/icons-material/Delete';
 import authService from '../../services/auth';
@@ -9,51 +9,148 @@ export default function BlogsPage() {
   const { user } = useAuth();
   const [form, setForm] = useState({ title: '', content: '', imageFile: null });
   const [commentsByBlog, setCommentsByBlog] = useState({});
+  const [nextOffsetByBlog, setNextOffsetByBlog] = useState({});
   const [commentInputByBlog, setCommentInputByBlog] = useState({});
   const [replyInputByComment, setReplyInputByComment] = useState({});
 
+  const [nextCursor, setNextCursor] = useState(null);
+  const syncRef = useRef(null);
+
   const load = async () => {
     try {
       const data = await authService.getBlogs();
-      setBlogs(Array.isArray(data) ? data : []);
-    } catch { setBlogs([]); }
+      setBlogs(Array.isArray(data?.results) ? data.results : []);
+      setNextCursor(data?.next_cursor || null);
+      syncRef.current = data?.sync || null;
+    } catch { setBlogs([]); setNextCursor(null); }
+  };
+
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const data = await authService.getBlogs({ cursor: nextCursor });
+      setBlogs((prev) => [...prev, ...(data.results || [])]);
+      setNextCursor(data.next_cursor || null);
+    } catch {}
+  };
+
+  // Fetch only what changed since the last sync token
+  const refresh = async () => {
+    if (!syncRef.current) return load();
+    try {
+      const data = await authService.getBlogs({ since: syncRef.current });
+      if (data.reset) return load();
+      syncRef.current = data.sync;
+      const created = data.results || [];
+      const deleted = new Set(data.deleted || []);
+      if (!created.length && !deleted.size) return;
+      setBlogs((prev) => {
+        const known = new Set(created.map((b) => b.id));
+        return [...created, ...prev.filter((b) => !known.has(b.id) && !deleted.has(b.id))];
+      });
+    } catch {}
   };
 
   useEffect(() => { load(); }, []);
 
-  // Auto-refresh blogs every 5 seconds
+  const applyEvent = ({ event, data }) => {
+    if (event === 'blog_created') {
+      setBlogs((prev) => (prev.some((b) => b.id === data.id) ? prev : [data, ...prev]));
+    } else if (event === 'blog_deleted') {
+      setBlogs((prev) => prev.filter((b) => b.id !== data.id));
+    } else if (event === 'comment_created') {
+      const { blog_id: blogId, comment } = data;
+      setCommentsByBlog((prev) => {
+        const existing = prev[blogId] || [];
+        if (!comment.parent) {
+          if (existing.some((c) => c.id === comment.id)) return prev;
+          return { ...prev, [blogId]: [...existing, comment] };
+        }
+        const updated = existing.map((c) => {
+          if (c.id !== comment.parent) return c;
+          const replies = Array.isArray(c.replies) ? c.replies : [];
+          return replies.some((r) => r.id === comment.id) ? c : { ...c, replies: [...replies, comment] };
+        });
+        return { ...prev, [blogId]: updated };
+      });
+    }
+  };
+
+  // Live updates over WebSocket; while disconnected, catch up with "since" fetches and retry
   useEffect(() => {
-    const intervalId = setInterval(() => {
-      load();
-    }, 5000);
-    return () => clearInterval(intervalId);
+    let socket;
+    let retryId;
+    let closed = false;
+    const connect = () => {
+      socket = authService.openSocket('blogs', applyEvent);
+      socket.onopen = () => refresh();
+      socket.onclose = () => {
+        if (closed) return;
+        refresh();
+        retryId = setTimeout(connect, 5000);
+      };
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryId);
+      if (socket) socket.close();
+    };
   }, []);
 
+  // Blog ids whose first comment page has been requested; each is fetched once
+  const commentsRequestedRef = useRef(new Set());
+
   useEffect(() => {
-    // Load comments for all blogs when list updates
-    const fetchAll = async () => {
+    // Load the first comment page only for blogs that just appeared; live events keep the rest current
+    const fresh = blogs.filter((b) => !commentsRequestedRef.current.has(b.id));
+    if (!fresh.length) return;
+    fresh.forEach((b) => commentsRequestedRef.current.add(b.id));
+    const fetchFresh = async () => {
       const entries = await Promise.all(
-        blogs.map(async (b) => {
+        fresh.map(async (b) => {
           try {
-            const comments = await authService.getComments(b.id);
-            return [b.id, comments];
+            const page = await authService.getComments(b.id);
+            return [b.id, page];
           } catch {
-            return [b.id, []];
+            return [b.id, { results: [], next_offset: null }];
           }
         })
       );
-      const map = Object.fromEntries(entries);
-      setCommentsByBlog(map);
+      // Merge, keeping comments that arrived over the socket while the page was loading
+      setCommentsByBlog((prev) => {
+        const next = { ...prev };
+        entries.forEach(([id, page]) => {
+          const loaded = page.results || [];
+          const known = new Set(loaded.map((c) => c.id));
+          next[id] = [...loaded, ...(prev[id] || []).filter((c) => !known.has(c.id))];
+        });
+        return next;
+      });
+      setNextOffsetByBlog((prev) => ({
+        ...prev,
+        ...Object.fromEntries(entries.map(([id, page]) => [id, page.next_offset ?? null])),
+      }));
     };
-    if (blogs.length) fetchAll();
+    fetchFresh();
   }, [blogs]);
 
+  const loadMoreComments = async (blogId) => {
+    const offset = nextOffsetByBlog[blogId];
+    if (offset == null) return;
+    try {
+      const page = await authService.getComments(blogId, { offset });
+      setCommentsByBlog((prev) => ({ ...prev, [blogId]: [...(prev[blogId] || []), ...(page.results || [])] }));
+      setNextOffsetByBlog((prev) => ({ ...prev, [blogId]: page.next_offset ?? null }));
+    } catch {}
+  };
+
   const onSubmit = async (e) => {
     e.preventDefault();
     try {
       await authService.createBlog(form);
       setForm({ title: '', content: '', imageFile: null });
-      load();
+      refresh();
     } catch {}
   };
 
@@ -62,10 +159,8 @@ export default function BlogsPage() {
     if (!content) return;
     try {
       const created = await authService.addComment({ blogId, content });
-      setCommentsByBlog((prev) => ({
-        ...prev,
-        [blogId]: [...(prev[blogId] || []), created],
-      }));
+      // Same path as the live event, so whichever arrives second is ignored
+      applyEvent({ event: 'comment_created', data: { blog_id: blogId, comment: created } });
       setCommentInputByBlog((prev) => ({ ...prev, [blogId]: '' }));
     } catch {}
   };
@@ -76,16 +171,7 @@ export default function BlogsPage() {
     try {
       const created = await authService.addComment({ blogId, content, parent: parentId });
       // Append reply under parent in-place
-      setCommentsByBlog((prev) => {
-        const updated = (prev[blogId] || []).map((c) => {
-          if (c.id === parentId) {
-            const replies = Array.isArray(c.replies) ? c.replies : [];
-            return { ...c, replies: [...replies, created] };
-          }
-          return c;
-        });
-        return { ...prev, [blogId]: updated };
-      });
+      applyEvent({ event: 'comment_created', data: { blog_id: blogId, comment: created } });
       setReplyInputByComment((prev) => ({ ...prev, [parentId]: '' }));
     } catch {}
   };
@@ -187,11 +273,19 @@ export default function BlogsPage() {
               )}
               <Box sx={{ mt: 1.5 }}>
                 {renderComments(b.id, commentsByBlog[b.id] || [])}
+                {nextOffsetByBlog[b.id] != null && (
+                  <Button size="small" onClick={() => loadMoreComments(b.id)}>Load more comments</Button>
+                )}
               </Box>
             </Box>
             {idx < blogs.length - 1 && <Divider sx={{ borderColor: 'rgba(255,255,255,0.06)', mb: 2 }} />}
           </Box>
         ))}
+        {nextCursor && (
+          <Box sx={{ textAlign: 'center', pt: 1 }}>
+            <Button variant="outlined" onClick={loadMore}>Load more</Button>
+          </Box>
+        )}
       </Box>
     </Paper>
   );
@@ -1,21 +1,29 @@
 import React, { useEffect, useMemo, useState } from 'react';
-import { Paper, Typography, Box, TextField, Button, Divider, Chip } from '@mui/material';
+import { Paper, Typography, Box, TextField, Button, Divider, Chip, Checkbox } from '@mui/material';
 import authService from '../../services/auth';
 
 export default function LoansPage() {
   const [loans, setLoans] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [statusFilter, setStatusFilter] = useState('');
+  const [selected, setSelected] = useState([]);
   const [form, setForm] = useState({ amount: '', term_months: '', purpose: '', interest_rate: '10.00' });
   const me = authService.getCurrentUser();
   const isAdmin = !!me?.is_staff;
 
-  const load = async () => {
+  const load = async (cursor = null) => {
     try {
-      const data = await authService.getLoans();
-      setLoans(Array.isArray(data) ? data : []);
-    } catch { setLoans([]); }
+      const params = statusFilter ? { status: statusFilter } : {};
+      if (cursor) params.cursor = cursor;
+      const data = await authService.getLoans(params);
+      const results = Array.isArray(data?.results) ? data.results : [];
+      setLoans((prev) => (cursor ? [...prev, ...results] : results));
+      setNextCursor(data?.next_cursor || null);
+      if (!cursor) setSelected([]);
+    } catch { if (!cursor) setLoans([]); }
   };
 
-  useEffect(() => { load(); }, []);
+  useEffect(() => { load(); }, [statusFilter]);
 
   const submit = async (e) => {
     e.preventDefault();
@@ -37,6 +45,18 @@ export default function LoansPage() {
     } catch {}
   };
 
+  const toggle = (loanId) => {
+    setSelected((prev) => (prev.includes(loanId) ? prev.filter((id) => id !== loanId) : [...prev, loanId]));
+  };
+
+  const actSelected = async (action) => {
+    if (selected.length === 0) return;
+    try {
+      await authService.bulkActOnLoans(selected, action);
+      load();
+    } catch {}
+  };
+
   const statusColor = (s) => {
     if (s === 'APPROVED') return 'success';
     if (s === 'REJECTED') return 'error';
@@ -83,6 +103,27 @@ export default function LoansPage() {
         </Box>
       )}
 
+      {isAdmin && (
+        <Box sx={{ display: 'flex', flexWrap: 'wrap', alignItems: 'center', gap: 1, mb: 2 }}>
+          {['', 'PENDING', 'APPROVED', 'REJECTED'].map((s) => (
+            <Chip
+              key={s || 'ALL'}
+              label={s || 'ALL'}
+              color={statusFilter === s ? 'primary' : 'default'}
+              onClick={() => setStatusFilter(s)}
+              size="small"
+            />
+          ))}
+          <Box sx={{ flexGrow: 1 }} />
+          <Button size="small" variant="contained" color="success" disabled={selected.length === 0} onClick={() => actSelected('approve')}>
+            Approve selected ({selected.length})
+          </Button>
+          <Button size="small" variant="contained" color="error" disabled={selected.length === 0} onClick={() => actSelected('reject')}>
+            Reject selected
+          </Button>
+        </Box>
+      )}
+
       <Box>
         {loans.length === 0 ? (
           <Typography sx={{ color: '#bcd3ff' }}>No loan applications.</Typography>
@@ -94,6 +135,9 @@ export default function LoansPage() {
                   ₹{l.amount} for {l.term_months} months @ {l.interest_rate}% {isAdmin && `(by ${l.applicant_username || l.applicant})`}
                 </Typography>
                 <Box sx={{ display: 'flex', alignItems: 'center', gap: 1, mt: 0.5 }}>
+                  {l.status === 'PENDING' && isAdmin && (
+                    <Checkbox size="small" checked={selected.includes(l.id)} onChange={() => toggle(l.id)} sx={{ p: 0.5 }} />
+                  )}
                   <Chip label={l.status} color={statusColor(l.status)} size="small" />
                   {l.status === 'PENDING' && isAdmin && (
                     <Box sx={{ display: 'flex', gap: 1 }}>
@@ -110,6 +154,11 @@ export default function LoansPage() {
             </Box>
           ))
         )}
+        {nextCursor && (
+          <Box sx={{ textAlign: 'center', mt: 2 }}>
+            <Button variant="outlined" onClick={() => load(nextCursor)}>Load more</Button>
+          </Box>
+        )}
       </Box>
     </Paper>
   );
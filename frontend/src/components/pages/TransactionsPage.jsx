@@ -1,20 +1,38 @@
 import React, { useEffect, useState } from 'react';
-import { Paper, Typography, Box, Divider } from '@mui/material';
+import { Paper, Typography, Box, Divider, Button } from '@mui/material';
 import authService from '../../services/auth';
 
 export default function TransactionsPage() {
   const [items, setItems] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const me = authService.getCurrentUser();
   const myId = me?.id;
 
   const load = async () => {
     try {
       const data = await authService.getTransactions();
-      setItems(Array.isArray(data) ? data : []);
-    } catch { setItems([]); }
+      setItems(Array.isArray(data?.results) ? data.results : []);
+      setNextCursor(data?.next_cursor || null);
+    } catch { setItems([]); setNextCursor(null); }
   };
 
-  useEffect(() => { load(); }, []);
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const data = await authService.getTransactions({ cursor: nextCursor });
+      setItems((prev) => [...prev, ...(Array.isArray(data?.results) ? data.results : [])]);
+      setNextCursor(data?.next_cursor || null);
+    } catch {}
+  };
+
+  useEffect(() => {
+    load();
+    const socket = authService.openSocket('account', ({ event, data }) => {
+      if (event !== 'transaction_created') return;
+      setItems((prev) => (prev.some((t) => t.id === data.id) ? prev : [data, ...prev]));
+    });
+    return () => socket.close();
+  }, []);
 
   const renderLine = (t) => {
     if (t.type === 'TRANSFER') {
@@ -30,13 +48,22 @@ export default function TransactionsPage() {
     if (t.type === 'LOAN') {
       return 'Loan credited';
     }
+    if (t.type === 'REPAYMENT') {
+      return 'Loan EMI paid';
+    }
     return t.type;
   };
 
   return (
     <Paper sx={{ p: { xs: 2, sm: 4 }, borderRadius: 4, background: 'rgba(12,18,40,0.6)', border: '1px solid rgba(45,127,249,0.25)', boxShadow: '0 0 24px rgba(45,127,249,0.2)', maxWidth: 900, mx: 'auto' }}>
       <Typography variant="h4" sx={{ color: '#eaf2ff', fontWeight: 800, mb: 1 }}>Transactions</Typography>
-      <Typography sx={{ color: '#9fb4ff', mb: 3 }}>Your recent activity</Typography>
+      <Box sx={{ display: 'flex', alignItems: 'center', justifyContent: 'space-between', mb: 3 }}>
+        <Typography sx={{ color: '#9fb4ff' }}>Your recent activity</Typography>
+        <Box sx={{ display: 'flex', gap: 1 }}>
+          <Button size="small" variant="outlined" onClick={() => authService.exportTransactions('csv')}>Export CSV</Button>
+          <Button size="small" variant="outlined" onClick={() => authService.exportTransactions('ndjson')}>Export NDJSON</Button>
+        </Box>
+      </Box>
       <Box className="no-scroll" sx={{ maxHeight: '60vh', overflow: 'auto' }}>
         {items.length === 0 ? (
           <Typography sx={{ color: '#bcd3ff' }}>No transactions.</Typography>
@@ -53,6 +80,11 @@ export default function TransactionsPage() {
             </Box>
           ))
         )}
+        {nextCursor && (
+          <Box sx={{ textAlign: 'center', pt: 2 }}>
+            <Button variant="outlined" onClick={loadMore}>Load more</Button>
+          </Box>
+        )}
       </Box>
     </Paper>
   );
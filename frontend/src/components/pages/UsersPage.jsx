@@ -25,27 +25,51 @@ const UsersPage = () => {
   const [query, setQuery] = useState("");
 
   useEffect(() => {
-    const fetchUsers = async () => {
-      try {
-        const data = await authService.getUsers();
-        setUsers(Array.isArray(data) ? data : []);
-      } catch (error) {
-        setUsers([]);
-      } finally {
-        setLoading(false);
+    // Directory arrives in pages, then as add/update/remove diffs
+    let received = [];
+    const socket = authService.openSocket("users", ({ event, data }) => {
+      if (event === "users_page") {
+        received = received.concat(data.users || []);
+        if (data.done) {
+          setUsers(received);
+          setLoading(false);
+        }
+      } else if (event === "user_upsert") {
+        setUsers((prev) => {
+          const idx = prev.findIndex((u) => u.id === data.id);
+          if (idx === -1) return [...prev, data];
+          const next = prev.slice();
+          next[idx] = data;
+          return next;
+        });
+      } else if (event === "user_removed") {
+        setUsers((prev) => prev.filter((u) => u.id !== data.id));
       }
-    };
-
-    fetchUsers();
+    });
+    socket.onerror = () => setLoading(false);
+    return () => socket.close();
   }, []);
 
-  const filtered = users.filter((u) => {
-    const name = (u.username || u.email || "").toLowerCase();
-    const acc = (u.account_number || "").toLowerCase();
-    const q = query.toLowerCase().trim();
-    if (!q) return true;
-    return name.includes(q) || acc.includes(q);
-  });
+  // Searching is done server-side against the users index
+  const [searchResults, setSearchResults] = useState(null);
+  useEffect(() => {
+    const q = query.trim();
+    if (!q) {
+      setSearchResults(null);
+      return undefined;
+    }
+    const id = setTimeout(async () => {
+      try {
+        const data = await authService.searchUsers(q);
+        setSearchResults(Array.isArray(data?.results) ? data.results : []);
+      } catch {
+        setSearchResults([]);
+      }
+    }, 250);
+    return () => clearTimeout(id);
+  }, [query]);
+
+  const filtered = searchResults ?? users;
 
   const copy = async (text, who) => {
     try {
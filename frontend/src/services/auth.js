@@ -1,6 +1,23 @@
 import axios from 'axios';
 
 const API_URL = import.meta.env.VITE_API_URL || '/api';
+const WS_URL = import.meta.env.VITE_WS_URL
+    || `${window.location.protocol === 'https:' ? 'wss' : 'ws'}://${window.location.host}`;
+
+// Money-moving POSTs carry an Idempotency-Key so a request that timed out can be retried safely
+const postIdempotent = async (url, body, retries = 2) => {
+    const token = localStorage.getItem('token');
+    const headers = { Authorization: `Bearer ${token}`, 'Idempotency-Key': crypto.randomUUID() };
+    for (let attempt = 0; ; attempt += 1) {
+        try {
+            const response = await axios.post(url, body, { headers, timeout: 15000 });
+            return response.data;
+        } catch (err) {
+            // Only retry when no response arrived; the server may or may not have applied the request
+            if (err.response || attempt >= retries) throw err;
+        }
+    }
+};
 
 const authService = {
     register: async (userData) => {
@@ -53,25 +70,11 @@ const authService = {
     },
 
     depositMoney: async (amount) => {
-        const token = localStorage.getItem('token');
-        const response = await axios.post(
-            `${API_URL}/auth/deposit/`,
-            { amount },
-            {
-                headers: { Authorization: `Bearer ${token}` }
-            }
-        );
-        return response.data;
+        return postIdempotent(`${API_URL}/auth/deposit/`, { amount });
     },
 
     transferMoney: async ({ to_account_number, amount }) => {
-        const token = localStorage.getItem('token');
-        const response = await axios.post(
-            `${API_URL}/auth/transfer/`,
-            { to_account_number, amount },
-            { headers: { Authorization: `Bearer ${token}` } }
-        );
-        return response.data;
+        return postIdempotent(`${API_URL}/auth/transfer/`, { to_account_number, amount });
     },
 
     resolveAccount: async (accountNumber) => {
@@ -92,11 +95,11 @@ const authService = {
         return response.data;
     },
 
-    getBlogs: async () => {
+    getBlogs: async (params = {}) => {
         const token = localStorage.getItem('token');
         const response = await axios.get(
             `${API_URL}/auth/blogs/`,
-            { headers: { Authorization: `Bearer ${token}` } }
+            { headers: { Authorization: `Bearer ${token}` }, params }
         );
         return response.data;
     },
@@ -124,11 +127,11 @@ const authService = {
         return response.data;
     },
 
-    getComments: async (blogId) => {
+    getComments: async (blogId, params = {}) => {
         const token = localStorage.getItem('token');
         const response = await axios.get(
             `${API_URL}/auth/blogs/${blogId}/comments/`,
-            { headers: { Authorization: `Bearer ${token}` } }
+            { headers: { Authorization: `Bearer ${token}` }, params }
         );
         return response.data;
     },
@@ -143,24 +146,75 @@ const authService = {
         return response.data;
     },
 
-    getTransactions: async () => {
+    getTransactions: async (params = {}) => {
         const token = localStorage.getItem('token');
         const response = await axios.get(
             `${API_URL}/auth/transactions/`,
+            { headers: { Authorization: `Bearer ${token}` }, params }
+        );
+        return response.data;
+    },
+
+    getAnalytics: async (params = {}) => {
+        const token = localStorage.getItem('token');
+        const response = await axios.get(
+            `${API_URL}/auth/analytics/`,
+            { headers: { Authorization: `Bearer ${token}` }, params }
+        );
+        return response.data;
+    },
+
+    getStatements: async () => {
+        const token = localStorage.getItem('token');
+        const response = await axios.get(
+            `${API_URL}/auth/statements/`,
             { headers: { Authorization: `Bearer ${token}` } }
         );
         return response.data;
     },
 
-  getUsers: async () => {
+    getStatement: async (year, month, params = {}) => {
+        const token = localStorage.getItem('token');
+        const response = await axios.get(
+            `${API_URL}/auth/statements/${year}/${month}/`,
+            { headers: { Authorization: `Bearer ${token}` }, params }
+        );
+        return response.data;
+    },
+
+    // Streams the full history server-side; format is 'csv' or 'ndjson'
+    exportTransactions: async (format = 'csv', params = {}) => {
+        const token = localStorage.getItem('token');
+        const response = await axios.get(
+            `${API_URL}/auth/transactions/export.${format}`,
+            { headers: { Authorization: `Bearer ${token}` }, params, responseType: 'blob' }
+        );
+        const url = URL.createObjectURL(response.data);
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = `transactions.${format}`;
+        link.click();
+        URL.revokeObjectURL(url);
+    },
+
+  getUsers: async (params = {}) => {
     const token = localStorage.getItem('token');
     const response = await axios.get(
       `${API_URL}/auth/users/`,
-      { headers: { Authorization: `Bearer ${token}` } }
+      { headers: { Authorization: `Bearer ${token}` }, params }
     );
     return response.data;
   },
 
+    searchUsers: async (q, params = {}) => {
+        const token = localStorage.getItem('token');
+        const response = await axios.get(
+            `${API_URL}/auth/users/search/`,
+            { headers: { Authorization: `Bearer ${token}` }, params: { q, ...params } }
+        );
+        return response.data;
+    },
+
     getMe: async () => {
         const token = localStorage.getItem('token');
         const response = await axios.get(
@@ -192,20 +246,33 @@ const authService = {
     },
 
     // Loans
-    getLoans: async () => {
+    // params: status (comma-separated), min_amount, max_amount, date_from, date_to, cursor, limit
+    getLoans: async (params = {}) => {
         const token = localStorage.getItem('token');
         const response = await axios.get(
             `${API_URL}/auth/loans/`,
-            { headers: { Authorization: `Bearer ${token}` } }
+            { headers: { Authorization: `Bearer ${token}` }, params }
         );
         return response.data;
     },
 
     applyLoan: async ({ amount, term_months, purpose, interest_rate }) => {
+        return postIdempotent(`${API_URL}/auth/loans/`, { amount, term_months, purpose, interest_rate });
+    },
+
+    getLoanSchedule: async (loanId) => {
         const token = localStorage.getItem('token');
-        const response = await axios.post(
-            `${API_URL}/auth/loans/`,
-            { amount, term_months, purpose, interest_rate },
+        const response = await axios.get(
+            `${API_URL}/auth/loans/${loanId}/schedule/`,
+            { headers: { Authorization: `Bearer ${token}` } }
+        );
+        return response.data;
+    },
+
+    getLoanPortfolio: async () => {
+        const token = localStorage.getItem('token');
+        const response = await axios.get(
+            `${API_URL}/auth/loans/portfolio/`,
             { headers: { Authorization: `Bearer ${token}` } }
         );
         return response.data;
@@ -221,6 +288,27 @@ const authService = {
         return response.data;
     },
 
+    // Returns { succeeded, failed, results: [{ loan_id, status, transaction_id?, error? }] }
+    bulkActOnLoans: async (loanIds, action) => {
+        const token = localStorage.getItem('token');
+        const response = await axios.post(
+            `${API_URL}/auth/loans/bulk-action/`,
+            { loan_ids: loanIds, action },
+            { headers: { Authorization: `Bearer ${token}` } }
+        );
+        return response.data;
+    },
+
+    // Authenticated WebSocket; onEvent receives parsed { event, data } messages
+    openSocket: (path, onEvent) => {
+        const token = localStorage.getItem('token');
+        const socket = new WebSocket(`${WS_URL}/ws/${path}/?token=${encodeURIComponent(token || '')}`);
+        socket.onmessage = (e) => {
+            try { onEvent(JSON.parse(e.data)); } catch {}
+        };
+        return socket;
+    },
+
     // Axios interceptor for handling token refresh
     setupAxiosInterceptors: () => {
         axios.interceptors.request.use(
@@ -14,6 +14,10 @@ export default defineConfig({
       '/media': {
         target: 'http://localhost:8000',
         changeOrigin: true
+      },
+      '/ws': {
+        target: 'ws://localhost:8000',
+        ws: true
       }
     }
   }